@@ -0,0 +1,189 @@
+"""
+Planning of the bakes of a retexture job.
+
+Every (material group, material) entry of the material JSON is one COMBINED bake of the
+whole mesh, with the material on the slot of its group and, on the other slots, whatever
+the earlier groups left there (their last material) or the original material of the GLB.
+A bake is identified by a key hashing everything its pixels depend on:
+
+    mesh, slot, material textures and scale, materials on the other slots,
+    HDRI, HDRI strength, samples, texture size, denoising
+
+Entries with the same key are baked once, keys already in the BakeCache are copied from
+it, and the remaining bakes of a group are ordered so that materials sharing textures
+are baked one after the other, keeping the group's last material last so the later
+groups see the same scene as without planning.
+"""
+import os
+import json
+import hashlib
+import threading
+import collections
+from utils import copy_file_atomic
+
+
+# Every request uploads its files to a new path, so the memo is an LRU, not a growing dict
+FILE_HASH_MEMO_SIZE = 4096
+_file_hashes = collections.OrderedDict()
+_file_hashes_lock = threading.Lock()
+
+
+def file_hash(path):
+    """
+    Content hash of a file, memoized by (path, size, mtime) for the FILE_HASH_MEMO_SIZE
+    most recently hashed files, or None without a path.
+    Uploaded files get new paths for every request, so keys hash contents, not paths.
+    """
+    if not path:
+        return None
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    memo_key = (path, stat.st_size, stat.st_mtime_ns)
+    with _file_hashes_lock:
+        if memo_key in _file_hashes:
+            _file_hashes.move_to_end(memo_key)
+            return _file_hashes[memo_key]
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    digest = h.hexdigest()
+    with _file_hashes_lock:
+        _file_hashes[memo_key] = digest
+        while len(_file_hashes) > FILE_HASH_MEMO_SIZE:
+            _file_hashes.popitem(last=False)
+    return digest
+
+
+def material_fingerprint(material):
+    """
+    Hash of what a material renders like: its textures and scale, not its name.
+    """
+    textures = [material.diffuse, material.roughness, material.metallic, material.normal, material.ao, material.orm]
+    payload = json.dumps([[file_hash(p) if p and os.path.isfile(p) else None for p in textures], float(material.scale)])
+    return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+
+class BakeJob():
+    """
+    One bake, producing the texture of every entry in `names`.
+    """
+    def __init__(self, key, slot, material, fingerprint):
+        self.key = key
+        self.slot = slot
+        self.material = material
+        self.fingerprint = fingerprint
+        self.names = [material.name]
+        self.cached = False
+
+
+class BakePlan():
+    """
+    Bakes to run, per material group, in order.
+
+    Attributes:
+        groups (list): For each group, the BakeJobs in bake order.
+        entry_keys (list): For each group, the key of each of its JSON entries, in JSON order.
+        num_requested (int): Number of JSON entries.
+        num_unique (int): Number of distinct bakes.
+        num_cached (int): Distinct bakes served by the cache.
+    """
+    def __init__(self, groups, entry_keys):
+        self.groups = groups
+        self.entry_keys = entry_keys
+        self.num_requested = sum(len(keys) for keys in entry_keys)
+        self.num_unique = sum(len(jobs) for jobs in groups)
+        self.num_cached = sum(job.cached for jobs in groups for job in jobs)
+
+    def last_job(self, group):
+        """
+        The job of the last JSON entry of a group, whose material later groups bake with, or None.
+        """
+        if not self.entry_keys[group]:
+            return None
+        return next(job for job in self.groups[group] if job.key == self.entry_keys[group][-1])
+
+    def summary(self):
+        return (f"{self.num_requested} bakes requested, {self.num_unique} distinct, "
+                f"{self.num_cached} from cache, {self.num_unique - self.num_cached} to bake")
+
+
+class BakeCache():
+    """
+    Directory of baked textures, named by bake key.
+    """
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.jpg")
+
+    def __contains__(self, key):
+        return os.path.isfile(self.path(key))
+
+    def fetch(self, key, outputs):
+        """
+        Copy the cached texture of `key` to every output path, returning False on a miss.
+        """
+        if key not in self:
+            self.misses += 1
+            return False
+        for output in outputs:
+            copy_file_atomic(self.path(key), output)
+        self.hits += 1
+        return True
+
+    def store(self, key, path):
+        copy_file_atomic(path, self.path(key))
+
+
+def plan_bakes(materials, model_path, hdri_path, hdri_strength, texture_size, denoise, samples, cache=None):
+    """
+    Plan the bakes of a list of material groups, see the module docstring.
+
+    Parameters:
+        materials (list): Material groups, as returned by read_json_materials.
+        model_path (str): GLB being retextured.
+        hdri_path (str): HDRI lighting the bakes.
+        hdri_strength (float): Strength of the HDRI.
+        texture_size (int): Size of the baked textures.
+        denoise (bool): Whether the bakes are denoised.
+        samples (int): Cycles samples per bake.
+        cache (BakeCache): Cache of earlier bakes, optional.
+
+    Returns:
+        BakePlan: The plan.
+    """
+    scene = [file_hash(model_path), file_hash(hdri_path), float(hdri_strength), int(texture_size), bool(denoise), int(samples)]
+    context = []    # fingerprint of the material each earlier group left on its slot
+    groups, entry_keys = [], []
+    for slot, group in enumerate(materials):
+        jobs, keys = {}, []
+        for material in group:
+            fingerprint = material_fingerprint(material)
+            payload = json.dumps([scene, slot, fingerprint, context])
+            key = hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+            if key in jobs:
+                if material.name not in jobs[key].names:
+                    jobs[key].names.append(material.name)
+            else:
+                jobs[key] = BakeJob(key, slot, material, fingerprint)
+                jobs[key].cached = cache is not None and key in cache
+            keys.append(key)
+
+        last = jobs[keys[-1]] if keys else None
+        def texture_order(job):
+            m = job.material
+            return [p or "" for p in (m.diffuse, m.orm, m.roughness, m.metallic, m.normal, m.ao)]
+        # cached bakes need no Blender work, the rest share loaded textures when adjacent
+        ordered = [job for job in jobs.values() if job.cached]
+        ordered += sorted((job for job in jobs.values() if not job.cached and job is not last), key=texture_order)
+        if last is not None and not last.cached:
+            ordered.append(last)
+        groups.append(ordered)
+        entry_keys.append(keys)
+        context.append(last.fingerprint if last is not None else None)
+    return BakePlan(groups, entry_keys)
@@ -0,0 +1,84 @@
+import os
+import sys
+import click
+import numpy as np
+import torch
+import trimesh
+import utils3d
+import nvdiffrast.torch as dr
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from trellis.utils.postprocessing_utils import bake_texture
+from trellis.utils.camera_utils import hammersley_rig
+from visibility import timed
+
+
+def render_textured(rastctx, vertices, faces, uvs, texture, extrinsics, intrinsics, resolution, near=0.1, far=10.0):
+    """
+    Render a textured mesh, returning images with row 0 at the top as bake_texture expects.
+    """
+    texture = torch.tensor(texture, dtype=torch.float32, device='cuda').flip(0)[None] / 255
+    colors, masks = [], []
+    for extr, intr in zip(extrinsics, intrinsics):
+        view = utils3d.torch.extrinsics_to_view(extr)
+        projection = utils3d.torch.intrinsics_to_perspective(intr, near, far)
+        rast = utils3d.torch.rasterize_triangle_faces(
+            rastctx, vertices[None], faces, resolution, resolution, uv=uvs[None], view=view, projection=projection
+        )
+        color = dr.texture(texture, rast['uv'], rast['uv_dr'])[0] * rast['mask'][0, ..., None]
+        colors.append(color.flip(0))
+        masks.append(rast['mask'][0].bool().flip(0))
+    return torch.stack(colors), torch.stack(masks)
+
+
+def psnr(renders, observations, masks):
+    mse = ((renders - observations) ** 2)[masks].mean()
+    return (10 * torch.log10(1 / mse)).item()
+
+
+@click.command()
+@click.option('--mesh_path', type=str, required=True, help='Textured mesh (e.g. a TRELLIS glb) providing geometry, UVs and the reference texture.')
+@click.option('--num_views', type=int, default=100, help='Number of observations.')
+@click.option('--resolution', type=int, default=1024, help='Resolution of the observations.')
+@click.option('--texture_size', type=int, default=1024, help='Size of the baked texture.')
+@click.option('--views_per_step', type=int, default=4, help='Views per optimization step of the batched engine.')
+def main(mesh_path, num_views, resolution, texture_size, views_per_step):
+    """
+    Compare the texture baking modes: PSNR of the baked texture rendered from the observed views versus wall time.
+    """
+    mesh = trimesh.load(mesh_path, force='mesh')
+    vertices = np.asarray(mesh.vertices, dtype=np.float32)
+    vertices = vertices @ np.array([[1, 0, 0], [0, 0, 1], [0, -1, 0]], dtype=np.float32)  # y-up to z-up
+    faces = np.asarray(mesh.faces, dtype=np.int32)
+    uvs = np.asarray(mesh.visual.uv, dtype=np.float32)
+    texture = np.array(mesh.visual.material.baseColorTexture.convert('RGB'))
+
+    rig = hammersley_rig(num_views, radius=2, fov=40, device='cuda')
+    extrinsics, intrinsics = rig.extrinsics, rig.intrinsics
+    rastctx = utils3d.torch.RastContext(backend='cuda')
+    v, f, uv = torch.tensor(vertices).cuda(), torch.tensor(faces).cuda(), torch.tensor(uvs).cuda()
+    observations, masks = render_textured(rastctx, v, f, uv, texture, extrinsics, intrinsics, resolution)
+    observations_np = [np.clip(o.cpu().numpy() * 255, 0, 255).astype(np.uint8) for o in observations]
+    masks_np = [m.cpu().numpy() for m in masks]
+    extrinsics_np = list(extrinsics.cpu().numpy())
+    intrinsics_np = list(intrinsics.cpu().numpy())
+    print(f'{os.path.basename(mesh_path)}: {faces.shape[0]} faces, {num_views} views at {resolution}^2, texture {texture_size}^2')
+
+    configs = {
+        'fast': dict(mode='fast'),
+        'opt (1 view, cold)': dict(mode='opt', warm_start=False, views_per_step=1, plateau_patience=1 << 30),
+        f'opt ({views_per_step} views, warm)': dict(mode='opt', warm_start=True, views_per_step=views_per_step),
+    }
+    print(f"{'Mode':<28}{'Steps':<10}{'Time (s)':<12}{'PSNR (dB)':<12}")
+    for name, config in configs.items():
+        metrics = {}
+        baked, t = timed(lambda: bake_texture(
+            vertices, faces, uvs, observations_np, masks_np, extrinsics_np, intrinsics_np,
+            texture_size=texture_size, metrics=metrics, **config,
+        ))
+        renders, _ = render_textured(rastctx, v, f, uv, baked, extrinsics, intrinsics, resolution)
+        print(f"{name:<28}{metrics['bake_steps']:<10}{t:<12.2f}{psnr(renders, observations, masks):<12.2f}")
+
+
+if __name__ == "__main__":
+    main()
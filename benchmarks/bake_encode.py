@@ -0,0 +1,87 @@
+import os
+import sys
+import json
+import time
+import subprocess
+import click
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Encoder threads of each mode
+MODES = {'inline': 0, 'background': 2}
+
+
+def bake_run(model_path, material_json, hdri_path, texture_size, samples, bake_dir, encoder_threads):
+    """
+    One timed bake of all materials, in a process of its own: the asset cache and the
+    material datablocks start empty, so no mode profits from the runs before it.
+    """
+    import blender_assets
+    from materials import read_json_materials
+    from retex_and_bake import bake_materials_seperately, setup_hdri_environment
+
+    blender_assets._asset_cache = None
+    materials = read_json_materials(material_json)
+    mesh = setup_hdri_environment(model_path, hdri_path)
+    start = time.time()
+    bake_materials_seperately(materials, mesh, texture_size, False, samples,
+                              bake_dir=bake_dir, encoder_threads=encoder_threads)
+    return {'bakes': sum(len(group) for group in materials), 'seconds': time.time() - start}
+
+
+@click.command()
+@click.option('--model_path', type=str, required=True, help='Grouped GLB to retexture.')
+@click.option('--material_json', type=str, required=True, help='Materials to bake, see material-example.json.')
+@click.option('--hdri_path', type=str, default=os.path.join("hdris", "studio_small_09_1k.exr"), help='HDRI lighting the bakes.')
+@click.option('--texture_size', type=int, default=2048, help='Size of the baked textures.')
+@click.option('--samples', type=int, default=8, help='Cycles samples per bake.')
+@click.option('--repeats', type=int, default=2, help='Runs per mode, alternating which mode goes first.')
+@click.option('--output_dir', type=str, default='bake_encode_out', help='Folder the bakes are written to.')
+@click.option('--run_mode', type=click.Choice(list(MODES)), default=None, hidden=True)
+def main(model_path, material_json, hdri_path, texture_size, samples, repeats, output_dir, run_mode):
+    """
+    Time the readback of a baked image, and bake throughput with JPEG encoding inline and in the background.
+    """
+    if run_mode is not None:
+        result = bake_run(model_path, material_json, hdri_path, texture_size, samples,
+                          os.path.join(output_dir, run_mode), MODES[run_mode])
+        print(json.dumps(result))
+        return
+
+    import bpy
+    from retex_and_bake import read_pixels
+    img = bpy.data.images.new("readback", width=texture_size, height=texture_size)
+    start = time.time()
+    pixels = (np.array(img.pixels[:]) * 255).astype(np.uint8)
+    t_list = time.time() - start
+    start = time.time()
+    read_pixels(img)
+    t_foreach = time.time() - start
+    bpy.data.images.remove(img)
+    print(f'Readback of {texture_size}x{texture_size}: pixels[:] {t_list:.3f} s, foreach_get {t_foreach:.3f} s')
+
+    seconds = {name: [] for name in MODES}
+    num_bakes = 0
+    for r in range(repeats):
+        order = list(MODES) if r % 2 == 0 else list(MODES)[::-1]
+        for name in order:
+            # a fresh Blender process per run, see bake_run
+            out = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--model_path', model_path, '--material_json', material_json,
+                 '--hdri_path', hdri_path, '--texture_size', str(texture_size), '--samples', str(samples),
+                 '--output_dir', output_dir, '--run_mode', name],
+                check=True, capture_output=True, text=True,
+            ).stdout
+            result = json.loads(out.strip().splitlines()[-1])
+            seconds[name].append(result['seconds'])
+            num_bakes = result['bakes']
+
+    print(f"{'Encoding':<14}{'Bakes':<8}{'Time (s)':<10}{'Bakes/min':<10}")
+    for name, times in seconds.items():
+        t = float(np.median(times))
+        print(f'{name:<14}{num_bakes:<8}{t:<10.1f}{num_bakes * 60 / t:<10.1f}')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+import os
+import sys
+import click
+import trimesh
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from trellis.utils.finishing_utils import finish_to_obj
+from visibility import timed
+
+
+@click.command()
+@click.argument('glb_paths', nargs=-1, required=True)
+@click.option('--blender/--no-blender', default=True, help='Also time the Blender finishing chain.')
+def main(glb_paths, blender):
+    """
+    Compare the numpy mesh finishing with the Blender chain on GLBs exported by to_glb.
+    """
+    if blender:
+        from blender_export import process_and_export_obj
+    print(f"{'Mesh':<32}{'Faces':<10}{'Numpy (s)':<12}{'Blender (s)':<12}{'OBJ (MB)':<10}")
+    for glb_path in glb_paths:
+        mesh = trimesh.load(glb_path, force='mesh')
+        data, t_numpy = timed(lambda: finish_to_obj(mesh))
+        t_blender = timed(lambda: process_and_export_obj(glb_path))[1] if blender else float('nan')
+        print(f'{os.path.basename(glb_path)[:30]:<32}{mesh.faces.shape[0]:<10}{t_numpy:<12.3f}{t_blender:<12.3f}{len(data) / 1e6:<10.2f}')
+
+
+if __name__ == "__main__":
+    main()
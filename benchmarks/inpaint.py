@@ -0,0 +1,66 @@
+import os
+import sys
+import click
+import numpy as np
+import torch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from trellis.utils.texture_utils import inpaint_texture
+from visibility import timed
+
+
+def synthetic_atlas(size, num_charts=64, seed=0):
+    """
+    A texture atlas with smooth colors inside random elliptic charts, and the gutters to fill.
+
+    The chart colors are a smooth function defined over the whole texture, so the error of
+    a fill next to the charts measures how well it continues the colors across the seams.
+    """
+    rng = np.random.default_rng(seed)
+    y, x = (g.astype(np.float32) / size for g in np.ogrid[0:size, 0:size])
+    reference = np.stack([
+        0.5 + 0.5 * np.sin(2 * np.pi * (x + 0.3 * y)),
+        0.5 + 0.5 * np.cos(2 * np.pi * (1.5 * y - 0.2 * x)),
+        0.5 + 0.5 * np.sin(2 * np.pi * (x * y + 0.1)),
+    ], axis=-1)
+    reference = (reference * 255).round().astype(np.uint8)
+    charts = np.zeros((size, size), dtype=bool)
+    for cx, cy, rx, ry in zip(*rng.random((4, num_charts))):
+        charts |= ((x - cx) / (0.02 + 0.06 * rx)) ** 2 + ((y - cy) / (0.02 + 0.06 * ry)) ** 2 <= 1
+    texture = np.where(charts[..., None], reference, 0).astype(np.uint8)
+    return texture, (~charts).astype(np.uint8), reference
+
+
+def gutter_ring(mask, width):
+    """
+    Masked texels within `width` texels of a chart.
+    """
+    valid = torch.from_numpy(mask == 0).float()[None, None]
+    near = torch.nn.functional.max_pool2d(valid, 2 * width + 1, stride=1, padding=width)[0, 0].numpy() > 0
+    return near & (mask > 0)
+
+
+@click.command()
+@click.option('--sizes', type=str, default='1024,2048,4096,8192', help='Comma separated texture sizes.')
+@click.option('--methods', type=str, default='telea,pull_push', help='Comma separated inpainting methods.')
+@click.option('--dilation', type=int, default=4, help='Chart dilation of the pull-push fill.')
+def main(sizes, methods, dilation):
+    """
+    Compare texture inpainting methods: wall time, and error in the gutters next to the charts.
+    """
+    devices = ['cpu'] + (['cuda'] if torch.cuda.is_available() else [])
+    print(f"{'Size':<8}{'Method':<20}{'Time (s)':<12}{'Seam error':<12}")
+    for size in map(int, sizes.split(',')):
+        texture, mask, reference = synthetic_atlas(size)
+        ring = gutter_ring(mask, 2)
+        for method in methods.split(','):
+            for device in (devices if method == 'pull_push' else ['cpu']):
+                inpaint_texture(texture[:64, :64], mask[:64, :64], method=method, device=device)  # warm up
+                filled, t = timed(lambda: inpaint_texture(texture, mask, method=method, dilation=dilation, device=device))
+                error = np.abs(filled[ring].astype(np.float32) - reference[ring]).mean()
+                name = method if method == 'telea' else f'{method} ({device})'
+                print(f'{size:<8}{name:<20}{t:<12.3f}{error:<12.2f}')
+
+
+if __name__ == "__main__":
+    main()
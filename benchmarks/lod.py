@@ -0,0 +1,74 @@
+import os
+import sys
+import click
+import numpy as np
+import torch
+import trimesh
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from trellis.representations import MeshExtractResult
+from trellis.utils import postprocessing_utils
+from visibility import timed
+
+
+def load_outputs(mesh_path, image_path):
+    """
+    Decoded mesh and appearance to convert: a vertex-colored mesh, or the outputs of the image pipeline.
+    """
+    if mesh_path is not None:
+        mesh = trimesh.load(mesh_path, force='mesh')
+        vertices = torch.tensor(mesh.vertices, dtype=torch.float32, device='cuda')
+        faces = torch.tensor(mesh.faces, dtype=torch.int64, device='cuda')
+        colors = torch.tensor(mesh.visual.vertex_colors[:, :3] / 255, dtype=torch.float32, device='cuda')
+        return None, MeshExtractResult(vertices, faces, vertex_attrs=colors), 'vertex'
+    from PIL import Image
+    from trellis.pipelines import TrellisImageTo3DPipeline
+    pipeline = TrellisImageTo3DPipeline.from_pretrained("JeffreyXiang/TRELLIS-image-large")
+    pipeline.cuda()
+    outputs = pipeline.run(Image.open(image_path), seed=1)
+    return outputs['gaussian'][0], outputs['mesh'][0], 'opt'
+
+
+@click.command()
+@click.option('--mesh_path', type=str, default=None, help='Vertex-colored mesh, baked with bake_mode="vertex".')
+@click.option('--image_path', type=str, default=None, help='Image to run the pipeline on, baked with bake_mode="opt".')
+@click.option('--lod_face_counts', type=str, default='20000,8000,2000', help='Comma separated face counts, finest first.')
+@click.option('--texture_size', type=int, default=1024, help='Texture size of the finest level.')
+def main(mesh_path, image_path, lod_face_counts, texture_size):
+    """
+    Compare exporting levels of detail with one to_glb call per level against one to_glb call for all levels.
+    """
+    if (mesh_path is None) == (image_path is None):
+        raise click.UsageError('Give exactly one of --mesh_path and --image_path.')
+    app_rep, mesh, bake_mode = load_outputs(mesh_path, image_path)
+    counts = [int(c) for c in lod_face_counts.split(',')]
+    num_faces = mesh.faces.shape[0]
+    print(f'{num_faces} decoded faces, levels {counts}, bake_mode={bake_mode}')
+
+    def independent():
+        return [
+            postprocessing_utils.to_glb(
+                app_rep, mesh, simplify=max(1 - count / num_faces, 0), texture_size=texture_size,
+                bake_mode=bake_mode, verbose=False,
+            )
+            for count in counts
+        ]
+
+    metrics = {}
+    def chained():
+        return postprocessing_utils.to_glb(
+            app_rep, mesh, lod_face_counts=counts, texture_size=texture_size,
+            bake_mode=bake_mode, metrics=metrics, verbose=False,
+        )
+
+    independent_meshes, t_independent = timed(independent)
+    chained_meshes, t_chained = timed(chained)
+    print(f"{'Level':<8}{'Faces (independent)':<22}{'Faces (one pass)':<20}")
+    for i, (a, b) in enumerate(zip(independent_meshes, chained_meshes)):
+        print(f'LOD{i:<5}{a.faces.shape[0]:<22}{b.faces.shape[0]:<20}')
+    print(f"{'Time (s)':<8}{t_independent:<22.2f}{t_chained:<20.2f}")
+    print(f"Lower levels of the one-pass export: {metrics['lod_time']:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
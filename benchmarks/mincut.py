@@ -0,0 +1,78 @@
+import os
+import sys
+import time
+import click
+import numpy as np
+import torch
+import trimesh
+import igraph
+import utils3d
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from trellis.utils.postprocessing_utils import _solve_mincut
+from trellis.utils.visibility_utils import compute_face_visibility
+from visibility import hammersley_views
+
+
+def mincut_reference(num_faces, dual_edges, dual_edges_weights, inner_face_indices, outer_face_indices):
+    """
+    Graph construction used by _fill_holes before the integer-array rewrite.
+    """
+    g = igraph.Graph()
+    g.add_vertices(num_faces)
+    g.add_edges(dual_edges.cpu().numpy())
+    g.es['weight'] = dual_edges_weights.cpu().numpy()
+    g.add_vertex('s')
+    g.add_vertex('t')
+    g.add_edges([(f, 's') for f in inner_face_indices], attributes={'weight': torch.ones(inner_face_indices.shape[0], dtype=torch.float32).cpu().numpy()})
+    g.add_edges([(f, 't') for f in outer_face_indices], attributes={'weight': torch.ones(outer_face_indices.shape[0], dtype=torch.float32).cpu().numpy()})
+    cut = g.mincut('s', 't', (np.array(g.es['weight']) * 1000).tolist())
+    return np.array([v for v in cut.partition[0] if v < num_faces])
+
+
+@click.command()
+@click.argument('mesh_paths', nargs=-1, required=True)
+@click.option('--num_views', type=int, default=100, help='Views used to label inner and outer faces.')
+@click.option('--resolution', type=int, default=512, help='Rasterization resolution used to label faces.')
+def main(mesh_paths, num_views, resolution):
+    """
+    Benchmark the mincut of _fill_holes on decimated TRELLIS meshes.
+    """
+    device = 'cuda' if torch.cuda.is_available() else 'cpu'
+    backends = ['reference', 'igraph']
+    try:
+        import maxflow
+        backends.append('bk')
+    except ImportError:
+        print('PyMaxflow not installed, skipping the bk backend')
+
+    print(f"{'Mesh':<32}{'Faces':<10}" + ''.join(f'{b + " (s)":<16}' for b in backends) + 'Same cut')
+    for mesh_path in mesh_paths:
+        mesh = trimesh.load(mesh_path, force='mesh')
+        verts = torch.tensor(mesh.vertices, dtype=torch.float32, device=device)
+        faces = torch.tensor(mesh.faces, dtype=torch.int32, device=device)
+
+        views, projection = hammersley_views(num_views, device)
+        visblity = compute_face_visibility(verts, faces, views, projection, resolution).float() / num_views
+        inner_face_indices = torch.nonzero(visblity == 0).reshape(-1)
+        outer_face_indices = torch.nonzero(visblity > 0.5).reshape(-1)
+        edges, face2edge, _ = utils3d.torch.compute_edges(faces)
+        dual_edges, dual_edge2edge = utils3d.torch.compute_dual_graph(face2edge)
+        dual_edge2edge = edges[dual_edge2edge]
+        dual_edges_weights = torch.norm(verts[dual_edge2edge[:, 0]] - verts[dual_edge2edge[:, 1]], dim=1)
+
+        times, cuts = [], []
+        for backend in backends:
+            start = time.time()
+            if backend == 'reference':
+                cut = mincut_reference(faces.shape[0], dual_edges, dual_edges_weights, inner_face_indices, outer_face_indices)
+            else:
+                cut = _solve_mincut(faces.shape[0], dual_edges, dual_edges_weights, inner_face_indices, outer_face_indices, backend=backend)
+            times.append(time.time() - start)
+            cuts.append(set(cut.tolist()))
+        same = all(c == cuts[0] for c in cuts[1:])
+        print(f'{os.path.basename(mesh_path)[:30]:<32}{faces.shape[0]:<10}' + ''.join(f'{t:<16.3f}' for t in times) + str(same))
+
+
+if __name__ == "__main__":
+    main()
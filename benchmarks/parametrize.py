@@ -0,0 +1,58 @@
+import os
+import sys
+import time
+import click
+import numpy as np
+import trimesh
+import xatlas
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from trellis.utils.uv_utils import _face_areas, _face_components, parametrize_components, parametrize_mesh_cached, shutdown_parametrize_pool
+
+
+def uv_coverage(indices, uvs):
+    """
+    Fraction of the unit UV square covered by charts.
+    """
+    return _face_areas(uvs.astype(np.float64), indices.astype(np.int64)).sum()
+
+
+@click.command()
+@click.argument('mesh_paths', nargs=-1, required=True)
+@click.option('--num_workers', type=int, default=os.cpu_count(), help='Worker processes of the component-parallel path.')
+@click.option('--texture_size', type=int, default=1024, help='Texture size setting the gutters of the component-parallel path.')
+def main(mesh_paths, num_workers, texture_size):
+    """
+    Compare the single xatlas call with the component-parallel parametrization and its cache on decoded meshes.
+    """
+    # start the worker processes before timing
+    warmup = trimesh.creation.box()
+    parametrize_components(np.asarray(warmup.vertices, dtype=np.float32), warmup.faces, num_workers=num_workers, texture_size=texture_size)
+
+    print(f"{'Mesh':<32}{'Faces':<10}{'Comps':<8}{'Single (s)':<12}{'Parallel (s)':<14}{'Cached (s)':<12}{'Coverage':<16}")
+    totals = np.zeros(3)
+    for mesh_path in mesh_paths:
+        mesh = trimesh.load(mesh_path, force='mesh')
+        vertices = np.asarray(mesh.vertices, dtype=np.float32)
+        faces = np.asarray(mesh.faces, dtype=np.int64)
+        num_components, _ = _face_components(faces, vertices.shape[0])
+
+        start = time.time()
+        _, single_indices, single_uvs = xatlas.parametrize(vertices, faces.astype(np.uint32))
+        t_single = time.time() - start
+        start = time.time()
+        _, indices, uvs = parametrize_mesh_cached(vertices, faces, num_workers=num_workers, texture_size=texture_size)
+        t_parallel = time.time() - start
+        start = time.time()
+        parametrize_mesh_cached(vertices, faces, num_workers=num_workers, texture_size=texture_size)
+        t_cached = time.time() - start
+        totals += [t_single, t_parallel, t_cached]
+
+        coverage = f'{uv_coverage(single_indices, single_uvs):.2f} / {uv_coverage(indices, uvs):.2f}'
+        print(f'{os.path.basename(mesh_path)[:30]:<32}{faces.shape[0]:<10}{num_components:<8}{t_single:<12.3f}{t_parallel:<14.3f}{t_cached:<12.4f}{coverage:<16}')
+    print(f"{'Total':<50}{totals[0]:<12.3f}{totals[1]:<14.3f}{totals[2]:<12.4f}")
+    shutdown_parametrize_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import os
+import sys
+import click
+import numpy as np
+import torch
+from plyfile import PlyData, PlyElement
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from trellis.representations import Gaussian
+from visibility import timed
+
+
+def random_gaussians(num_gaussians, sh_degree=0, seed=0):
+    """
+    Gaussians with random attributes in the unit cube, shaped like decoded TRELLIS Gaussians.
+    """
+    torch.manual_seed(seed)
+    gaussian = Gaussian(aabb=[-0.5, -0.5, -0.5, 1.0, 1.0, 1.0], sh_degree=sh_degree)
+    gaussian.from_xyz(torch.rand(num_gaussians, 3, device='cuda') - 0.5)
+    gaussian._features_dc = torch.randn(num_gaussians, 1, 3, device='cuda')
+    if sh_degree > 0:
+        gaussian._features_rest = torch.randn(num_gaussians, (sh_degree + 1) ** 2 - 1, 3, device='cuda')
+    gaussian.from_scaling(torch.rand(num_gaussians, 3, device='cuda') * 0.02 + 0.001)
+    gaussian._rotation = torch.randn(num_gaussians, 4, device='cuda')
+    gaussian._opacity = torch.randn(num_gaussians, 1, device='cuda') * 3
+    return gaussian
+
+
+def save_ply_rows(gaussian, path):
+    """
+    The previous writer, filling the records with one Python tuple per Gaussian.
+    """
+    xyz, f_dc, f_rest, opacities, scale, rotation = gaussian._export_attributes([[1, 0, 0], [0, 0, -1], [0, 1, 0]])
+    elements = np.empty(xyz.shape[0], dtype=[(attribute, 'f4') for attribute in gaussian.construct_list_of_attributes()])
+    attributes = np.concatenate((xyz, np.zeros_like(xyz), f_dc, f_rest, opacities, scale, rotation), axis=1)
+    elements[:] = list(map(tuple, attributes))
+    PlyData([PlyElement.describe(elements, 'vertex')]).write(path)
+
+
+@click.command()
+@click.option('--num_gaussians', type=int, default=500000, help='Number of random Gaussians.')
+@click.option('--sh_degree', type=int, default=0, help='Degree of their spherical harmonics.')
+@click.option('--output_dir', type=str, default='ply_out', help='Folder the files are written to.')
+def main(num_gaussians, sh_degree, output_dir):
+    """
+    Time the row-by-row and vectorised PLY writers, the PLY reader, and compare with the .splat export.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    gaussian = random_gaussians(num_gaussians, sh_degree)
+    rows_path = os.path.join(output_dir, 'rows.ply')
+    ply_path = os.path.join(output_dir, 'model.ply')
+    splat_path = os.path.join(output_dir, 'model.splat')
+
+    _, t_rows = timed(lambda: save_ply_rows(gaussian, rows_path))
+    _, t_save = timed(lambda: gaussian.save_ply(ply_path))
+    loaded = Gaussian(aabb=[-0.5, -0.5, -0.5, 1.0, 1.0, 1.0], sh_degree=sh_degree)
+    _, t_load = timed(lambda: loaded.load_ply(ply_path))
+    num_splats, t_splat = timed(lambda: gaussian.save_splat(splat_path))
+    error = (loaded.get_xyz - gaussian.get_xyz).abs().max().item()
+
+    print(f'{num_gaussians} Gaussians, SH degree {sh_degree}, round trip position error {error:.2e}')
+    print(f"{'Export':<22}{'Time (s)':<10}{'Size (MB)':<10}{'Gaussians':<10}")
+    print(f"{'PLY, row by row':<22}{t_rows:<10.3f}{os.path.getsize(rows_path) / 2 ** 20:<10.1f}{num_gaussians:<10}")
+    print(f"{'PLY, vectorised':<22}{t_save:<10.3f}{os.path.getsize(ply_path) / 2 ** 20:<10.1f}{num_gaussians:<10}")
+    print(f"{'PLY load':<22}{t_load:<10.3f}")
+    print(f"{'.splat':<22}{t_splat:<10.3f}{os.path.getsize(splat_path) / 2 ** 20:<10.1f}{num_splats:<10}")
+
+
+if __name__ == "__main__":
+    main()
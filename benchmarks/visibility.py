@@ -0,0 +1,58 @@
+import os
+import sys
+import time
+import click
+import torch
+import trimesh
+import utils3d
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from trellis.utils.camera_utils import hammersley_rig
+from trellis.utils.visibility_utils import compute_face_visibility
+
+
+def hammersley_views(num_views, device, radius=2.0, fov=40):
+    views = hammersley_rig(num_views, radius=radius, fov=fov, device=device).views
+    fov = torch.deg2rad(torch.tensor(float(fov), device=device))
+    projection = utils3d.torch.perspective_from_fov_xy(fov, fov, 1, 3)
+    return views, projection
+
+
+def timed(fn):
+    if torch.cuda.is_available():
+        torch.cuda.synchronize()
+    start = time.time()
+    ret = fn()
+    if torch.cuda.is_available():
+        torch.cuda.synchronize()
+    return ret, time.time() - start
+
+
+@click.command()
+@click.option('--mesh_path', type=str, required=True, help='Mesh to benchmark, e.g. a decimated TRELLIS mesh (normalized to [-0.5, 0.5]).')
+@click.option('--num_views', type=int, default=200, help='Number of views.')
+@click.option('--resolution', type=int, default=1024, help='Rasterization resolution.')
+@click.option('--batch_size', type=int, default=8, help='Views per batch for the cpu backend.')
+def main(mesh_path, num_views, resolution, batch_size):
+    mesh = trimesh.load(mesh_path, force='mesh')
+    verts = torch.tensor(mesh.vertices, dtype=torch.float32)
+    faces = torch.tensor(mesh.faces, dtype=torch.int32)
+    print(f'{os.path.basename(mesh_path)}: {verts.shape[0]} vertices, {faces.shape[0]} faces, {num_views} views at {resolution}^2')
+
+    views, projection = hammersley_views(num_views, 'cpu')
+    vis_cpu, t_cpu = timed(lambda: compute_face_visibility(verts, faces, views, projection, resolution, backend='cpu', batch_size=batch_size))
+    print(f"{'Backend':<12}{'Time (s)':<16}{'Views/s':<16}")
+    print(f"{'cpu':<12}{t_cpu:<16.3f}{num_views / t_cpu:<16.2f}")
+
+    if torch.cuda.is_available():
+        views, projection = views.cuda(), projection.cuda()
+        vis_cuda, t_cuda = timed(lambda: compute_face_visibility(verts.cuda(), faces.cuda(), views, projection, resolution, backend='cuda'))
+        print(f"{'cuda':<12}{t_cuda:<16.3f}{num_views / t_cuda:<16.2f}")
+
+        diff = (vis_cpu.float() - vis_cuda.cpu().float()).abs() / num_views
+        flips = ((vis_cpu == 0) != (vis_cuda.cpu() == 0)).sum().item()
+        print(f'Visibility difference: max {diff.max().item():.4f}, mean {diff.mean().item():.6f}, invisible-set flips {flips}')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Cache of the images (material textures and HDRIs) Blender jobs load.
+
+Images are keyed by absolute path, modification time and maximum size, so an edited file
+is loaded again. Within a job the same datablock is returned for every request of a key.
+The decoded pixels are also kept in a bounded LRU in the memory of the process, so a
+long-lived worker, whose scene and datablocks are reset before every job, rebuilds an
+image from memory instead of decoding the file again.
+"""
+import os
+import time
+import collections
+import numpy as np
+import bpy
+
+
+class AssetCache():
+    """
+    Images by (absolute path, mtime, max size), with an LRU of their pixels.
+
+    Parameters:
+        max_bytes (int): Memory the cached pixels may use.
+    """
+    def __init__(self, max_bytes=2 << 30):
+        self.max_bytes = max_bytes
+        self._names = {}    # key -> name of the datablock built for it in the current scene
+        self._pixels = collections.OrderedDict()    # key -> (width, height, is_float, colorspace, pixels)
+        self._bytes = 0
+        self.hits = 0           # datablock reused
+        self.memory_hits = 0    # datablock rebuilt from cached pixels
+        self.misses = 0         # file decoded
+        self.load_seconds = 0.0
+
+    def image(self, path, max_size=None):
+        """
+        The image datablock of a file, loaded at most once.
+
+        Parameters:
+            path (str): Image file.
+            max_size (int): Images larger than this are downscaled to it, optional.
+        """
+        path = os.path.abspath(path)
+        key = (path, os.stat(path).st_mtime_ns, max_size)
+        name = self._names.get(key)
+        img = bpy.data.images.get(name) if name else None
+        if img is not None:
+            self.hits += 1
+            return img
+
+        start = time.time()
+        name = f"[{abs(hash(key)):x}] {os.path.basename(path)}"[:63]
+        if key in self._pixels:
+            self._pixels.move_to_end(key)
+            width, height, is_float, colorspace, pixels = self._pixels[key]
+            img = bpy.data.images.new(name, width=width, height=height, alpha=True, float_buffer=is_float)
+            # 16-bit PNGs are float buffers in sRGB, so the colour space is not implied by the buffer
+            img.colorspace_settings.name = colorspace
+            img.pixels.foreach_set(pixels if is_float else pixels.astype(np.float32) / 255.0)
+            self.memory_hits += 1
+        else:
+            img = bpy.data.images.load(path)
+            img.name = name
+            if max_size and max(img.size) > max_size:
+                scale = max_size / max(img.size)
+                img.scale(max(1, round(img.size[0] * scale)), max(1, round(img.size[1] * scale)))
+            self._remember(key, img)
+            self.misses += 1
+        self._names[key] = img.name
+        self.load_seconds += time.time() - start
+        return img
+
+    def _remember(self, key, img):
+        width, height = img.size
+        pixels = np.empty(width * height * 4, dtype=np.float32)
+        img.pixels.foreach_get(pixels)
+        if not img.is_float:
+            # 8-bit images round-trip exactly, in a quarter of the memory
+            pixels = np.round(pixels * 255.0).astype(np.uint8)
+        if pixels.nbytes > self.max_bytes:
+            return
+        self._pixels[key] = (width, height, img.is_float, img.colorspace_settings.name, pixels)
+        self._bytes += pixels.nbytes
+        while self._bytes > self.max_bytes:
+            _, (_, _, _, _, evicted) = self._pixels.popitem(last=False)
+            self._bytes -= evicted.nbytes
+
+    def stats(self):
+        """
+        Counts of reused, rebuilt and decoded images, seconds spent loading and cached bytes.
+        """
+        requests = self.hits + self.memory_hits + self.misses
+        return {
+            "hits": self.hits,
+            "memory_hits": self.memory_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.memory_hits) / requests if requests else 0.0,
+            "load_seconds": self.load_seconds,
+            "cached_bytes": self._bytes,
+        }
+
+
+_asset_cache = None
+
+
+def get_asset_cache():
+    """
+    Process-wide cache, holding up to BLENDER_ASSET_CACHE_MB (default 2048) of pixels.
+    """
+    global _asset_cache
+    if _asset_cache is None:
+        _asset_cache = AssetCache(max_bytes=int(os.environ.get("BLENDER_ASSET_CACHE_MB", 2048)) << 20)
+    return _asset_cache
@@ -0,0 +1,73 @@
+"""
+Blender finishing of TRELLIS meshes: weld, Smart UV project, subdivide and export to OBJ.
+
+Only bpy is needed here, so the Blender workers can run the chain without loading the
+generation stack of multi_image_trellis.
+"""
+import os
+from utils import job_temp_dir
+
+
+def process_and_export_obj(model):
+    """
+    Imports a GLB, merges all mesh vertices by distance,
+    performs a Smart UV project, and exports the mesh as a OBJ.
+
+    Blender only imports and exports files, so the intermediate files live in a
+    private directory of the job, memory-backed when available, removed on return.
+
+    Parameters:
+        model (bytes | str): GLB data, or file path to the input GLB.
+
+    Returns:
+        bytes: The exported OBJ.
+    """
+
+    if isinstance(model, str) and not os.path.exists(model):
+        raise RuntimeError(f"Input file not found: {model}")
+
+    with job_temp_dir(prefix="trellis_obj_") as job_dir:
+        if isinstance(model, str):
+            input_path = model
+        else:
+            input_path = os.path.join(job_dir, "model.glb")
+            with open(input_path, "wb") as f:
+                f.write(model)
+        return _process_and_export_obj(input_path, os.path.join(job_dir, "model_processed.obj"))
+
+
+def _process_and_export_obj(input_path: str, output_path: str):
+    import bpy
+    from utils import import_glb_merge_vertices
+
+    # Clear the current scene
+    bpy.ops.object.select_all(action='SELECT')
+    bpy.ops.object.delete()
+
+    # Import the GLB
+    merged_obj = import_glb_merge_vertices(input_path)
+
+    bpy.context.view_layer.objects.active = merged_obj
+    bpy.ops.object.mode_set(mode='EDIT')
+    bpy.ops.mesh.select_all(action='SELECT')
+    bpy.ops.uv.smart_project()
+    bpy.ops.mesh.select_all(action='DESELECT')
+    bpy.ops.object.mode_set(mode='OBJECT')
+
+    # Add one iteration of subdivision surface before UV unwrapping
+    subdiv = merged_obj.modifiers.new(name="Subdivision", type='SUBSURF')
+    subdiv.levels = 1
+    subdiv.render_levels = 1
+    # Apply the modifier so the subdivision becomes part of the mesh geometry
+    bpy.ops.object.modifier_apply(modifier="Subdivision")
+
+    # Set shading to smooth for all polygons
+    for poly in merged_obj.data.polygons:
+        poly.use_smooth = True
+
+    # Export the processed mesh as OBJ
+    bpy.ops.wm.obj_export(filepath=output_path)
+
+    with open(output_path, "rb") as f:
+        obj_data = f.read()
+    return obj_data
@@ -0,0 +1,271 @@
+"""
+Pool of long-lived Blender worker processes.
+
+bpy drives a single scene per process, so running Blender jobs in the API process
+serialises them and lets two requests clear each other's scene. Each worker here owns
+its own bpy, resets the scene before every job and answers requests sent over a pipe:
+
+    request:  (method, args, kwargs)    response: ("ok", result) or ("error", traceback)
+
+A worker that crashes or times out is killed and restarted, and the job fails with
+BlenderWorkerError. StubWorker implements the same interface without bpy, so the
+protocol and the pool can be exercised anywhere.
+"""
+import os
+import queue
+import threading
+import traceback
+import multiprocessing
+import concurrent.futures
+
+
+class BlenderWorkerError(RuntimeError):
+    """
+    A job failed inside a worker, or the worker died or timed out while running it.
+    """
+
+
+class BlenderWorker:
+    """
+    Runs inside a worker process, one method per kind of Blender job.
+    """
+
+    def __init__(self):
+        import bpy
+        self.bpy = bpy
+
+    def ping(self):
+        return os.getpid()
+
+    def reset(self):
+        # Factory startup scene, which also drops the images and materials of the last job
+        self.bpy.ops.wm.read_factory_settings(use_empty=False)
+
+    def process_and_export_obj(self, model):
+        from blender_export import process_and_export_obj
+        return process_and_export_obj(model)
+
+    def retex_and_bake(self, model_path, material_json, hdri_path, hdri_strength, texture_size, denoise, samples, cache_dir=None, bake_mode="cycles"):
+        from retex_and_bake import retex_and_bake_endpoint
+        return retex_and_bake_endpoint(model_path, material_json, hdri_path, hdri_strength, texture_size, denoise, samples, cache_dir=cache_dir, bake_mode=bake_mode)
+
+    def bake_shard(self, model_path, hdri_path, hdri_strength, tasks, bake_dir, resolution, denoise, samples, device="GPU", threads=0, cache_dir=None, max_texture_size=None):
+        from retex_and_bake import bake_shard
+        return bake_shard(model_path, hdri_path, hdri_strength, tasks, bake_dir, resolution, denoise, samples, device=device, threads=threads, cache_dir=cache_dir, max_texture_size=max_texture_size)
+
+    def model_to_views(self, model_path, output_path, num_views=4, renderer="blender", angles=None):
+        from model_to_views import model_to_views
+        return model_to_views(model_path=model_path, output_path=output_path, num_views=num_views, renderer=renderer, angles=angles)
+
+
+class StubWorker:
+    """
+    Same interface as BlenderWorker without bpy, echoing its inputs, for testing the pool.
+    """
+
+    def ping(self):
+        return os.getpid()
+
+    def reset(self):
+        pass
+
+    def process_and_export_obj(self, model):
+        return model if isinstance(model, bytes) else open(model, "rb").read()
+
+    def retex_and_bake(self, model_path, material_json, hdri_path, hdri_strength, texture_size, denoise, samples, cache_dir=None, bake_mode="cycles"):
+        bake_dir = os.path.join(os.path.dirname(model_path), "baked_textures")
+        os.makedirs(bake_dir, exist_ok=True)
+
+    def bake_shard(self, model_path, hdri_path, hdri_strength, tasks, bake_dir, resolution, denoise, samples, device="GPU", threads=0, cache_dir=None, max_texture_size=None):
+        for i, job, context in tasks:
+            group_bake_dir = os.path.join(bake_dir, f"material_group_{i}")
+            os.makedirs(group_bake_dir, exist_ok=True)
+            for name in job.names:
+                with open(os.path.join(group_bake_dir, name + ".jpg"), "w") as f:
+                    f.write(f"{job.key} {len(context)} {os.getpid()}")
+        return {"bakes": len(tasks), "seconds": 0.0, "assets": {"hits": 0, "memory_hits": 0, "misses": 0, "load_seconds": 0.0}}
+
+    def model_to_views(self, model_path, output_path, num_views=4, renderer="blender", angles=None):
+        if angles is None:
+            angles = [i * 360 / num_views for i in range(num_views)]
+        return [os.path.join(output_path, f"{angle:.2f}.png") for angle in angles]
+
+    def crash(self):
+        os._exit(1)
+
+
+def _worker_main(conn, worker_cls):
+    worker = worker_cls()
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+        if message is None:
+            break
+        method, args, kwargs = message
+        try:
+            if method != "ping":
+                worker.reset()
+            conn.send(("ok", getattr(worker, method)(*args, **kwargs)))
+        except Exception:
+            conn.send(("error", traceback.format_exc()))
+
+
+class _WorkerHandle:
+    """
+    The API side of one worker process.
+    """
+
+    def __init__(self, context, worker_cls):
+        self.context = context
+        self.worker_cls = worker_cls
+        self.restarts = 0
+        self._start()
+
+    def _start(self):
+        self.conn, child_conn = self.context.Pipe()
+        self.process = self.context.Process(target=_worker_main, args=(child_conn, self.worker_cls), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def restart(self):
+        self.stop(timeout=0)
+        self.restarts += 1
+        self._start()
+
+    def stop(self, timeout=5):
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+    def request(self, method, args, kwargs, timeout=None):
+        try:
+            self.conn.send((method, args, kwargs))
+            if not self.conn.poll(timeout):
+                self.restart()
+                raise BlenderWorkerError(f"Blender worker timed out after {timeout} s running '{method}'")
+            status, result = self.conn.recv()
+        except (EOFError, BrokenPipeError, ConnectionResetError):
+            exitcode = self.process.exitcode
+            self.restart()
+            raise BlenderWorkerError(f"Blender worker died running '{method}' (exit code {exitcode})")
+        if status == "error":
+            raise BlenderWorkerError(f"'{method}' failed in Blender worker:\n{result}")
+        return result
+
+
+class BlenderPool:
+    """
+    Pool of worker processes, each running one job at a time.
+
+    Parameters:
+        num_workers (int): Number of worker processes.
+        worker_cls (type): Worker implementation, BlenderWorker or StubWorker.
+        timeout (float): Seconds a job may run before its worker is restarted, None for no limit.
+    """
+
+    def __init__(self, num_workers=1, worker_cls=BlenderWorker, timeout=None):
+        # spawn, so workers never inherit the CUDA context or locks of the API process
+        context = multiprocessing.get_context("spawn")
+        self.timeout = timeout
+        self._handles = [_WorkerHandle(context, worker_cls) for _ in range(num_workers)]
+        self._idle = queue.Queue()
+        for handle in self._handles:
+            self._idle.put(handle)
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=num_workers)
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def call(self, method, *args, **kwargs):
+        """
+        Run a job on the next idle worker, blocking until it is done.
+        """
+        if self._closed:
+            raise RuntimeError("BlenderPool is closed")
+        handle = self._idle.get()
+        try:
+            return handle.request(method, args, kwargs, self.timeout)
+        finally:
+            self._idle.put(handle)
+
+    def submit(self, method, *args, **kwargs):
+        """
+        Run a job on the next idle worker, returning a concurrent.futures.Future.
+        """
+        return self._executor.submit(self.call, method, *args, **kwargs)
+
+    def health_check(self, timeout=10):
+        """
+        Ping every idle worker, restarting those that do not answer.
+
+        Returns:
+            list: PID of each pinged worker, or None if it had to be restarted.
+        """
+        pids = []
+        handles = []
+        while True:
+            try:
+                handles.append(self._idle.get_nowait())
+            except queue.Empty:
+                break
+        for handle in handles:
+            try:
+                pids.append(handle.request("ping", (), {}, timeout))
+            except BlenderWorkerError:
+                pids.append(None)
+            self._idle.put(handle)
+        return pids
+
+    @property
+    def size(self):
+        return len(self._handles)
+
+    @property
+    def restarts(self):
+        return sum(handle.restarts for handle in self._handles)
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._executor.shutdown(wait=True)
+        for handle in self._handles:
+            handle.stop()
+
+
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+
+def get_blender_pool():
+    """
+    Process-wide pool, sized by the BLENDER_WORKERS environment variable (default 2).
+    """
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            timeout = os.environ.get("BLENDER_TIMEOUT")
+            _default_pool = BlenderPool(
+                num_workers=int(os.environ.get("BLENDER_WORKERS", 2)),
+                timeout=float(timeout) if timeout else None,
+            )
+        return _default_pool
+
+
+def shutdown_blender_pool():
+    """
+    Stop the workers of the process-wide pool, if it was started.
+    """
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is not None:
+            _default_pool.close()
+        _default_pool = None
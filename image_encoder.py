@@ -0,0 +1,93 @@
+"""
+Background encoding of baked textures.
+
+Blender operators hold the GIL while they run, so a bake blocks every Python thread that
+is not inside C code releasing it. Images are therefore encoded with cv2.imwrite, which
+releases the GIL for the whole encode, and submit() returns once the encode has started,
+so it runs during the next bake instead of waiting for it.
+"""
+import os
+import time
+import threading
+import concurrent.futures
+import cv2
+from utils import hidden_temp_path
+
+
+def encode_image(pixels, path, quality=95):
+    """
+    Write an RGB or RGBA uint8 image (rows top to bottom) as JPEG, PNG or WebP, by extension.
+    The file appears under `path` only once it is complete.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext in (".jpg", ".jpeg"):
+        params = [cv2.IMWRITE_JPEG_QUALITY, quality]
+    elif ext == ".webp":
+        params = [cv2.IMWRITE_WEBP_QUALITY, quality]
+    elif ext == ".png":
+        params = [cv2.IMWRITE_PNG_COMPRESSION, 3]
+    else:
+        raise ValueError(f"Unsupported image format '{ext}', expected .jpg, .png or .webp")
+    if pixels.shape[2] == 4 and ext in (".jpg", ".jpeg"):
+        bgr = cv2.cvtColor(pixels, cv2.COLOR_RGBA2BGR)
+    else:
+        bgr = cv2.cvtColor(pixels, cv2.COLOR_RGBA2BGRA if pixels.shape[2] == 4 else cv2.COLOR_RGB2BGR)
+    tmp_path = hidden_temp_path(path)
+    if not cv2.imwrite(tmp_path, bgr, params):
+        raise RuntimeError(f"Could not write {path}")
+    os.replace(tmp_path, path)
+
+
+class ImageEncoder():
+    """
+    Encodes images on background threads, at most `max_workers` at a time.
+
+    Parameters:
+        max_workers (int): Encoding threads. Submitting blocks while they are all busy,
+            which bounds the images held in memory.
+        quality (int): JPEG and WebP quality.
+    """
+    def __init__(self, max_workers=2, quality=95):
+        self.quality = quality
+        self.encode_seconds = 0.0
+        self.count = 0
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+        self._slots = threading.Semaphore(max_workers)
+        self._futures = []
+        self._lock = threading.Lock()
+
+    def _encode(self, pixels, path, on_saved, started):
+        try:
+            started.set()
+            start = time.time()
+            encode_image(pixels, path, self.quality)
+            if on_saved is not None:
+                on_saved(path)
+            with self._lock:
+                self.encode_seconds += time.time() - start
+                self.count += 1
+        finally:
+            self._slots.release()
+
+    def submit(self, pixels, path, on_saved=None):
+        """
+        Encode `pixels` to `path` in the background, then call on_saved(path) there.
+        """
+        self._slots.acquire()
+        started = threading.Event()
+        self._futures.append(self._executor.submit(self._encode, pixels, path, on_saved, started))
+        started.wait()
+
+    def wait(self):
+        """
+        Wait for the submitted images, raising the first encoding error.
+        """
+        futures, self._futures = self._futures, []
+        for future in futures:
+            future.result()
+
+    def close(self):
+        try:
+            self.wait()
+        finally:
+            self._executor.shutdown(wait=True)
@@ -0,0 +1,85 @@
+"""
+Materials of a retexture job, as listed in the material JSON (see material-example.json).
+"""
+import os
+import json
+
+
+class Material():
+    # Each argument should contain a filepath to the image
+    def __init__(self, name, diffuse, roughness=None, metallic=None, normal=None, ao=None, orm=None, scale=1.0):
+        self.name = name
+        self.diffuse = diffuse
+        self.roughness = roughness
+        self.metallic = metallic
+        self.normal = normal
+        self.ao = ao
+        self.orm = orm    # new attribute for Occlusion/Roughness/Metallic texture
+        self.scale = scale
+
+
+    # helper to create a blender material with nodes
+    @staticmethod
+    def make_blender_material(name):
+        import bpy
+        mat = bpy.data.materials.get(name) or bpy.data.materials.new(name)
+        mat.use_nodes = True
+        nodes = mat.node_tree.nodes
+        links = mat.node_tree.links
+        nodes.clear()
+        out = nodes.new('ShaderNodeOutputMaterial')
+        out.location = (300, 0)
+        bsdf = nodes.new('ShaderNodeBsdfPrincipled')
+        bsdf.location = (0, 0)
+        links.new(bsdf.outputs['BSDF'], out.inputs['Surface'])
+        return mat, nodes, links, bsdf
+    
+
+    # helper to set up UV→Mapping once per material
+    def add_uv_mapping(self, nodes, links):
+        coord = nodes.new('ShaderNodeTexCoord')
+        coord.location = (-900, 200)
+        mapping = nodes.new('ShaderNodeMapping')
+        mapping.location = (-600, 200)
+        mapping.inputs['Scale'].default_value = (self.scale, self.scale, self.scale)
+        links.new(coord.outputs['UV'], mapping.inputs['Vector'])
+        return mapping
+
+
+def read_json_materials(json_path):
+    """
+    Reads a JSON file containing material information and returns a dictionary of materials.
+    
+    Parameters:
+        json_path (str): Path to the JSON file.
+        
+    Returns:
+        dict: Dictionary containing material names as keys and Material objects as values.
+    """
+    with open(json_path, 'r') as f:
+        data = json.load(f)
+
+    base_dir = os.path.dirname(json_path)
+    
+    material_list = []
+
+    for group in data:
+        group_materials = []
+        for material in group:
+            # Creates Material objects for each material in the JSON file
+            # Values without a default are set to None if not found
+            group_materials.append(
+                Material(
+                    name=material.get("name"),
+                    diffuse=os.path.join(base_dir, material.get("diffuse")) if material.get("diffuse") else None,
+                    roughness=os.path.join(base_dir, material.get("roughness")) if material.get("roughness") else None,
+                    metallic=os.path.join(base_dir, material.get("metallic")) if material.get("metallic") else None,
+                    normal=os.path.join(base_dir, material.get("normal")) if material.get("normal") else None,
+                    ao=os.path.join(base_dir, material.get("ambient_occlusion")) if material.get("ambient_occlusion") else None,
+                    orm=os.path.join(base_dir, material.get("orm")) if material.get("orm") else None,
+                    scale=material.get("scale", 1.0)
+                )
+            )
+        material_list.append(group_materials)
+    
+    return material_list
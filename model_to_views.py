@@ -1,14 +1,26 @@
-import bpy
 import os
 import math
-from utils import import_glb_merge_vertices
+from utils import import_glb_merge_vertices, hidden_temp_path
 
 
 # returns a list of the paths to the output images
-def model_to_views(model_path, output_path, num_views=4):
+def model_to_views(model_path, output_path, num_views=4, renderer="blender", angles=None):
+    """
+    Renders a turntable of the model, one PNG per angle.
+
+    Parameters:
+        renderer (str): "blender" renders each view with Blender, "fast" renders all views
+            with the torch rasterizer of turntable_renderer, without Blender.
+        angles (list): Angles to render, in degrees, instead of `num_views` angles evenly
+            spread over a full turn.
+    """
     if not os.path.exists(model_path):
         raise RuntimeError(f"Input file not found: {model_path}")
+    if renderer == "fast":
+        from turntable_renderer import render_turntable
+        return render_turntable(model_path, output_path, num_views=num_views, angles=angles)
 
+    import bpy
     scn = bpy.context.scene
 
     scn.render.image_settings.file_format = 'PNG'
@@ -43,19 +55,19 @@ def model_to_views(model_path, output_path, num_views=4):
 
     cam1.lens = 45
 
-    angle_delta = 360 / num_views
+    if angles is None:
+        angles = [i * 360 / num_views for i in range(num_views)]
     paths = []
-    angle = 0.0
-    while angle < 360:
+    for angle in angles:
         merged_obj.rotation_euler = (0, 0, math.radians(angle))
         bpy.context.view_layer.update()
 
         path = os.path.join(output_path, f"{angle:.2f}.png")
         paths.append(path)
-        scn.render.filepath = path
+        # rendered under a hidden name, so the view only appears once it is written
+        scn.render.filepath = hidden_temp_path(path)
         bpy.ops.render.render(write_still=True)
-
-        angle += angle_delta
+        os.replace(scn.render.filepath, path)
     
     return paths
 
@@ -1,6 +1,5 @@
 import os
 import torch
-import bpy
 # os.environ['ATTN_BACKEND'] = 'xformers'   # Can be 'flash-attn' or 'xformers', default is 'flash-attn'
 os.environ['SPCONV_ALGO'] = 'native'        # Can be 'native' or 'auto', default is 'auto'.
                                             # 'auto' is faster but will do benchmarking at the beginning.
@@ -10,9 +9,9 @@ import numpy as np
 import imageio
 from PIL import Image
 from trellis.pipelines import TrellisImageTo3DPipeline
-from trellis.utils import render_utils, postprocessing_utils
+from trellis.utils import render_utils, postprocessing_utils, finishing_utils
 import rembg
-from utils import import_glb_merge_vertices
+from blender_export import process_and_export_obj
 
 
 def remove_all_backgrounds(images):
@@ -32,7 +31,7 @@ def remove_all_backgrounds(images):
     return images
 
 
-def trellis_multiple_images(images, postprocessing=True, sparse_structure_sampler_strength=16, slat_sampler_strength=3):
+def trellis_multiple_images(images, postprocessing=True, sparse_structure_sampler_strength=16, slat_sampler_strength=3, metrics=None, bake_mode='opt', finishing='numpy', preview_path=None, preview_frames=120, splat_path=None):
     # Load a pipeline from a model folder or a Hugging Face model hub.
     pipeline = TrellisImageTo3DPipeline.from_pretrained("jetx/TRELLIS-image-large")
     pipeline.cuda()
@@ -69,6 +68,14 @@ def trellis_multiple_images(images, postprocessing=True, sparse_structure_sample
     # video = [np.concatenate([frame_gs, frame_mesh], axis=1) for frame_gs, frame_mesh in zip(video_gs, video_mesh)]
     # imageio.mimsave(os.path.join(output_dir, "video.mp4"), video, fps=30)
 
+    if preview_path is not None:
+        # Frames are encoded while the next ones render, never held all at once
+        render_utils.render_video_to_file(outputs['gaussian'][0], preview_path, num_frames=preview_frames, verbose=False)
+
+    if splat_path is not None:
+        # Compact Gaussians for the web previewer, shipped alongside the GLB
+        outputs['gaussian'][0].save_splat(splat_path)
+
     torch.cuda.empty_cache()
 
     # GLB files can be extracted from the outputs
@@ -78,65 +85,20 @@ def trellis_multiple_images(images, postprocessing=True, sparse_structure_sample
         # Optional parameters
         simplify=0.95,          # Ratio of triangles to remove in the simplification process
         texture_size=1024,      # Size of the texture used for the GLB
+        bake_mode=bake_mode,    # 'vertex' skips Gaussian rendering and uses the decoded vertex colors
+        metrics=metrics,        # Records statistics of the conversion
     )
 
-    os.makedirs("tmp", exist_ok=True)
-    glb.export(os.path.join("tmp", "model.glb"))
+    if postprocessing and finishing == 'numpy':
+        # Weld, subdivide and smooth in numpy, keeping the xatlas UVs, without starting Blender
+        return finishing_utils.finish_to_obj(glb)
+
+    # Export to memory, so concurrent jobs never share a file
+    glb_data = glb.export(file_type='glb')
 
     if postprocessing:
-        return process_and_export_obj(os.path.join("tmp", "model.glb"))
-    else:
-        with open(os.path.join("tmp", "model.glb"), "rb") as f:
-            glb_data = f.read()
-        return glb_data
-
-
-def process_and_export_obj(input_path: str):
-    """
-    Imports a GLB file, merges all mesh vertices by distance,
-    performs a Smart UV project, and exports the mesh as a OBJ.
-
-    Parameters:
-        input_path (str): File path to the input GLB.
-        output_path (str): File path for the exported OBJ.
-        merge_distance (float): Distance threshold for merging vertices.
-    """
-
-    if not os.path.exists(input_path):
-        raise RuntimeError(f"Input file not found: {input_path}")
-
-    # Clear the current scene
-    bpy.ops.object.select_all(action='SELECT')
-    bpy.ops.object.delete()
-
-    # Import the GLB
-    merged_obj = import_glb_merge_vertices(input_path)
-
-    bpy.context.view_layer.objects.active = merged_obj
-    bpy.ops.object.mode_set(mode='EDIT')
-    bpy.ops.mesh.select_all(action='SELECT')
-    bpy.ops.uv.smart_project()
-    bpy.ops.mesh.select_all(action='DESELECT')
-    bpy.ops.object.mode_set(mode='OBJECT')
-
-    # Add one iteration of subdivision surface before UV unwrapping
-    subdiv = merged_obj.modifiers.new(name="Subdivision", type='SUBSURF')
-    subdiv.levels = 1
-    subdiv.render_levels = 1
-    # Apply the modifier so the subdivision becomes part of the mesh geometry
-    bpy.ops.object.modifier_apply(modifier="Subdivision")
-
-    # Set shading to smooth for all polygons
-    for poly in merged_obj.data.polygons:
-        poly.use_smooth = True
-
-    # Export the processed mesh as OBJ
-    temp_path = os.path.join("tmp", "model_processed.obj")
-    bpy.ops.wm.obj_export(filepath=temp_path)
-
-    with open(temp_path, "rb") as f:
-        obj_data = f.read()
-    return obj_data
+        return process_and_export_obj(glb_data)
+    return glb_data
 
 
 if __name__ == "__main__":
@@ -0,0 +1,77 @@
+"""
+Disk cache of rendered views.
+
+A view is identified by what its pixels depend on: the GLB content, the angle, the
+renderer, the resolution, the lens and the background. Turntables of 4, 8, 16 and 32
+views share their angles, so a request only renders the views no earlier request did.
+The cache is capped in size, evicting the least recently used views first.
+"""
+import os
+import json
+import hashlib
+import threading
+from bake_planner import file_hash
+from utils import copy_file_atomic
+
+
+class RenderCache():
+    """
+    Directory of rendered views, named by view key.
+
+    Parameters:
+        cache_dir (str): Folder of the cache.
+        max_bytes (int): Size above which the least recently used views are evicted.
+    """
+    def __init__(self, cache_dir, max_bytes=2 << 30):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key(model_path, angle, renderer, resolution, lens, background):
+        payload = json.dumps([file_hash(model_path), round(float(angle), 6), renderer, int(resolution), float(lens), list(background)])
+        return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.png")
+
+    def fetch(self, key, output):
+        """
+        Copy the cached view of `key` to `output`, returning False on a miss.
+        """
+        try:
+            copy_file_atomic(self.path(key), output)
+            # the modification time orders the views for eviction
+            os.utime(self.path(key))
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return False
+        with self._lock:
+            self.hits += 1
+        return True
+
+    def store(self, key, path):
+        copy_file_atomic(path, self.path(key))
+
+    def trim(self):
+        """
+        Evict the least recently used views until the cache fits in max_bytes.
+        """
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and not entry.name.startswith("."):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
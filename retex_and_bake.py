@@ -5,52 +5,49 @@ from mathutils import Euler, Vector
 import math
 import numpy as np
 from PIL import Image
-from utils import import_glb_merge_vertices
+from utils import import_glb_merge_vertices, copy_file_atomic
 from pathlib import Path
+import shutil
+import time
+from bake_planner import BakeCache, plan_bakes
+from materials import Material, read_json_materials
+from blender_assets import get_asset_cache
+from image_encoder import ImageEncoder, encode_image
 
 DENOISE = True  # Set to True if you want to use denoising
 
-class Material():
-    # Each argument should contain a filepath to the image
-    def __init__(self, name, diffuse, roughness=None, metallic=None, normal=None, ao=None, orm=None, scale=1.0):
-        self.name = name
-        self.diffuse = diffuse
-        self.roughness = roughness
-        self.metallic = metallic
-        self.normal = normal
-        self.ao = ao
-        self.orm = orm    # new attribute for Occlusion/Roughness/Metallic texture
-        self.scale = scale
-
-
-    # helper to create a blender material with nodes
-    @staticmethod
-    def make_blender_material(name):
-        mat = bpy.data.materials.get(name) or bpy.data.materials.new(name)
-        mat.use_nodes = True
-        nodes = mat.node_tree.nodes
-        links = mat.node_tree.links
-        nodes.clear()
-        out = nodes.new('ShaderNodeOutputMaterial')
-        out.location = (300, 0)
-        bsdf = nodes.new('ShaderNodeBsdfPrincipled')
-        bsdf.location = (0, 0)
-        links.new(bsdf.outputs['BSDF'], out.inputs['Surface'])
-        return mat, nodes, links, bsdf
-    
+# float32 readback buffers, by pixel count, reused across bakes
+_readback_buffers = {}
 
-    # helper to set up UV→Mapping once per material
-    def add_uv_mapping(self, nodes, links):
-        coord = nodes.new('ShaderNodeTexCoord')
-        coord.location = (-900, 200)
-        mapping = nodes.new('ShaderNodeMapping')
-        mapping.location = (-600, 200)
-        mapping.inputs['Scale'].default_value = (self.scale, self.scale, self.scale)
-        links.new(coord.outputs['UV'], mapping.inputs['Vector'])
-        return mapping
-    
 
-def bake_texture(mesh, img_name, image_size, denoise, bake_dir=None):
+def read_pixels(img):
+    """
+    The pixels of an image as a (height, width, 4) uint8 array, rows top to bottom.
+    """
+    width, height = img.size
+    buffer = _readback_buffers.get(width * height)
+    if buffer is None:
+        buffer = _readback_buffers[width * height] = np.empty(width * height * 4, dtype=np.float32)
+    # foreach_get copies straight into the buffer, where img.pixels[:] builds a list of Python floats
+    img.pixels.foreach_get(buffer)
+    np.multiply(buffer, 255.0, out=buffer)
+    np.add(buffer, 0.5, out=buffer)
+    np.clip(buffer, 0.0, 255.0, out=buffer)
+    # Blender stores the bottom row first
+    return np.ascontiguousarray(buffer.astype(np.uint8).reshape(height, width, 4)[::-1])
+
+
+def bake_texture(mesh, img_name, image_size, denoise, bake_dir=None, encoder=None, on_saved=None):
+    """
+    Bakes the COMBINED pass of the mesh into a new image.
+
+    Parameters:
+        bake_dir (str): Folder the bake is saved to as img_name.jpg. Without it, the bake
+            is returned as a PIL image.
+        encoder (ImageEncoder): Encodes the JPEG in the background, so the next bake can
+            start, optional.
+        on_saved (callable): Called with the path of the JPEG once it is written.
+    """
     #Create blank image
     img = bpy.data.images.new(img_name, width=image_size, height=image_size)
 
@@ -77,31 +74,22 @@ def bake_texture(mesh, img_name, image_size, denoise, bake_dir=None):
     mesh.data.update()  # refresh the data
 
     print("Baking texture:", img_name)
-    bpy.context.scene.cycles.device = "GPU"  # use GPU if available
     bpy.context.scene.cycles.use_denoising = denoise  # disable denoising to fix seam issues
     bpy.ops.object.bake(type='COMBINED', use_clear=True)
     print("Bake complete")
 
+    pixel_data = read_pixels(img)
     if bake_dir:
-        # # 5) Save out the result
-        # img.filepath_raw = os.path.join(bake_dir, img_name + ".png")
-        # img.file_format = 'PNG'
-        # img.save()
-
         # 5) Save out the result as JPEG at 95% quality
         jpg_filepath = os.path.join(bake_dir, img_name + ".jpg")
-        img.filepath_raw = jpg_filepath
-        img.file_format = 'JPEG'
-        img.save(quality=95)
+        if encoder is not None:
+            encoder.submit(pixel_data, jpg_filepath, on_saved)
+        else:
+            encode_image(pixel_data, jpg_filepath, quality=95)
+            if on_saved is not None:
+                on_saved(jpg_filepath)
 
     else:
-        # Retrieve pixel data from the baked image
-        # Blender stores pixels as a flat array (R, G, B, A, R, G, B, A, ...)
-        pixel_data = np.array(img.pixels[:])
-        # Convert values to 0-255 and cast to uint8
-        pixel_data = (pixel_data * 255).astype(np.uint8)
-        # Reshape to (height, width, 4)
-        pixel_data = pixel_data.reshape((image_size, image_size, 4))
         pil_img = Image.fromarray(pixel_data, mode="RGBA")
 
     # 6) Cleanup: remove the bake‐target nodes and image
@@ -117,7 +105,37 @@ def bake_texture(mesh, img_name, image_size, denoise, bake_dir=None):
   
     
 
-def apply_material(mesh, material, slot):
+def apply_material(mesh, material, slot, built=None, fingerprint=None, max_texture_size=None):
+    """
+    Assigns a material to a slot of the mesh, building its node tree.
+
+    Parameters:
+        built (dict): Blender materials already built, by material fingerprint. If given,
+            a material is built once and then only re-assigned.
+        fingerprint (str): Fingerprint of the material, required with `built`.
+        max_texture_size (int): Textures larger than this are downscaled to it, optional.
+    """
+    if built is not None and fingerprint in built:
+        mat = built[fingerprint]
+    else:
+        # a fingerprinted name, so that two different materials with the same name never share a node tree
+        name = material.name if built is None else f"{material.name} [{fingerprint[:8]}]"
+        mat = _build_material(material, name, max_texture_size=max_texture_size)
+        if built is not None:
+            built[fingerprint] = mat
+
+    # assign the material to the desired slot only if that slot exists and is not empty
+    if slot < len(mesh.material_slots):
+        if mesh.material_slots[slot].material:
+            mesh.material_slots[slot].material = mat
+            print(f"Material '{material.name}' assigned to slot {slot}.")
+        else:
+            print(f"Slot {slot} is empty; not assigning material.")
+    else:
+        print(f"Slot {slot} does not exist on the object; no material assigned.")
+
+
+def _build_material(material, name, max_texture_size=None):
     # helper to add an Image Texture node and link its vector
     def add_image(nodes, links, mapping, path, loc):
         if not path or not os.path.isfile(path):
@@ -126,7 +144,7 @@ def apply_material(mesh, material, slot):
         
         # change to absolute path for blender
         path = str(Path(path).resolve())
-        img = bpy.data.images.load(path)
+        img = get_asset_cache().image(path, max_size=max_texture_size)
         img_node = nodes.new('ShaderNodeTexImage')
         img_node.image = img
         img_node.location = loc
@@ -134,8 +152,7 @@ def apply_material(mesh, material, slot):
         return img_node
 
 
-    name = material.name
-    print("Applying material name:", name)
+    print("Building material:", name)
 
     mat, nodes, links, bsdf = material.make_blender_material(name)
     mapping = material.add_uv_mapping(nodes, links)
@@ -199,43 +216,42 @@ def apply_material(mesh, material, slot):
                 links.new(sep_rgb.outputs['R'], mix_occlusion.inputs[2])
                 links.new(mix_occlusion.outputs['Color'], bsdf.inputs['Base Color'])
 
+    return mat
 
-    # assign the material to the desired slot only if that slot exists and is not empty
-    if slot < len(mesh.material_slots):
-        if mesh.material_slots[slot].material:
-            mesh.material_slots[slot].material = mat
-            print(f"Material '{name}' assigned to slot {slot}.")
-        else:
-            print(f"Slot {slot} is empty; not assigning material.")
-    else:
-        print(f"Slot {slot} does not exist on the object; no material assigned.")
 
+def setup_cycles_bake(mesh, samples, device="GPU", threads=0):
+    """
+    Configures Cycles for COMBINED bakes of the mesh.
 
-def bake_materials_seperately(materials, mesh, resolution, denoise, samples, bake_dir=None):
-    if not bake_dir:
-        img_list = []
-    else:
-        # ensure output folder exists
-        os.makedirs(bake_dir, exist_ok=True)
-
+    Parameters:
+        device (str): "GPU" bakes on all CUDA devices, "CPU" on the CPU only.
+        threads (int): Render threads of this process, 0 for one per core.
+    """
     if mesh is None:
         raise RuntimeError("No mesh object found. Please check the model path.")
 
     # force Cycles
     bpy.context.scene.render.engine = "CYCLES"
-    # Set the device_type
-    bpy.context.preferences.addons[
-        "cycles"
-    ].preferences.compute_device_type = "CUDA"
-
-    bpy.context.scene.cycles.device = "GPU"  # use GPU if available
+    cycles_preferences = bpy.context.preferences.addons["cycles"].preferences
+    if device == "GPU":
+        # Set the device_type
+        cycles_preferences.compute_device_type = "CUDA"
+        bpy.context.scene.cycles.device = "GPU"  # use GPU if available
+
+        # get_devices() to let Blender detects GPU device
+        cycles_preferences.get_devices()
+        print(cycles_preferences.compute_device_type)
+        for d in cycles_preferences.devices:
+            d["use"] = 1 # Using all devices, include GPU and CPU
+            print(d["name"], d["use"])
+    else:
+        cycles_preferences.compute_device_type = "NONE"
+        bpy.context.scene.cycles.device = "CPU"
 
-    # get_devices() to let Blender detects GPU device
-    bpy.context.preferences.addons["cycles"].preferences.get_devices()
-    print(bpy.context.preferences.addons["cycles"].preferences.compute_device_type)
-    for d in bpy.context.preferences.addons["cycles"].preferences.devices:
-        d["use"] = 1 # Using all devices, include GPU and CPU
-        print(d["name"], d["use"])
+    # a fixed thread count keeps several bake processes from oversubscribing the CPU
+    bpy.context.scene.render.threads_mode = "FIXED" if threads else "AUTO"
+    if threads:
+        bpy.context.scene.render.threads = threads
 
     bpy.context.scene.cycles.bake_type = 'COMBINED'
     bpy.context.scene.cycles.samples = samples  # adjust as needed
@@ -252,26 +268,152 @@ def bake_materials_seperately(materials, mesh, resolution, denoise, samples, bak
     if len(mesh.material_slots) == 0:
          bpy.data.materials.new("Material")
 
-    for i in range(len(materials)):
-        group_bake_dir = os.path.join(bake_dir, f"material_group_{i}")
-        os.makedirs(group_bake_dir, exist_ok=True)
-        group = materials[i]
-        if i > len(mesh.material_slots):
-            print(f"Warning: Not enough material slots for group {i}.")
-            break
-        for mat in group:
-            apply_material(mesh, mat, i)
-
-            name = mat.name
-            if bake_dir:
-                bake_texture(mesh, name, bake_dir=group_bake_dir, image_size=resolution, denoise=denoise)
-            else:
-                img_list.append(bake_texture(mesh, name, image_size=resolution, denoise=denoise))
-    
 
+def _store_outputs(outputs, cache, key):
+    """
+    Callback of a saved bake: copies it to the other outputs of its job and to the cache.
+    """
+    def on_saved(path):
+        for output in outputs[1:]:
+            copy_file_atomic(path, output)
+        if cache is not None:
+            cache.store(key, path)
+    return on_saved
+
+
+def _print_throughput(num_bakes, seconds, encoder):
+    if encoder is None or not num_bakes:
+        return
+    print(f"{num_bakes} bakes in {seconds:.1f} s ({num_bakes * 60 / seconds:.1f} per minute), "
+          f"{encoder.encode_seconds:.1f} s of JPEG encoding overlapped with baking")
+
+
+def bake_materials_seperately(materials, mesh, resolution, denoise, samples, bake_dir=None, plan=None, cache=None, device="GPU", threads=0, max_texture_size=None, encoder_threads=2):
+    """
+    Bakes every material of every group, following a BakePlan: each distinct bake runs
+    once, bakes in the cache are copied from it, and node trees are built once per material.
+
+    Parameters:
+        plan (BakePlan): Plan of the bakes, see bake_planner.plan_bakes. Planned without
+            mesh and HDRI hashes if not given, which still deduplicates within this call.
+        cache (BakeCache): Cache to serve and store the bakes, used when baking to bake_dir.
+        device (str): "GPU" or "CPU", see setup_cycles_bake.
+        threads (int): Render threads, 0 for one per core.
+        max_texture_size (int): Textures larger than this are downscaled to it, optional.
+        encoder_threads (int): Threads encoding the JPEGs while the next bake runs, 0 to
+            encode them before the next bake.
+    """
+    if plan is None:
+        plan = plan_bakes(materials, None, None, 0, resolution, denoise, samples)
+    if not bake_dir:
+        images = {}
+    else:
+        # ensure output folder exists
+        os.makedirs(bake_dir, exist_ok=True)
+
+    setup_cycles_bake(mesh, samples, device=device, threads=threads)
+
+    print(plan.summary())
+    encoder = ImageEncoder(max_workers=encoder_threads) if bake_dir and encoder_threads else None
+    start = time.time()
+    num_bakes = 0
+    built = {}
+    num_groups = 0
+    try:
+        for i in range(len(materials)):
+            if bake_dir:
+                group_bake_dir = os.path.join(bake_dir, f"material_group_{i}")
+                os.makedirs(group_bake_dir, exist_ok=True)
+            if i > len(mesh.material_slots):
+                print(f"Warning: Not enough material slots for group {i}.")
+                break
+            num_groups += 1
+            applied = None
+            for job in plan.groups[i]:
+                if bake_dir:
+                    outputs = [os.path.join(group_bake_dir, name + ".jpg") for name in job.names]
+                    if cache is not None and cache.fetch(job.key, outputs):
+                        print(f"Bake cache hit: {job.names[0]} (group {i})")
+                        continue
+                apply_material(mesh, job.material, i, built=built, fingerprint=job.fingerprint, max_texture_size=max_texture_size)
+                applied = job.key
+
+                if bake_dir:
+                    bake_texture(mesh, job.names[0], bake_dir=group_bake_dir, image_size=resolution, denoise=denoise,
+                                 encoder=encoder, on_saved=_store_outputs(outputs, cache, job.key))
+                    num_bakes += 1
+                else:
+                    images[job.key] = bake_texture(mesh, job.names[0], image_size=resolution, denoise=denoise)
+
+            # later groups bake with the last material of this group on its slot
+            last = plan.last_job(i)
+            if last is not None and applied != last.key:
+                apply_material(mesh, last.material, i, built=built, fingerprint=last.fingerprint, max_texture_size=max_texture_size)
+    finally:
+        # pending encodes still write their files and run their cache callbacks
+        if encoder is not None:
+            encoder.close()
+
+    if encoder is not None:
+        _print_throughput(num_bakes, time.time() - start, encoder)
+    print("Asset cache:", get_asset_cache().stats())
     if not bake_dir:
-        # Return the list of PIL images for further processing or saving
-        return img_list
+        # Return the list of PIL images for further processing or saving, one per material in JSON order
+        return [images[key] for keys in plan.entry_keys[:num_groups] for key in keys]
+
+
+def bake_shard(model_path, hdri_path, hdri_strength, tasks, bake_dir, resolution, denoise, samples, device="GPU", threads=0, cache_dir=None, max_texture_size=None, encoder_threads=2):
+    """
+    Bakes one shard of a BakePlan in this process, see sharded_bake.bake_sharded.
+
+    Parameters:
+        tasks (list): (group index, BakeJob, context) of each bake, sorted by group, where
+            context holds the (material, fingerprint) each earlier group left on its slot,
+            or None for a group without materials.
+        bake_dir (str): Folder holding the material_group_{i} folders.
+        encoder_threads (int): Threads encoding the JPEGs while the next bake runs, 0 to
+            encode them before the next bake.
+
+    Returns:
+        dict: Number of bakes run, seconds spent in this shard and its asset cache stats.
+    """
+    start = time.time()
+    assets_before = get_asset_cache().stats()
+    mesh = setup_hdri_environment(model_path, hdri_path, hdri_strength)
+    setup_cycles_bake(mesh, samples, device=device, threads=threads)
+    cache = BakeCache(cache_dir) if cache_dir else None
+    encoder = ImageEncoder(max_workers=encoder_threads) if encoder_threads else None
+    bake_start = time.time()
+
+    built = {}
+    applied = {}    # fingerprint of the material on each slot
+    num_bakes = 0
+    try:
+        for i, job, context in tasks:
+            if i > len(mesh.material_slots):
+                print(f"Warning: Not enough material slots for group {i}.")
+                continue
+            for slot, entry in enumerate(context + [(job.material, job.fingerprint)]):
+                if entry is not None and applied.get(slot) != entry[1]:
+                    apply_material(mesh, entry[0], slot, built=built, fingerprint=entry[1], max_texture_size=max_texture_size)
+                    applied[slot] = entry[1]
+
+            group_bake_dir = os.path.join(bake_dir, f"material_group_{i}")
+            os.makedirs(group_bake_dir, exist_ok=True)
+            outputs = [os.path.join(group_bake_dir, name + ".jpg") for name in job.names]
+            bake_texture(mesh, job.names[0], bake_dir=group_bake_dir, image_size=resolution, denoise=denoise,
+                         encoder=encoder, on_saved=_store_outputs(outputs, cache, job.key))
+            num_bakes += 1
+    finally:
+        if encoder is not None:
+            encoder.close()
+    if encoder is not None:
+        _print_throughput(num_bakes, time.time() - bake_start, encoder)
+    # the cache outlives the jobs of a worker, so report what this shard added to its counters
+    assets = get_asset_cache().stats()
+    for name in ("hits", "memory_hits", "misses", "load_seconds"):
+        assets[name] -= assets_before[name]
+    return {"bakes": num_bakes, "seconds": time.time() - start, "assets": assets}
 
 
 def setup_hdri_environment(model_path: str, hdri_path: str, strength: float = 1.0):
@@ -311,7 +453,7 @@ def setup_hdri_environment(model_path: str, hdri_path: str, strength: float = 1.
     env_tex = nodes.new(type="ShaderNodeTexEnvironment")
     env_tex.location = (-300, 300)
     try:
-        env_tex.image = bpy.data.images.load(hdri_path)
+        env_tex.image = get_asset_cache().image(hdri_path)
     except Exception as e:
         print(f"Failed to load HDRI image from {hdri_path}: {e}")
         return
@@ -330,46 +472,6 @@ def setup_hdri_environment(model_path: str, hdri_path: str, strength: float = 1.
     return mesh_obj
 
 
-def read_json_materials(json_path):
-    """
-    Reads a JSON file containing material information and returns a dictionary of materials.
-    
-    Parameters:
-        json_path (str): Path to the JSON file.
-        
-    Returns:
-        dict: Dictionary containing material names as keys and Material objects as values.
-    """
-    import json
-    with open(json_path, 'r') as f:
-        data = json.load(f)
-
-    base_dir = os.path.dirname(json_path)
-    
-    material_list = []
-
-    for group in data:
-        group_materials = []
-        for material in group:
-            # Creates Material objects for each material in the JSON file
-            # Values without a default are set to None if not found
-            group_materials.append(
-                Material(
-                    name=material.get("name"),
-                    diffuse=os.path.join(base_dir, material.get("diffuse")) if material.get("diffuse") else None,
-                    roughness=os.path.join(base_dir, material.get("roughness")) if material.get("roughness") else None,
-                    metallic=os.path.join(base_dir, material.get("metallic")) if material.get("metallic") else None,
-                    normal=os.path.join(base_dir, material.get("normal")) if material.get("normal") else None,
-                    ao=os.path.join(base_dir, material.get("ambient_occlusion")) if material.get("ambient_occlusion") else None,
-                    orm=os.path.join(base_dir, material.get("orm")) if material.get("orm") else None,
-                    scale=material.get("scale", 1.0)
-                )
-            )
-        material_list.append(group_materials)
-    
-    return material_list
-
-
 # Function that applies the baked texture maps, exports the model as GLB, and removes the PNG files
 def apply_and_export_glb(model_path, bake_dir):
 
@@ -431,13 +533,32 @@ def apply_and_export_glb(model_path, bake_dir):
         os.remove(png_path)
 
 
-def retex_and_bake_endpoint(model_path, material_json, hdri_path, hdri_strength, texture_size, denoise, samples):
+def retex_and_bake_endpoint(model_path, material_json, hdri_path, hdri_strength, texture_size, denoise, samples, cache_dir=None, bake_mode="cycles", num_workers=1, device="GPU", threads=0, downscale_textures=False):
     model_path = str(Path(model_path).resolve())
     material_json = str(Path(material_json).resolve())
     hdri_path = str(Path(hdri_path).resolve())
     
 
     materials = read_json_materials(material_json)
+    # textures larger than the bake are downscaled to its resolution
+    max_texture_size = texture_size if downscale_textures else None
+    if bake_mode != "cycles":
+        # Composite the materials in texture space instead of baking them with Cycles
+        from texture_compositor import composite_materials
+        composite_materials(model_path, materials, os.path.join(os.path.dirname(model_path), "baked_textures"), texture_size=texture_size, shading=bake_mode, hdri_path=hdri_path, hdri_strength=hdri_strength)
+        return
+    if num_workers > 1:
+        # Shard the bakes across worker processes, each loading the scene once
+        from blender_pool import BlenderPool
+        from sharded_bake import bake_sharded
+        pool = BlenderPool(num_workers=num_workers)
+        try:
+            bake_sharded(pool, model_path, material_json, hdri_path, hdri_strength, texture_size, denoise, samples, cache_dir=cache_dir, device=device, threads=threads, max_texture_size=max_texture_size)
+        finally:
+            pool.close()
+        return
+    cache = BakeCache(cache_dir) if cache_dir else None
+    plan = plan_bakes(materials, model_path, hdri_path, hdri_strength, texture_size, denoise, samples, cache=cache)
 
     # Set up the scene with the model and HDRI environment
     mesh = setup_hdri_environment(
@@ -447,7 +568,7 @@ def retex_and_bake_endpoint(model_path, material_json, hdri_path, hdri_strength,
     )
 
     # Permutate and bake materials
-    bake_materials_seperately(materials, mesh, bake_dir=os.path.join(os.path.dirname(model_path), "baked_textures"), denoise=denoise, resolution=texture_size, samples=samples)
+    bake_materials_seperately(materials, mesh, bake_dir=os.path.join(os.path.dirname(model_path), "baked_textures"), denoise=denoise, resolution=texture_size, samples=samples, plan=plan, cache=cache, device=device, threads=threads, max_texture_size=max_texture_size)
 
 
 import click
@@ -460,32 +581,23 @@ import click
 @click.option('--texture_size', type=int, default=4096, help='Size of the texture to bake. Default is 4096.')
 @click.option('--denoise', type=bool, default=False, help='Whether to use denoising. Default is False. (Seams will appear if set to True)')
 @click.option('--samples', type=int, default=40, help='Number of samples for baking. Default is 40.')
+@click.option('--cache_dir', type=str, default=None, help='Folder caching baked textures, so repeated bakes are copied instead of baked again.')
+@click.option('--bake_mode', type=click.Choice(['cycles', 'unlit', 'hdri_diffuse']), default='cycles', help='cycles bakes with Cycles, unlit composites the tiled textures directly into the UV atlas, hdri_diffuse also shades them with the HDRI irradiance. Default is cycles.')
+@click.option('--workers', type=int, default=1, help='Number of Blender processes sharing the bakes. Default is 1.')
+@click.option('--device', type=click.Choice(['GPU', 'CPU']), default='GPU', help='Device Cycles bakes on. Default is GPU.')
+@click.option('--threads', type=int, default=0, help='Render threads per Blender process, 0 for one per core (divided between workers on CPU). Default is 0.')
+@click.option('--downscale_textures', is_flag=True, default=False, help='Downscale material textures larger than the bake to --texture_size before baking.')
 # @click.option('--export_glb', type=bool, default=False, help='Whether to export a baked GLB model instead of a texture map. Default is False.')
 
 
-def retex_and_bake(model_path, material_json, hdri_path, hdri_strength, texture_size, denoise, samples):
+def retex_and_bake(model_path, material_json, hdri_path, hdri_strength, texture_size, denoise, samples, cache_dir, bake_mode, workers, device, threads, downscale_textures):
     """
     Main function to retouch and bake materials based on a JSON file.
     
     Parameters:
         material_json (str): Path to the JSON file containing material information.
     """
-    model_path = str(Path(model_path).resolve())
-    material_json = str(Path(material_json).resolve())
-    hdri_path = str(Path(hdri_path).resolve())
-    
-
-    materials = read_json_materials(material_json)
-
-    # Set up the scene with the model and HDRI environment
-    mesh = setup_hdri_environment(
-        model_path,
-        hdri_path,
-        hdri_strength
-    )
-
-    # Permutate and bake materials
-    bake_materials_seperately(materials, mesh, bake_dir=os.path.join(os.path.dirname(model_path), "baked_textures"), denoise=denoise, resolution=texture_size, samples=samples)
+    retex_and_bake_endpoint(model_path, material_json, hdri_path, hdri_strength, texture_size, denoise, samples, cache_dir=cache_dir, bake_mode=bake_mode, num_workers=workers, device=device, threads=threads, downscale_textures=downscale_textures)
 
     # if export_glb:
     #     # Export the model with baked textures as a GLB file
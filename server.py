@@ -1,17 +1,25 @@
 import io
-import zipfile
+import json
 import shutil
 import os
+import concurrent.futures
 from PIL import Image
 from fastapi import FastAPI, HTTPException, File, Form, UploadFile, BackgroundTasks
 from typing import List
 from fastapi.responses import StreamingResponse, HTMLResponse, FileResponse, JSONResponse, Response
 from fastapi.staticfiles import StaticFiles
 from multi_image_trellis import trellis_multiple_images
-from starlette.background import BackgroundTask
-from retex_and_bake import retex_and_bake_endpoint
-from model_to_views import model_to_views
+from starlette.concurrency import run_in_threadpool
+from blender_pool import get_blender_pool, shutdown_blender_pool
+from texture_compositor import composite_from_json
+from sharded_bake import bake_sharded
+from functools import partial
 from uuid import uuid4
+from utils import make_job_dir
+from zip_stream import iter_zip, iter_job_outputs, wait_for_output
+from model_to_views import model_to_views
+from turntable_renderer import turntable_angles
+from render_cache import RenderCache
 import redis
 
 app = FastAPI()
@@ -19,15 +27,68 @@ app = FastAPI()
 app.mount("/static", StaticFiles(directory="client/static"), name="static")
 
 
+# Jobs whose outputs are streamed while they run
+OUTPUT_JOBS = concurrent.futures.ThreadPoolExecutor(max_workers=16)
+
+
+@app.on_event("shutdown")
+def close_blender_pool():
+    OUTPUT_JOBS.shutdown(wait=False)
+    shutdown_blender_pool()
+
+
+async def stream_job_zip(job, output_folder, temp_folder, filename, headers=None):
+    """
+    Run a job writing files to output_folder, and stream them as a ZIP as they are written.
+    temp_folder is removed once both the job and the response are done.
+    """
+    future = OUTPUT_JOBS.submit(job)
+    # errors before the first file can still be reported with a status code
+    await run_in_threadpool(wait_for_output, output_folder, future)
+    if future.done() and (future.exception() is not None or not os.path.isdir(output_folder)):
+        shutil.rmtree(temp_folder, ignore_errors=True)
+        if future.exception() is not None:
+            raise future.exception()
+        raise HTTPException(status_code=500, detail=f"Expected folder '{output_folder}' not found.")
+
+    def stream():
+        try:
+            yield from iter_zip(iter_job_outputs(output_folder, future))
+        finally:
+            future.add_done_callback(lambda _: shutil.rmtree(temp_folder, ignore_errors=True))
+
+    return StreamingResponse(
+        stream(),
+        media_type="application/zip",
+        headers={"Content-Disposition": f"attachment; filename={filename}", **(headers or {})}
+    )
+
+
+@app.get("/blender_health")
+async def blender_health():
+    """
+    Ping the idle Blender workers, restarting those that do not answer.
+    """
+    pool = get_blender_pool()
+    pids = await run_in_threadpool(pool.health_check)
+    return {"workers": pids, "restarts": pool.restarts}
+
+
 @app.get("/", response_class=HTMLResponse)
 def root():
     return FileResponse("client/index.html")
 
 @app.post("/trellis")
-async def create_mesh(images: List[UploadFile] = File(...)):
+async def create_mesh(
+    images: List[UploadFile] = File(...),
+    # "numpy" finishes the mesh without Blender, "blender" is the original Blender chain
+    finishing: str = Form("numpy")
+    ):
     """
     Upload an image file and return the processed mesh.
     """
+    if finishing not in ("numpy", "blender"):
+        raise HTTPException(status_code=400, detail=f"Unknown finishing '{finishing}', expected 'numpy' or 'blender'.")
     contents = []
     for image in images:
         content = await image.read()
@@ -41,7 +102,12 @@ async def create_mesh(images: List[UploadFile] = File(...)):
         contents.append(img)
 
 
-    data = trellis_multiple_images(contents)
+    if finishing == "blender":
+        # Blender finishing runs in a worker process, not in the API process
+        glb_data = trellis_multiple_images(contents, postprocessing=False)
+        data = await run_in_threadpool(get_blender_pool().call, "process_and_export_obj", glb_data)
+    else:
+        data = trellis_multiple_images(contents, finishing=finishing)
     buffer = io.BytesIO(data)
 
     return StreamingResponse(
@@ -84,6 +150,24 @@ async def create_mesh(images: List[UploadFile] = File(...)):
 
 rdb = redis.Redis()
 
+# Baked textures of earlier retextures, keyed by everything a bake depends on
+BAKE_CACHE_DIR = os.path.abspath(os.environ.get("BAKE_CACHE_DIR", os.path.join("tmp", "bake_cache")))
+# Cycles device of the bakes, "GPU" or "CPU", and render threads per Blender worker (0 for automatic)
+BAKE_DEVICE = os.environ.get("BAKE_DEVICE", "GPU")
+BAKE_THREADS = int(os.environ.get("BAKE_THREADS", 0))
+# Set BAKE_DOWNSCALE_TEXTURES=1 to downscale material textures larger than the bake before baking
+BAKE_DOWNSCALE_TEXTURES = os.environ.get("BAKE_DOWNSCALE_TEXTURES", "0") == "1"
+
+# Rendered views of earlier multiview requests, keyed by GLB content, angle and render settings
+RENDER_CACHE = RenderCache(
+    os.path.abspath(os.environ.get("RENDER_CACHE_DIR", os.path.join("tmp", "render_cache"))),
+    max_bytes=int(os.environ.get("RENDER_CACHE_MB", 2048)) << 20
+)
+# Settings of model_to_views' renders, part of the render cache keys
+VIEW_RESOLUTION = 1080
+VIEW_LENS = 45.0
+VIEW_BACKGROUND = (1.0, 1.0, 1.0)
+
 
 @app.post("/trellis_async", status_code=202)
 async def create_mesh_async(
@@ -91,28 +175,56 @@ async def create_mesh_async(
     images: List[UploadFile] = File(...),
     # Optional parameters can be added here
     sparse_structure_sampler_strength: int = 16,
-    slat_sampler_strength: int = 3
+    slat_sampler_strength: int = 3,
+    # "mp4" or "webp" also renders a turntable preview of the generated Gaussians
+    preview: str = None,
+    # also export the Gaussians as a .splat for web viewers
+    splat: bool = False
     ):
+    if preview not in (None, "mp4", "webp"):
+        raise HTTPException(status_code=400, detail=f"Unknown preview format '{preview}', expected 'mp4' or 'webp'.")
     raw_imgs = [await image.read() for image in images]
     job_id = str(uuid4())
     rdb.hset(job_id, "status", "queued")
-    background_tasks.add_task(run_mesh_job, job_id, raw_imgs, sparse_structure_sampler_strength, slat_sampler_strength)
-    return {"job_id": job_id, "status_url": f"/trellis/{job_id}"}
-
-
-def run_mesh_job(job_id: str, raw_imgs: List[bytes], ssss, sss):
+    if preview is not None:
+        rdb.hset(job_id, "preview_format", preview)
+    background_tasks.add_task(run_mesh_job, job_id, raw_imgs, sparse_structure_sampler_strength, slat_sampler_strength, preview, splat)
+    response = {"job_id": job_id, "status_url": f"/trellis/{job_id}"}
+    if preview is not None:
+        response["preview_url"] = f"/trellis/{job_id}/preview"
+    if splat:
+        response["splat_url"] = f"/trellis/{job_id}/splat"
+    return response
+
+
+def run_mesh_job(job_id: str, raw_imgs: List[bytes], ssss, sss, preview=None, splat=False):
     pil_imgs = []
     for b in raw_imgs:
         img = Image.open(io.BytesIO(b)).convert("RGB")
         pil_imgs.append(img)
-        
+
+    temp_folder = make_job_dir(prefix="trellis_") if preview is not None or splat else None
     try:
-        meshes = trellis_multiple_images(pil_imgs, False, ssss, sss)
+        metrics = {}
+        preview_path = os.path.join(temp_folder, f"preview.{preview}") if preview is not None else None
+        splat_path = os.path.join(temp_folder, "model.splat") if splat else None
+        meshes = trellis_multiple_images(pil_imgs, False, ssss, sss, metrics=metrics,
+                                         preview_path=preview_path, splat_path=splat_path)
+        if preview_path is not None:
+            with open(preview_path, "rb") as f:
+                rdb.hset(job_id, "preview", f.read())
+        if splat_path is not None:
+            with open(splat_path, "rb") as f:
+                rdb.hset(job_id, "splat", f.read())
+        rdb.hset(job_id, "metrics", json.dumps(metrics))
         rdb.hset(job_id, "status", "finished")
         rdb.hset(job_id, "result", meshes)
     except Exception as exc:
         rdb.hset(job_id, "status", "failed")
         rdb.hset(job_id, "error", str(exc))
+    finally:
+        if temp_folder is not None:
+            shutil.rmtree(temp_folder, ignore_errors=True)
 
 
 @app.get("/trellis/{job_id}")
@@ -133,18 +245,54 @@ async def mesh_status(job_id: str):
     # still running or failed
     return JSONResponse(
         {"status": meta[b"status"].decode(),
-         "error": meta.get(b"error", b"").decode()}
+         "error": meta.get(b"error", b"").decode(),
+         "metrics": json.loads(meta.get(b"metrics", b"{}"))}
+    )
+
+
+def _job_artifact(job_id, field, media_type, filename):
+    """
+    Response with the `field` file of a /trellis_async job, 409 while the job is queued.
+    """
+    meta = rdb.hgetall(job_id)
+    if not meta:
+        raise HTTPException(404, "No such job")
+    if field.encode() not in meta:
+        if meta[b"status"] == b"queued":
+            raise HTTPException(409, f"The {field} is not ready yet")
+        raise HTTPException(404, f"The job has no {field}")
+    return Response(
+        meta[field.encode()],
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
     )
 
 
+@app.get("/trellis/{job_id}/preview")
+async def mesh_preview(job_id: str):
+    # the format is recorded when the job is queued
+    preview = (rdb.hget(job_id, "preview_format") or b"mp4").decode()
+    media_type = "video/mp4" if preview == "mp4" else f"image/{preview}"
+    return _job_artifact(job_id, "preview", media_type, f"preview.{preview}")
+
+
+@app.get("/trellis/{job_id}/splat")
+async def mesh_splat(job_id: str):
+    return _job_artifact(job_id, "splat", "application/octet-stream", "model.splat")
+
+
 @app.post("/retexure")
 async def retexture_mesh(
     images: List[UploadFile] = File(...),
-    glb_file: UploadFile = File(...)
+    glb_file: UploadFile = File(...),
+    # "cycles" bakes with Blender, "unlit" and "hdri_diffuse" composite the textures without it
+    bake_mode: str = Form("cycles")
     ):
+    if bake_mode not in ("cycles", "unlit", "hdri_diffuse"):
+        raise HTTPException(status_code=400, detail=f"Unknown bake_mode '{bake_mode}', expected 'cycles', 'unlit' or 'hdri_diffuse'.")
 
-    temp_folder = "tmp/retex"
-    os.makedirs(temp_folder, exist_ok=True)
+    # Private folder of this request, so concurrent retextures never overwrite each other
+    temp_folder = make_job_dir(prefix="retex_")
     json_path = None
 
     # Save each image
@@ -166,80 +314,85 @@ async def retexture_mesh(
         f.write(glb_content)
 
     if json_path is None:
+        shutil.rmtree(temp_folder, ignore_errors=True)
         raise HTTPException(status_code=400, detail="No JSON could be found, please check your materials folder")
     
-    HDRI_PATH = "hdris\studio_small_09_1k.exr"
+    HDRI_PATH = os.path.join("hdris", "studio_small_09_1k.exr")
     HDRI_STRENGTH = 1.0
     TEXTURE_SIZE = 4096
     DENOISE = False
     SAMPLES = 40
 
-    retex_and_bake_endpoint(
-        glb_path,
-        json_path,
-        HDRI_PATH,
-        HDRI_STRENGTH,
-        TEXTURE_SIZE,
-        DENOISE,
-        SAMPLES
-    )
-
-    # Zip the "baked_textures" folder
     baked_folder = os.path.join(temp_folder, "baked_textures")
-    if not os.path.isdir(baked_folder):
-        raise HTTPException(status_code=500, detail=f"Expected folder '{baked_folder}' not found.")
-    
-    zip_buffer = io.BytesIO()
-    with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zipf:
-        # Walk the baked_textures folder and add all files.
-        for root, dirs, files in os.walk(baked_folder):
-            for file in files:
-                file_path = os.path.join(root, file)
-                arcname = os.path.relpath(file_path, baked_folder)
-                zipf.write(file_path, arcname)
-    zip_buffer.seek(0)
-    
-    # Define cleanup function to remove the temporary folder after response.
-    def cleanup_temp():
-        shutil.rmtree(temp_folder, ignore_errors=True)
-    
-    # Return a StreamingResponse with the zip file and schedule cleanup.
-    return StreamingResponse(
-        zip_buffer,
-        media_type="application/zip",
-        headers={"Content-Disposition": "attachment; filename=baked_textures.zip"},
-        background=BackgroundTask(cleanup_temp)
-    )
+    if bake_mode == "cycles":
+        # The bakes are sharded across the workers of the Blender pool
+        job = partial(
+            bake_sharded,
+            get_blender_pool(),
+            glb_path,
+            json_path,
+            HDRI_PATH,
+            HDRI_STRENGTH,
+            TEXTURE_SIZE,
+            DENOISE,
+            SAMPLES,
+            cache_dir=BAKE_CACHE_DIR,
+            device=BAKE_DEVICE,
+            threads=BAKE_THREADS,
+            max_texture_size=TEXTURE_SIZE if BAKE_DOWNSCALE_TEXTURES else None
+        )
+    else:
+        # The compositor needs no Blender, so it runs here rather than occupying a worker
+        job = partial(composite_from_json, glb_path, json_path, baked_folder, texture_size=TEXTURE_SIZE, shading=bake_mode, hdri_path=HDRI_PATH, hdri_strength=HDRI_STRENGTH)
+
+    # The textures are zipped and sent as they are baked
+    return await stream_job_zip(job, baked_folder, temp_folder, "baked_textures.zip")
 
 
 @app.post("/generate_multiviews")
 async def generate_views(
     num_views: int = Form(...),
-    glb_file: UploadFile = File(...)
+    glb_file: UploadFile = File(...),
+    # "fast" renders every view at once without Blender, "blender" renders them with Blender
+    renderer: str = Form("fast")
     ):
-    temp_folder = os.path.join(os.getcwd(), "tmp", "multiview")
-    os.makedirs(temp_folder, exist_ok=True)
+    if renderer not in ("fast", "blender"):
+        raise HTTPException(status_code=400, detail=f"Unknown renderer '{renderer}', expected 'fast' or 'blender'.")
+    temp_folder = make_job_dir(prefix="multiview_")
 
     glb_content = await glb_file.read()
     glb_path = os.path.join(temp_folder, glb_file.filename)
     with open(glb_path, "wb") as f:
         f.write(glb_content)
 
-    image_paths = model_to_views(model_path=glb_path, output_path=temp_folder, num_views=num_views)
-
-    zip_buffer = io.BytesIO()
-    with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zipf:
-        for file_path in image_paths:
-            arcname = os.path.relpath(file_path, temp_folder)
-            zipf.write(file_path, arcname)
-    zip_buffer.seek(0)
-
-    def cleanup_temp():
-        shutil.rmtree(temp_folder, ignore_errors=True)
+    # Views get their own folder, so only renders are streamed, each as soon as it is written
+    views_folder = os.path.join(temp_folder, "views")
+    os.makedirs(views_folder)
 
-    return StreamingResponse(
-        zip_buffer,
-        media_type="application/zip",
-        headers={"Content-Disposition": "attachment; filename=views.zip"},
-        background=BackgroundTask(cleanup_temp)
-    )
\ No newline at end of file
+    # Views rendered by earlier requests are copied from the cache, only the others are rendered
+    angles = turntable_angles(num_views)
+    keys = await run_in_threadpool(
+        lambda: {angle: RenderCache.key(glb_path, angle, renderer, VIEW_RESOLUTION, VIEW_LENS, VIEW_BACKGROUND) for angle in angles}
+    )
+    missing = []
+    for angle in angles:
+        if not await run_in_threadpool(RENDER_CACHE.fetch, keys[angle], os.path.join(views_folder, f"{angle:.2f}.png")):
+            missing.append(angle)
+
+    def render_missing():
+        if not missing:
+            return
+        if renderer == "blender":
+            paths = get_blender_pool().call("model_to_views", glb_path, views_folder, num_views, angles=missing)
+        else:
+            # The fast renderer needs no Blender, so it runs here rather than occupying a worker
+            paths = model_to_views(glb_path, views_folder, num_views, renderer="fast", angles=missing)
+        for angle, path in zip(missing, paths):
+            RENDER_CACHE.store(keys[angle], path)
+        RENDER_CACHE.trim()
+
+    headers = {
+        "X-Render-Cache-Hits": str(len(angles) - len(missing)),
+        "X-Render-Cache-Misses": str(len(missing)),
+    }
+    return await stream_job_zip(render_missing, views_folder, temp_folder, "views.zip", headers=headers)
\ No newline at end of file
@@ -0,0 +1,120 @@
+"""
+Retexture bakes sharded across the processes of a BlenderPool.
+
+Given the mesh, the HDRI and the materials the earlier groups leave on their slots, every
+bake of a BakePlan is independent. The bakes still to run are split into contiguous shards
+of the plan order, so materials sharing textures stay in one process, and each shard loads
+the scene once and bakes its part into the shared material_group_{i} folders.
+"""
+import os
+import time
+import concurrent.futures
+from bake_planner import BakeCache, plan_bakes
+from blender_pool import BlenderWorkerError
+from materials import read_json_materials
+
+
+def shard_tasks(plan, num_shards):
+    """
+    Split the bakes of a plan that are not cached into contiguous shards of similar size.
+
+    Parameters:
+        plan (BakePlan): Plan of the bakes.
+        num_shards (int): Maximum number of shards.
+
+    Returns:
+        list: For each shard, the (group index, BakeJob, context) tasks of bake_shard.
+    """
+    tasks = []
+    context = []
+    for i, jobs in enumerate(plan.groups):
+        for job in jobs:
+            if not job.cached:
+                tasks.append((i, job, list(context)))
+        last = plan.last_job(i)
+        context.append((last.material, last.fingerprint) if last is not None else None)
+    if not tasks:
+        return []
+    num_shards = max(1, min(num_shards, len(tasks)))
+    bounds = [round(k * len(tasks) / num_shards) for k in range(num_shards + 1)]
+    return [tasks[start:end] for start, end in zip(bounds, bounds[1:])]
+
+
+def bake_sharded(pool, model_path, material_json, hdri_path, hdri_strength, texture_size, denoise, samples,
+                 bake_dir=None, cache_dir=None, num_shards=None, device="GPU", threads=0, max_texture_size=None):
+    """
+    Bake the materials of a JSON file on the workers of a pool.
+
+    Parameters:
+        pool (BlenderPool): Pool running the shards.
+        bake_dir (str): Output folder, baked_textures next to the model by default.
+        cache_dir (str): Folder of a BakeCache serving and storing the bakes, optional.
+        num_shards (int): Number of shards, the size of the pool by default.
+        device (str): "GPU" or "CPU".
+        threads (int): Render threads per worker, 0 for one per core, which on CPU is
+            divided between the shards.
+        max_texture_size (int): Textures larger than this are downscaled to it, optional.
+
+    Returns:
+        dict: Counts of the bakes, the wall-clock seconds, the seconds spent in shards and
+            the asset cache stats summed over the shards.
+    """
+    start = time.time()
+    bake_dir = bake_dir or os.path.join(os.path.dirname(model_path), "baked_textures")
+    materials = read_json_materials(material_json)
+    cache = BakeCache(cache_dir) if cache_dir else None
+    plan = plan_bakes(materials, model_path, hdri_path, hdri_strength, texture_size, denoise, samples, cache=cache)
+    print(plan.summary())
+
+    # cached bakes are copied here, the shards only run the rest
+    for i, jobs in enumerate(plan.groups):
+        group_bake_dir = os.path.join(bake_dir, f"material_group_{i}")
+        os.makedirs(group_bake_dir, exist_ok=True)
+        for job in jobs:
+            if job.cached:
+                job.cached = cache.fetch(job.key, [os.path.join(group_bake_dir, name + ".jpg") for name in job.names])
+
+    shards = shard_tasks(plan, num_shards or pool.size)
+    if device == "CPU" and not threads and shards:
+        threads = max(1, (os.cpu_count() or 1) // len(shards))
+    futures = {
+        pool.submit("bake_shard", model_path, hdri_path, hdri_strength, shard, bake_dir, texture_size, denoise, samples,
+                    device=device, threads=threads, cache_dir=cache_dir, max_texture_size=max_texture_size): k
+        for k, shard in enumerate(shards)
+    }
+
+    num_bakes = sum(len(shard) for shard in shards)
+    done, shard_seconds, errors = 0, 0.0, []
+    assets = {"hits": 0, "memory_hits": 0, "misses": 0, "load_seconds": 0.0}
+    for future in concurrent.futures.as_completed(futures):
+        k = futures[future]
+        try:
+            result = future.result()
+        except BlenderWorkerError as e:
+            print(f"Shard {k + 1}/{len(shards)} failed: {e}")
+            errors.append(e)
+            continue
+        done += result["bakes"]
+        shard_seconds += result["seconds"]
+        for name in assets:
+            assets[name] += result["assets"][name]
+        print(f"Shard {k + 1}/{len(shards)}: {result['bakes']} bakes in {result['seconds']:.1f} s "
+              f"({done}/{num_bakes} bakes, {time.time() - start:.1f} s elapsed)")
+    if errors:
+        raise errors[0]
+
+    summary = {
+        "requested": plan.num_requested,
+        "distinct": plan.num_unique,
+        "cached": plan.num_unique - num_bakes,
+        "baked": done,
+        "shards": len(shards),
+        "seconds": time.time() - start,
+        "shard_seconds": shard_seconds,
+        "assets": assets,
+    }
+    print(f"{summary['baked']} bakes on {summary['shards']} workers in {summary['seconds']:.1f} s "
+          f"({summary['shard_seconds']:.1f} s of worker time), {summary['cached']} from cache")
+    print(f"Images: {assets['hits']} reused, {assets['memory_hits']} from worker memory, {assets['misses']} decoded "
+          f"in {assets['load_seconds']:.1f} s")
+    return summary
@@ -0,0 +1,351 @@
+"""
+Texture-space compositing of retexture materials, a fast alternative to Cycles bakes.
+
+For every texel of the model's UV atlas, the material of the texel's slot is evaluated
+the way apply_material wires it in Blender: the diffuse texture sampled at UV * scale
+with repeat, multiplied by the ORM red channel (or the AO texture) in linear space.
+'unlit' writes that albedo, 'hdri_diffuse' multiplies it by the diffuse irradiance of
+the HDRI at the texel normal, from a 9 coefficient spherical harmonics fit.
+
+Slots follow bake_materials_seperately: group i bakes each of its materials on slot i,
+earlier slots keep the last material of their group and later slots the material of
+the GLB. The outputs are written like the Cycles bakes, bake_dir/material_group_<i>/<name>.jpg.
+"""
+import os
+import json
+import math
+import struct
+import numpy as np
+import torch
+import trimesh
+from PIL import Image
+from trellis.utils.raster_utils import rasterize_triangles
+from trellis.utils.texture_utils import inpaint_texture
+from materials import read_json_materials
+from utils import hidden_temp_path
+
+
+def srgb_to_linear(x):
+    return torch.where(x <= 0.04045, x / 12.92, ((x + 0.055) / 1.055) ** 2.4)
+
+
+def linear_to_srgb(x):
+    x = x.clamp(0, 1)
+    return torch.where(x <= 0.0031308, x * 12.92, 1.055 * x ** (1 / 2.4) - 0.055)
+
+
+def sample_tiled(image, uv):
+    """
+    Bilinear sample of a uint8 image at UVs, repeating it outside [0, 1] like Blender's image textures.
+
+    Parameters:
+        image (torch.Tensor): uint8 image, row 0 at the top (v = 1). Shape (H, W, C).
+        uv (torch.Tensor): UV coordinates. Shape (N, 2).
+
+    Returns:
+        torch.Tensor: Colors in [0, 1]. Shape (N, C).
+    """
+    H, W = image.shape[:2]
+    x = uv[:, 0] * W - 0.5
+    y = (1 - uv[:, 1]) * H - 0.5
+    x0, y0 = torch.floor(x), torch.floor(y)
+    fx, fy = (x - x0)[:, None], (y - y0)[:, None]
+    x0, y0 = torch.remainder(x0.long(), W), torch.remainder(y0.long(), H)
+    x1, y1 = torch.remainder(x0 + 1, W), torch.remainder(y0 + 1, H)
+    color = (
+        image[y0, x0].float() * (1 - fx) * (1 - fy) + image[y0, x1].float() * fx * (1 - fy) +
+        image[y1, x0].float() * (1 - fx) * fy + image[y1, x1].float() * fx * fy
+    )
+    return color / 255
+
+
+def load_hdri(hdri_path):
+    """
+    Read an HDRI as a float32 RGB array, with OpenCV or, if its build lacks OpenEXR, imageio.
+    """
+    os.environ.setdefault("OPENCV_IO_ENABLE_OPENEXR", "1")
+    import cv2
+    image = cv2.imread(hdri_path, cv2.IMREAD_UNCHANGED)
+    if image is not None:
+        return image[..., 2::-1].astype(np.float32)
+    import imageio.v3 as iio
+    return np.asarray(iio.imread(hdri_path), dtype=np.float32)[..., :3]
+
+
+def hdri_sh9(hdri_path, strength=1.0, size=(64, 32)):
+    """
+    Project an equirectangular HDRI on 9 spherical harmonics, in Blender's world frame (Z up).
+
+    Returns:
+        np.ndarray: SH coefficients of the radiance. Shape (9, 3).
+    """
+    import cv2
+    return equirect_sh9(cv2.resize(load_hdri(hdri_path), size, interpolation=cv2.INTER_AREA) * strength)
+
+
+def equirect_sh9(image):
+    """
+    Project an equirectangular radiance map on 9 spherical harmonics, see hdri_sh9.
+    """
+    H, W = image.shape[:2]
+    # Blender: u = 0.5 - atan2(y, x) / 2pi, v = 0.5 + elevation / pi, image row 0 at v = 1
+    u = (np.arange(W) + 0.5) / W
+    v = 1 - (np.arange(H) + 0.5) / H
+    phi = (0.5 - u)[None, :] * 2 * np.pi
+    elevation = (v - 0.5)[:, None] * np.pi
+    directions = np.stack(np.broadcast_arrays(
+        np.cos(elevation) * np.cos(phi), np.cos(elevation) * np.sin(phi), np.sin(elevation) + 0 * phi,
+    ), axis=-1).reshape(-1, 3)
+    solid_angle = (2 * np.pi / W) * (np.pi / H) * np.broadcast_to(np.cos(elevation), (H, W)).reshape(-1)
+    basis = _sh9_basis(directions)
+    return (basis * solid_angle[:, None]).T @ image.reshape(-1, 3)
+
+
+def _sh9_basis(d):
+    x, y, z = d[:, 0], d[:, 1], d[:, 2]
+    lib = torch if isinstance(d, torch.Tensor) else np
+    return lib.stack([
+        0.282095 + 0 * x,
+        0.488603 * y, 0.488603 * z, 0.488603 * x,
+        1.092548 * x * y, 1.092548 * y * z, 0.315392 * (3 * z * z - 1), 1.092548 * x * z, 0.546274 * (x * x - y * y),
+    ], -1)
+
+
+def sh9_diffuse(sh, normals):
+    """
+    Radiance of a white Lambertian surface under the SH lighting, E(n) / pi.
+    """
+    band = torch.tensor([math.pi] + [2 * math.pi / 3] * 3 + [math.pi / 4] * 5, dtype=normals.dtype, device=normals.device)
+    return (_sh9_basis(normals) * band) @ torch.as_tensor(sh, dtype=normals.dtype, device=normals.device) / math.pi
+
+
+def glb_material_names(model_path):
+    """
+    Names of the materials of a GLB in order of first use by its meshes' primitives, the order of Blender's material slots.
+    """
+    with open(model_path, "rb") as f:
+        header = f.read(20)
+        document = json.loads(f.read(struct.unpack("<I", header[12:16])[0]))
+    names = []
+    for mesh in document.get("meshes", []):
+        for primitive in mesh.get("primitives", []):
+            index = primitive.get("material")
+            name = document["materials"][index].get("name") if index is not None else None
+            if name not in names:
+                names.append(name)
+    return names
+
+
+def load_glb_geometry(model_path):
+    """
+    Merged triangles of a GLB, in world space, with their UVs, normals and material slot.
+
+    Slots are the materials of the GLB in the order of glb_material_names.
+
+    Returns:
+        dict: vertices, faces, uvs (zero where a mesh has none), normals, face_slots,
+        face_has_uv and the GLB material of each slot (slot_materials), as numpy arrays.
+    """
+    scene = trimesh.load(model_path, force="scene", process=False)
+    slot_keys = {name: i for i, name in enumerate(glb_material_names(model_path))}
+    slot_materials = [None] * len(slot_keys)
+    vertices, faces, uvs, normals, face_slots, face_has_uv = [], [], [], [], [], []
+    num_vertices = 0
+    for geometry in scene.dump():
+        if not isinstance(geometry, trimesh.Trimesh) or len(geometry.faces) == 0:
+            continue
+        material = getattr(geometry.visual, "material", None)
+        key = getattr(material, "name", None)
+        if key not in slot_keys:
+            slot_keys[key] = len(slot_materials)
+            slot_materials.append(None)
+        slot_materials[slot_keys[key]] = material
+        uv = getattr(geometry.visual, "uv", None)
+        vertices.append(np.asarray(geometry.vertices, dtype=np.float32))
+        faces.append(np.asarray(geometry.faces, dtype=np.int64) + num_vertices)
+        uvs.append(np.asarray(uv, dtype=np.float32) if uv is not None else np.zeros((len(geometry.vertices), 2), dtype=np.float32))
+        normals.append(np.asarray(geometry.vertex_normals, dtype=np.float32))
+        face_slots.append(np.full(len(geometry.faces), slot_keys[key]))
+        face_has_uv.append(np.full(len(geometry.faces), uv is not None))
+        num_vertices += len(geometry.vertices)
+    if not faces:
+        raise RuntimeError(f"{model_path} has no mesh")
+    return {
+        "vertices": np.concatenate(vertices),
+        "faces": np.concatenate(faces),
+        "uvs": np.concatenate(uvs),
+        "normals": np.concatenate(normals),
+        "face_slots": np.concatenate(face_slots),
+        "face_has_uv": np.concatenate(face_has_uv),
+        "slot_materials": slot_materials,
+    }
+
+
+def load_model_texels(model_path, texture_size, device="cpu"):
+    """
+    Rasterize the UV atlas of a GLB and find the slot, UV and normal of every covered texel.
+
+    Slots are the materials of the GLB in the order of glb_material_names.
+
+    Returns:
+        dict: covered (flat texel index, row 0 at v = 0), slot, uv and normal (Blender frame) of
+        the covered texels, sorted by slot, the GLB material of each slot, and the mask of uncovered
+        texels (row 0 at v = 1).
+    """
+    geometry = load_glb_geometry(model_path)
+    slot_materials = geometry["slot_materials"]
+    has_uv = geometry["face_has_uv"]
+    if not has_uv.any():
+        raise RuntimeError(f"{model_path} has no UV mapped mesh")
+    faces = torch.from_numpy(geometry["faces"][has_uv]).to(device)
+    uvs = torch.from_numpy(geometry["uvs"]).to(device)
+    normals = torch.from_numpy(geometry["normals"]).to(device)
+    face_slots = torch.from_numpy(geometry["face_slots"][has_uv]).to(device)
+
+    pos_clip = torch.cat([uvs * 2 - 1, torch.zeros_like(uvs[:, :1]), torch.ones_like(uvs[:, :1])], dim=-1)
+    rast = rasterize_triangles(pos_clip[None], faces, texture_size, texture_size, return_barycentrics=True)
+    face_id = rast.face_id[0].reshape(-1)
+    covered = torch.nonzero(face_id >= 0).reshape(-1)
+    texel_faces = face_id[covered]
+    bary = rast.bary[0].reshape(-1, 3)[covered][..., None]
+    slot = face_slots[texel_faces]
+    order = torch.argsort(slot, stable=True)
+    covered, texel_faces, bary, slot = covered[order], texel_faces[order], bary[order], slot[order]
+    corners = faces[texel_faces]
+    normal = torch.nn.functional.normalize((normals[corners] * bary).sum(dim=1), dim=-1)
+    return {
+        "covered": covered,
+        "slot": slot,
+        "uv": (uvs[corners] * bary).sum(dim=1),
+        # glTF is Y up, Blender imports it Z up
+        "normal": torch.stack([normal[:, 0], -normal[:, 2], normal[:, 1]], dim=-1),
+        "slot_materials": slot_materials,
+        "mask": np.ascontiguousarray((rast.face_id[0] < 0).cpu().numpy()[::-1]).astype(np.uint8),
+    }
+
+
+class _ImageCache():
+    def __init__(self, device):
+        self.device = device
+        self.images = {}
+
+    def get(self, path_or_image):
+        if isinstance(path_or_image, str):
+            if path_or_image not in self.images:
+                self.images[path_or_image] = self._to_tensor(Image.open(path_or_image))
+            return self.images[path_or_image]
+        return self._to_tensor(path_or_image)
+
+    def _to_tensor(self, image):
+        return torch.from_numpy(np.array(image.convert("RGB"))).to(self.device)
+
+
+def material_albedo(material, uv, images):
+    """
+    Linear albedo of a retexture Material at texel UVs, as wired by apply_material.
+    """
+    uv = uv * material.scale
+    if not material.diffuse or not os.path.isfile(material.diffuse):
+        # Principled BSDF default base color
+        return torch.full((uv.shape[0], 3), 0.8, device=uv.device)
+    albedo = srgb_to_linear(sample_tiled(images.get(material.diffuse), uv))
+    if material.orm and os.path.isfile(material.orm):
+        albedo = albedo * srgb_to_linear(sample_tiled(images.get(material.orm), uv))[:, :1]
+    elif material.ao and os.path.isfile(material.ao):
+        albedo = albedo * srgb_to_linear(sample_tiled(images.get(material.ao), uv))
+    return albedo
+
+
+def glb_material_albedo(material, uv, images):
+    """
+    Linear albedo of a GLB material at texel UVs: base color texture times base color factor.
+    """
+    albedo = torch.ones((uv.shape[0], 3), device=uv.device)
+    texture = getattr(material, "baseColorTexture", None) or getattr(material, "image", None)
+    if texture is not None:
+        albedo = srgb_to_linear(sample_tiled(images.get(texture), uv))
+    factor = getattr(material, "baseColorFactor", None)
+    if factor is not None:
+        factor = np.asarray(factor, dtype=np.float32)[:3]
+        factor = factor / 255 if np.asarray(material.baseColorFactor).dtype == np.uint8 else factor
+        albedo = albedo * torch.from_numpy(factor).to(uv.device)
+    return albedo
+
+
+def composite_materials(model_path, materials, bake_dir, texture_size=4096, shading="unlit", hdri_path=None, hdri_strength=1.0, device=None):
+    """
+    Composite every material of every group into the model's UV atlas, see the module docstring.
+
+    Parameters:
+        model_path (str): GLB with the material slots and the UV atlas.
+        materials (list): Material groups, as returned by read_json_materials.
+        bake_dir (str): Output folder.
+        texture_size (int): Size of the textures.
+        shading (str): 'unlit', or 'hdri_diffuse' to shade with the HDRI irradiance.
+        hdri_path (str): HDRI, required for 'hdri_diffuse'.
+        hdri_strength (float): Strength of the HDRI.
+        device (str): Torch device, CUDA if available by default.
+
+    Returns:
+        list: Paths of the written textures.
+    """
+    if shading not in ("unlit", "hdri_diffuse"):
+        raise ValueError(f"Unknown shading '{shading}', expected 'unlit' or 'hdri_diffuse'")
+    device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+    texels = load_model_texels(model_path, texture_size, device=device)
+    slot, uv = texels["slot"], texels["uv"]
+    num_slots = len(texels["slot_materials"])
+    bounds = torch.searchsorted(slot, torch.arange(num_slots + 1, device=device)).tolist()
+    ranges = [slice(bounds[s], bounds[s + 1]) for s in range(num_slots)]
+    lighting = None
+    if shading == "hdri_diffuse":
+        lighting = sh9_diffuse(hdri_sh9(hdri_path, hdri_strength), texels["normal"]).clamp_min(0)
+
+    images = _ImageCache(device)
+    albedos = {}
+    def albedo(s, material):
+        # per slot, evaluated once per material; None is the material of the GLB
+        key = (s, id(material))
+        if key not in albedos:
+            if material is None:
+                albedos[key] = glb_material_albedo(texels["slot_materials"][s], uv[ranges[s]], images)
+            else:
+                albedos[key] = material_albedo(material, uv[ranges[s]], images)
+        return albedos[key]
+
+    paths = []
+    current = [None] * num_slots
+    for i, group in enumerate(materials):
+        if i >= num_slots:
+            print(f"Warning: Not enough material slots for group {i}.")
+            break
+        group_bake_dir = os.path.join(bake_dir, f"material_group_{i}")
+        os.makedirs(group_bake_dir, exist_ok=True)
+        for material in group:
+            color = torch.cat([albedo(s, material if s == i else current[s]) for s in range(num_slots)])
+            if lighting is not None:
+                color = color * lighting
+            color = (linear_to_srgb(color) * 255).round().to(torch.uint8).cpu().numpy()
+            texture = np.zeros((texture_size * texture_size, 3), dtype=np.uint8)
+            texture[texels["covered"].cpu().numpy()] = color
+            texture = np.ascontiguousarray(texture.reshape(texture_size, texture_size, 3)[::-1])
+            texture = inpaint_texture(texture, texels["mask"])
+            path = os.path.join(group_bake_dir, material.name + ".jpg")
+            # renamed into place once written, so streamed responses never pick up a partial file
+            tmp_path = hidden_temp_path(path)
+            Image.fromarray(texture).save(tmp_path, quality=95)
+            os.replace(tmp_path, path)
+            paths.append(path)
+        if group:
+            current[i] = group[-1]
+            # only the last material of the group is needed by later groups
+            for key in [k for k in albedos if k[0] == i and k[1] != id(group[-1])]:
+                del albedos[key]
+    return paths
+
+
+def composite_from_json(model_path, material_json, bake_dir, **kwargs):
+    """
+    composite_materials with the materials of a material JSON.
+    """
+    return composite_materials(model_path, read_json_materials(material_json), bake_dir, **kwargs)
@@ -3,9 +3,9 @@ import torch
 import torch.nn as nn
 import torch.nn.functional as F
 from ...modules import sparse as sp
-from ...utils.random_utils import hammersley_sequence
+from ...utils.random_utils import hammersley_sequence_array
 from .base import SparseTransformerBase
-from ...representations import Gaussian
+from ...representations import Gaussian, GaussianBatch
 
 
 class SLatGaussianDecoder(SparseTransformerBase):
@@ -57,7 +57,7 @@ class SLatGaussianDecoder(SparseTransformerBase):
         nn.init.constant_(self.out_layer.bias, 0)
 
     def _build_perturbation(self) -> None:
-        perturbation = [hammersley_sequence(3, i, self.rep_config['num_gaussians']) for i in range(self.rep_config['num_gaussians'])]
+        perturbation = hammersley_sequence_array(3, self.rep_config['num_gaussians'])
         perturbation = torch.tensor(perturbation).float() * 2 - 1
         perturbation = perturbation / self.rep_config['voxel_size']
         perturbation = torch.atanh(perturbation).to(self.device)
@@ -77,6 +77,39 @@ class SLatGaussianDecoder(SparseTransformerBase):
             start += v['size']
         self.out_channels = start
     
+    def to_representation_batch(self, x: sp.SparseTensor) -> GaussianBatch:
+        """
+        Convert a batch of network outputs to a batch of 3D Gaussians in one pass.
+
+        Args:
+            x: The [N x * x C] sparse tensor output by the network.
+
+        Returns:
+            a GaussianBatch holding all samples in contiguous tensors
+        """
+        num_gaussians = self.rep_config['num_gaussians']
+        offsets = [x.layout[0].start * num_gaussians] + [l.stop * num_gaussians for l in x.layout]
+        representation = GaussianBatch(
+            offsets=offsets,
+            sh_degree=0,
+            aabb=[-0.5, -0.5, -0.5, 1.0, 1.0, 1.0],
+            mininum_kernel_size = self.rep_config['3d_filter_kernel_size'],
+            scaling_bias = self.rep_config['scaling_bias'],
+            opacity_bias = self.rep_config['opacity_bias'],
+            scaling_activation = self.rep_config['scaling_activation']
+        )
+        xyz = (x.coords[:, 1:].float() + 0.5) / self.resolution
+        for k, v in self.layout.items():
+            feats = x.feats[:, v['range'][0]:v['range'][1]].reshape(-1, *v['shape'])
+            feats = feats * self.rep_config['lr'][k]
+            if k == '_xyz':
+                if self.rep_config['perturb_offset']:
+                    feats = feats + self.offset_perturbation
+                feats = torch.tanh(feats) / self.resolution * 0.5 * self.rep_config['voxel_size']
+                feats = xyz.unsqueeze(1) + feats
+            setattr(representation, k, feats.flatten(0, 1))
+        return representation
+
     def to_representation(self, x: sp.SparseTensor) -> List[Gaussian]:
         """
         Convert a batch of network outputs to 3D representations.
@@ -85,34 +118,9 @@ class SLatGaussianDecoder(SparseTransformerBase):
             x: The [N x * x C] sparse tensor output by the network.
 
         Returns:
-            list of representations
+            list of representations, each a view into a shared GaussianBatch
         """
-        ret = []
-        for i in range(x.shape[0]):
-            representation = Gaussian(
-                sh_degree=0,
-                aabb=[-0.5, -0.5, -0.5, 1.0, 1.0, 1.0],
-                mininum_kernel_size = self.rep_config['3d_filter_kernel_size'],
-                scaling_bias = self.rep_config['scaling_bias'],
-                opacity_bias = self.rep_config['opacity_bias'],
-                scaling_activation = self.rep_config['scaling_activation']
-            )
-            xyz = (x.coords[x.layout[i]][:, 1:].float() + 0.5) / self.resolution
-            for k, v in self.layout.items():
-                if k == '_xyz':
-                    offset = x.feats[x.layout[i]][:, v['range'][0]:v['range'][1]].reshape(-1, *v['shape'])
-                    offset = offset * self.rep_config['lr'][k]
-                    if self.rep_config['perturb_offset']:
-                        offset = offset + self.offset_perturbation
-                    offset = torch.tanh(offset) / self.resolution * 0.5 * self.rep_config['voxel_size']
-                    _xyz = xyz.unsqueeze(1) + offset
-                    setattr(representation, k, _xyz.flatten(0, 1))
-                else:
-                    feats = x.feats[x.layout[i]][:, v['range'][0]:v['range'][1]].reshape(-1, *v['shape']).flatten(0, 1)
-                    feats = feats * self.rep_config['lr'][k]
-                    setattr(representation, k, feats)
-            ret.append(representation)
-        return ret
+        return self.to_representation_batch(x).unbind()
 
     def forward(self, x: sp.SparseTensor) -> List[Gaussian]:
         h = super().forward(x)
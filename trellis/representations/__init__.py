@@ -1,4 +1,4 @@
 from .radiance_field import Strivec
 from .octree import DfsOctree as Octree
-from .gaussian import Gaussian
+from .gaussian import Gaussian, GaussianBatch
 from .mesh import MeshExtractResult
@@ -1 +1,2 @@
-from .gaussian_model import Gaussian
\ No newline at end of file
+from .gaussian_model import Gaussian
+from .gaussian_batch import GaussianBatch
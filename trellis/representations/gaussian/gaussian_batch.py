@@ -0,0 +1,118 @@
+import copy
+from typing import *
+import torch
+from .gaussian_model import Gaussian
+
+
+class GaussianBatch:
+    """
+    A batch of 3D Gaussians stored as a struct of arrays.
+
+    The attributes of all samples are concatenated into contiguous tensors and
+    `offsets[i]:offsets[i + 1]` selects the Gaussians of sample i. Indexing the
+    batch returns a `Gaussian` whose attributes are views into these tensors, so
+    it can be passed to `GaussianRenderer`, `save_ply` or `to_glb` without copying.
+
+    Args:
+        offsets (List[int]): Start index of each sample, followed by the total count. Length B + 1.
+        aabb (list): Axis-aligned bounding box shared by all samples.
+        The remaining arguments are forwarded to `Gaussian`.
+    """
+    def __init__(
+            self,
+            offsets : List[int],
+            aabb : list,
+            sh_degree : int = 0,
+            mininum_kernel_size : float = 0.0,
+            scaling_bias : float = 0.01,
+            opacity_bias : float = 0.1,
+            scaling_activation : str = "exp",
+            device='cuda'
+        ):
+        assert len(offsets) >= 1 and all(offsets[i] <= offsets[i + 1] for i in range(len(offsets) - 1)), \
+            'offsets must be a non-decreasing list of length B + 1'
+        self.offsets = list(offsets)
+        self.device = device
+
+        # Activations and biases are shared by all samples, build them once.
+        self._template = Gaussian(
+            aabb=aabb,
+            sh_degree=sh_degree,
+            mininum_kernel_size=mininum_kernel_size,
+            scaling_bias=scaling_bias,
+            opacity_bias=opacity_bias,
+            scaling_activation=scaling_activation,
+            device=device,
+        )
+        self.init_params = self._template.init_params
+
+        self._xyz = None
+        self._features_dc = None
+        self._features_rest = None
+        self._scaling = None
+        self._rotation = None
+        self._opacity = None
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    @property
+    def num_gaussians(self) -> int:
+        return self.offsets[-1] - self.offsets[0]
+
+    @property
+    def sizes(self) -> List[int]:
+        return [self.offsets[i + 1] - self.offsets[i] for i in range(len(self))]
+
+    def _view(self, attr: Optional[torch.Tensor], i: int) -> Optional[torch.Tensor]:
+        if attr is None:
+            return None
+        return attr[self.offsets[i]:self.offsets[i + 1]]
+
+    def __getitem__(self, i: int) -> Gaussian:
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(f'Sample index {i} out of range for batch of size {len(self)}')
+        # Shallow copy shares the aabb and bias tensors of the template.
+        representation = copy.copy(self._template)
+        representation._xyz = self._view(self._xyz, i)
+        representation._features_dc = self._view(self._features_dc, i)
+        representation._features_rest = self._view(self._features_rest, i)
+        representation._scaling = self._view(self._scaling, i)
+        representation._rotation = self._view(self._rotation, i)
+        representation._opacity = self._view(self._opacity, i)
+        return representation
+
+    def __iter__(self) -> Iterator[Gaussian]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def unbind(self) -> List[Gaussian]:
+        """
+        Split the batch into per-sample `Gaussian` views.
+        """
+        return [self[i] for i in range(len(self))]
+
+    @property
+    def get_scaling(self):
+        scales = self._template.scaling_activation(self._scaling + self._template.scale_bias)
+        scales = torch.square(scales) + self._template.mininum_kernel_size ** 2
+        scales = torch.sqrt(scales)
+        return scales
+
+    @property
+    def get_rotation(self):
+        return self._template.rotation_activation(self._rotation + self._template.rots_bias[None, :])
+
+    @property
+    def get_xyz(self):
+        return self._xyz * self._template.aabb[None, 3:] + self._template.aabb[None, :3]
+
+    @property
+    def get_features(self):
+        return torch.cat((self._features_dc, self._features_rest), dim=2) if self._features_rest is not None else self._features_dc
+
+    @property
+    def get_opacity(self):
+        return self._template.opacity_activation(self._opacity + self._template.opacity_bias)
@@ -1,10 +1,39 @@
 import torch
 import numpy as np
+from numpy.lib.recfunctions import structured_to_unstructured
 from plyfile import PlyData, PlyElement
 from .general_utils import inverse_sigmoid, strip_symmetric, build_scaling_rotation
 import utils3d
 
 
+# Zeroth order spherical harmonic, maps DC coefficients to colors
+SH_C0 = 0.28209479177387814
+
+# Record of a Gaussian in .splat files
+SPLAT_DTYPE = np.dtype([
+    ('position', '<f4', 3),
+    ('scale', '<f4', 3),
+    ('rgba', 'u1', 4),
+    ('rotation', 'u1', 4),
+])
+
+
+def _morton_codes(points, bits=10):
+    """
+    Z-order curve index of each point, quantized to `bits` bits per axis in their bounding box.
+    """
+    if len(points) == 0:
+        return np.zeros(0, dtype=np.uint64)
+    low = points.min(axis=0)
+    extent = np.maximum(points.max(axis=0) - low, 1e-12)
+    cells = ((points - low) / extent * ((1 << bits) - 1)).round().astype(np.uint64)
+    codes = np.zeros(len(points), dtype=np.uint64)
+    for bit in range(bits):
+        for axis in range(3):
+            codes |= ((cells[:, axis] >> np.uint64(bit)) & np.uint64(1)) << np.uint64(3 * bit + axis)
+    return codes
+
+
 class Gaussian:
     def __init__(
             self, 
@@ -115,78 +144,110 @@ class Gaussian:
         # All channels except the 3 DC
         for i in range(self._features_dc.shape[1]*self._features_dc.shape[2]):
             l.append('f_dc_{}'.format(i))
+        if self._features_rest is not None:
+            for i in range(self._features_rest.shape[1]*self._features_rest.shape[2]):
+                l.append('f_rest_{}'.format(i))
         l.append('opacity')
         for i in range(self._scaling.shape[1]):
             l.append('scale_{}'.format(i))
         for i in range(self._rotation.shape[1]):
             l.append('rot_{}'.format(i))
         return l
-        
-    def save_ply(self, path, transform=[[1, 0, 0], [0, 0, -1], [0, 1, 0]]):
+
+    def _export_attributes(self, transform):
+        """
+        Attributes as saved in PLY files, as float32 numpy arrays of one row per Gaussian:
+        positions, DC and rest SH coefficients, opacity logits, log scales and rotations.
+        """
         xyz = self.get_xyz.detach().cpu().numpy()
-        normals = np.zeros_like(xyz)
         f_dc = self._features_dc.detach().transpose(1, 2).flatten(start_dim=1).contiguous().cpu().numpy()
+        if self._features_rest is not None:
+            f_rest = self._features_rest.detach().transpose(1, 2).flatten(start_dim=1).contiguous().cpu().numpy()
+        else:
+            f_rest = np.zeros((xyz.shape[0], 0), dtype=np.float32)
         opacities = inverse_sigmoid(self.get_opacity).detach().cpu().numpy()
         scale = torch.log(self.get_scaling).detach().cpu().numpy()
         rotation = (self._rotation + self.rots_bias[None, :]).detach().cpu().numpy()
-        
+
         if transform is not None:
             transform = np.array(transform)
             xyz = np.matmul(xyz, transform.T)
             rotation = utils3d.numpy.quaternion_to_matrix(rotation)
             rotation = np.matmul(transform, rotation)
             rotation = utils3d.numpy.matrix_to_quaternion(rotation)
+        return [a.astype(np.float32, copy=False) for a in (xyz, f_dc, f_rest, opacities, scale, rotation)]
+
+    def save_ply(self, path, transform=[[1, 0, 0], [0, 0, -1], [0, 1, 0]]):
+        xyz, f_dc, f_rest, opacities, scale, rotation = self._export_attributes(transform)
+        normals = np.zeros_like(xyz)
 
         dtype_full = [(attribute, 'f4') for attribute in self.construct_list_of_attributes()]
 
-        elements = np.empty(xyz.shape[0], dtype=dtype_full)
-        attributes = np.concatenate((xyz, normals, f_dc, opacities, scale, rotation), axis=1)
-        elements[:] = list(map(tuple, attributes))
+        # The rows of a C-contiguous float32 array have the layout of the records, view them as such
+        attributes = np.ascontiguousarray(np.concatenate((xyz, normals, f_dc, f_rest, opacities, scale, rotation), axis=1))
+        elements = attributes.view(dtype_full).reshape(-1)
         el = PlyElement.describe(elements, 'vertex')
         PlyData([el]).write(path)
 
+    def save_splat(self, path, transform=[[1, 0, 0], [0, 0, -1], [0, 1, 0]], min_opacity=1 / 255):
+        """
+        Save in the .splat format read by web Gaussian viewers: 32 bytes per Gaussian, with
+        float32 position and scale, RGBA and rotation quantized to uint8.
+
+        Gaussians below `min_opacity` are dropped, as the uint8 alpha would round them to
+        (nearly) zero, and the rest are sorted along a Morton curve, so neighbours in space
+        are neighbours in the file and the file compresses well.
+
+        Returns the number of Gaussians written.
+        """
+        xyz, f_dc, _, opacities, scale, rotation = self._export_attributes(transform)
+        alpha = 1 / (1 + np.exp(-opacities[:, 0]))
+        keep = np.nonzero(alpha >= min_opacity)[0]
+        keep = keep[np.argsort(_morton_codes(xyz[keep]), kind='stable')]
+
+        splats = np.empty(len(keep), dtype=SPLAT_DTYPE)
+        splats['position'] = xyz[keep]
+        splats['scale'] = np.exp(scale[keep])
+        color = 0.5 + SH_C0 * f_dc[keep, :3]
+        rgba = np.concatenate((color, alpha[keep, None]), axis=1)
+        splats['rgba'] = np.clip(np.round(rgba * 255), 0, 255)
+        rotation = rotation[keep] / np.linalg.norm(rotation[keep], axis=1, keepdims=True).clip(1e-12)
+        splats['rotation'] = np.clip(np.round(rotation * 128 + 128), 0, 255)
+        splats.tofile(path)
+        return len(keep)
+
     def load_ply(self, path, transform=[[1, 0, 0], [0, 0, -1], [0, 1, 0]]):
-        plydata = PlyData.read(path)
+        vertex = PlyData.read(path)['vertex']
+        names = [p.name for p in vertex.properties]
 
-        xyz = np.stack((np.asarray(plydata.elements[0]["x"]),
-                        np.asarray(plydata.elements[0]["y"]),
-                        np.asarray(plydata.elements[0]["z"])),  axis=1)
-        opacities = np.asarray(plydata.elements[0]["opacity"])[..., np.newaxis]
+        def read_fields(prefix):
+            fields = sorted((n for n in names if n.startswith(prefix)), key=lambda x: int(x.split('_')[-1]))
+            if not fields:
+                return np.zeros((vertex.count, 0), dtype=np.float32)
+            return structured_to_unstructured(vertex.data[fields], dtype=np.float32)
 
-        features_dc = np.zeros((xyz.shape[0], 3, 1))
-        features_dc[:, 0, 0] = np.asarray(plydata.elements[0]["f_dc_0"])
-        features_dc[:, 1, 0] = np.asarray(plydata.elements[0]["f_dc_1"])
-        features_dc[:, 2, 0] = np.asarray(plydata.elements[0]["f_dc_2"])
+        xyz = structured_to_unstructured(vertex.data[['x', 'y', 'z']], dtype=np.float32)
+        opacities = structured_to_unstructured(vertex.data[['opacity']], dtype=np.float32)
+        # (P, 3) to (P, 3, 1)
+        features_dc = read_fields('f_dc_')[:, :, None]
 
         if self.sh_degree > 0:
-            extra_f_names = [p.name for p in plydata.elements[0].properties if p.name.startswith("f_rest_")]
-            extra_f_names = sorted(extra_f_names, key = lambda x: int(x.split('_')[-1]))
-            assert len(extra_f_names)==3*(self.sh_degree + 1) ** 2 - 3
-            features_extra = np.zeros((xyz.shape[0], len(extra_f_names)))
-            for idx, attr_name in enumerate(extra_f_names):
-                features_extra[:, idx] = np.asarray(plydata.elements[0][attr_name])
+            features_extra = read_fields('f_rest_')
+            assert features_extra.shape[1]==3*(self.sh_degree + 1) ** 2 - 3
             # Reshape (P,F*SH_coeffs) to (P, F, SH_coeffs except DC)
-            features_extra = features_extra.reshape((features_extra.shape[0], 3, (self.max_sh_degree + 1) ** 2 - 1))
-
-        scale_names = [p.name for p in plydata.elements[0].properties if p.name.startswith("scale_")]
-        scale_names = sorted(scale_names, key = lambda x: int(x.split('_')[-1]))
-        scales = np.zeros((xyz.shape[0], len(scale_names)))
-        for idx, attr_name in enumerate(scale_names):
-            scales[:, idx] = np.asarray(plydata.elements[0][attr_name])
-
-        rot_names = [p.name for p in plydata.elements[0].properties if p.name.startswith("rot")]
-        rot_names = sorted(rot_names, key = lambda x: int(x.split('_')[-1]))
-        rots = np.zeros((xyz.shape[0], len(rot_names)))
-        for idx, attr_name in enumerate(rot_names):
-            rots[:, idx] = np.asarray(plydata.elements[0][attr_name])
-            
+            features_extra = features_extra.reshape((features_extra.shape[0], 3, (self.sh_degree + 1) ** 2 - 1))
+
+        scales = read_fields('scale_')
+        rots = read_fields('rot_')
+
         if transform is not None:
+            # save_ply applied the transform, undo it
             transform = np.array(transform)
             xyz = np.matmul(xyz, transform)
-            rotation = utils3d.numpy.quaternion_to_matrix(rotation)
-            rotation = np.matmul(rotation, transform)
-            rotation = utils3d.numpy.matrix_to_quaternion(rotation)
-            
+            rots = utils3d.numpy.quaternion_to_matrix(rots)
+            rots = np.matmul(transform.T, rots)
+            rots = utils3d.numpy.matrix_to_quaternion(rots)
+
         # convert to actual gaussian attributes
         xyz = torch.tensor(xyz, dtype=torch.float, device=self.device)
         features_dc = torch.tensor(features_dc, dtype=torch.float, device=self.device).transpose(1, 2).contiguous()
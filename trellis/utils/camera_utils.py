@@ -0,0 +1,109 @@
+from typing import *
+import functools
+import numpy as np
+import torch
+import utils3d
+from easydict import EasyDict as edict
+from .random_utils import sphere_hammersley_sequence_array
+
+
+__all__ = [
+    'yaw_pitch_to_origins',
+    'yaw_pitch_r_fov_to_cameras',
+    'hammersley_rig',
+]
+
+
+def yaw_pitch_to_origins(yaws: torch.Tensor, pitchs: torch.Tensor, rs: torch.Tensor) -> torch.Tensor:
+    """
+    Camera positions on spheres around the origin, z-up.
+
+    Args:
+        yaws (torch.Tensor): Yaw angles in radians. Shape (N,).
+        pitchs (torch.Tensor): Pitch angles in radians. Shape (N,).
+        rs (torch.Tensor): Distances to the origin. Shape (N,).
+
+    Returns:
+        (torch.Tensor): Camera positions. Shape (N, 3).
+    """
+    return torch.stack([
+        torch.sin(yaws) * torch.cos(pitchs),
+        torch.cos(yaws) * torch.cos(pitchs),
+        torch.sin(pitchs),
+    ], dim=-1) * rs[:, None]
+
+
+def yaw_pitch_r_fov_to_cameras(
+    yaws: Union[Sequence[float], np.ndarray, torch.Tensor],
+    pitchs: Union[Sequence[float], np.ndarray, torch.Tensor],
+    rs: Union[float, Sequence[float], np.ndarray, torch.Tensor],
+    fovs: Union[float, Sequence[float], np.ndarray, torch.Tensor],
+    device: Union[str, torch.device] = 'cuda',
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    """
+    Build the cameras looking at the origin from the given angles, all in one vectorised call.
+
+    Args:
+        yaws: Yaw angles in radians. Shape (N,).
+        pitchs: Pitch angles in radians. Shape (N,).
+        rs: Distances to the origin, a scalar or shape (N,).
+        fovs: Fields of view in degrees, a scalar or shape (N,).
+        device: Device of the returned matrices.
+
+    Returns:
+        (torch.Tensor): OpenCV extrinsics. Shape (N, 4, 4).
+        (torch.Tensor): Normalized OpenCV intrinsics. Shape (N, 3, 3).
+    """
+    yaws = torch.as_tensor(yaws, dtype=torch.float32, device=device).reshape(-1)
+    pitchs = torch.as_tensor(pitchs, dtype=torch.float32, device=device).reshape(-1)
+    rs = torch.as_tensor(rs, dtype=torch.float32, device=device).expand(yaws.shape[0])
+    fovs = torch.deg2rad(torch.as_tensor(fovs, dtype=torch.float32, device=device).expand(yaws.shape[0]))
+    origs = yaw_pitch_to_origins(yaws, pitchs, rs)
+    extrinsics = utils3d.torch.extrinsics_look_at(
+        origs,
+        torch.zeros_like(origs),
+        torch.tensor([0, 0, 1], dtype=torch.float32, device=device).expand_as(origs),
+    )
+    intrinsics = utils3d.torch.intrinsics_from_fov_xy(fovs, fovs)
+    return extrinsics, intrinsics
+
+
+@functools.lru_cache(maxsize=32)
+def _hammersley_rig(num_views: int, radius: float, fov: float, device: str) -> edict:
+    yaws, pitchs = torch.tensor(sphere_hammersley_sequence_array(num_views), dtype=torch.float32, device=device).unbind(-1)
+    extrinsics, intrinsics = yaw_pitch_r_fov_to_cameras(yaws, pitchs, radius, fov, device=device)
+    return edict({
+        'yaws': yaws,
+        'pitchs': pitchs,
+        'extrinsics': extrinsics,
+        'intrinsics': intrinsics,
+        'views': utils3d.torch.extrinsics_to_view(extrinsics),
+    })
+
+
+def hammersley_rig(
+    num_views: int,
+    radius: float = 2.0,
+    fov: float = 40.0,
+    device: Union[str, torch.device] = 'cuda',
+) -> edict:
+    """
+    Cameras spread over a sphere by the Hammersley sequence, looking at the origin.
+
+    Rigs are memoised by (num_views, radius, fov, device), so the returned tensors are
+    shared between callers and must not be modified in place.
+
+    Args:
+        num_views (int): Number of cameras.
+        radius (float): Distance of the cameras to the origin.
+        fov (float): Field of view in degrees.
+        device: Device of the returned tensors.
+
+    Returns:
+        edict containing:
+            yaws, pitchs (torch.Tensor): Camera angles in radians. Shape (N,).
+            extrinsics (torch.Tensor): OpenCV extrinsics. Shape (N, 4, 4).
+            intrinsics (torch.Tensor): Normalized OpenCV intrinsics. Shape (N, 3, 3).
+            views (torch.Tensor): OpenGL view matrices. Shape (N, 4, 4).
+    """
+    return _hammersley_rig(int(num_views), float(radius), float(fov), str(torch.device(device)))
@@ -0,0 +1,284 @@
+from typing import *
+import io
+import numpy as np
+import trimesh
+from scipy.spatial import cKDTree
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+
+__all__ = [
+    'weld_vertices',
+    'catmull_clark',
+    'vertex_normals',
+    'write_obj',
+    'finish_mesh',
+    'finish_to_obj',
+]
+
+
+def weld_vertices(vertices: np.ndarray, faces: np.ndarray, threshold: float = 1e-4) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Merge vertices closer than `threshold`, and drop the faces collapsed by the merge.
+
+    Vertices are merged transitively: every cluster of vertices linked by pairs closer than
+    the threshold becomes one vertex at the cluster centroid. Unreferenced vertices are removed.
+
+    Args:
+        vertices (np.ndarray): Vertices of the mesh. Shape (V, 3).
+        faces (np.ndarray): Faces of the mesh. Shape (F, 3).
+        threshold (float): Merge distance.
+
+    Returns:
+        (np.ndarray): Welded vertices. Shape (V', 3).
+        (np.ndarray): Faces indexing the welded vertices. Shape (F', 3).
+        (np.ndarray): Index of the input faces that were kept. Shape (F',).
+    """
+    num_vertices = vertices.shape[0]
+    pairs = cKDTree(vertices).query_pairs(threshold, output_type='ndarray')
+    graph = coo_matrix((np.ones(pairs.shape[0], dtype=np.int8), (pairs[:, 0], pairs[:, 1])), shape=(num_vertices, num_vertices))
+    _, labels = connected_components(graph, directed=False)
+
+    faces = labels[faces]
+    kept = np.nonzero((faces[:, 0] != faces[:, 1]) & (faces[:, 1] != faces[:, 2]) & (faces[:, 2] != faces[:, 0]))[0]
+    faces = faces[kept]
+
+    used, faces = np.unique(faces, return_inverse=True)
+    faces = faces.reshape(-1, 3)
+    remap = np.full(labels.max() + 1, -1, dtype=np.int64)
+    remap[used] = np.arange(used.shape[0])
+    labels = remap[labels]
+    referenced = labels >= 0
+    counts = np.bincount(labels[referenced], minlength=used.shape[0])[:, None]
+    welded = np.stack([np.bincount(labels[referenced], weights=vertices[referenced, i], minlength=used.shape[0]) for i in range(3)], axis=-1) / counts
+    return welded.astype(vertices.dtype), faces, kept
+
+
+def catmull_clark(
+    vertices: np.ndarray,
+    faces: np.ndarray,
+    corner_uvs: Optional[np.ndarray] = None,
+) -> Tuple[np.ndarray, np.ndarray, Optional[np.ndarray]]:
+    """
+    One level of Catmull-Clark subdivision of a triangle mesh, splitting every triangle into 3 quads.
+
+    Edges shared by a number of faces other than two are treated as creases: their edge
+    points are midpoints, vertices on exactly two of them follow the crease rule, and
+    vertices on more are kept in place. Face-varying UVs are interpolated linearly.
+
+    Args:
+        vertices (np.ndarray): Vertices of the mesh. Shape (V, 3).
+        faces (np.ndarray): Triangles of the mesh. Shape (F, 3).
+        corner_uvs (np.ndarray): UV coordinates of every face corner. Shape (F, 3, 2).
+
+    Returns:
+        (np.ndarray): Subdivided vertices: the moved input vertices, then edge points, then face points. Shape (V + E + F, 3).
+        (np.ndarray): Quads of the subdivided mesh. Shape (3F, 4).
+        (np.ndarray): UV coordinates of every quad corner, if `corner_uvs` is given. Shape (3F, 4, 2).
+    """
+    num_vertices, num_faces = vertices.shape[0], faces.shape[0]
+    vertices = vertices.astype(np.float64)
+    face_points = vertices[faces].mean(axis=1)
+
+    # edge k of a face joins its corners k and k + 1
+    face_edges = np.sort(np.stack([faces, np.roll(faces, -1, axis=1)], axis=-1).reshape(-1, 2), axis=1)
+    # unique over scalar keys, much faster than over rows
+    edge_keys, face_edge_ids = np.unique(face_edges[:, 0] * num_vertices + face_edges[:, 1], return_inverse=True)
+    edges = np.stack([edge_keys // num_vertices, edge_keys % num_vertices], axis=-1)
+    face_edge_ids = face_edge_ids.reshape(num_faces, 3)
+    num_edges = edges.shape[0]
+    edge_face_counts = np.bincount(face_edge_ids.reshape(-1), minlength=num_edges)
+    smooth_edge = edge_face_counts == 2
+
+    def scatter(index, values, size):
+        return np.stack([np.bincount(index, weights=values[:, i], minlength=size) for i in range(values.shape[1])], axis=-1)
+
+    # edge points
+    midpoints = vertices[edges].mean(axis=1)
+    edge_face_sums = scatter(face_edge_ids.reshape(-1), np.repeat(face_points, 3, axis=0), num_edges)
+    edge_points = np.where(
+        smooth_edge[:, None],
+        (vertices[edges[:, 0]] + vertices[edges[:, 1]] + edge_face_sums) / 4,
+        midpoints,
+    )
+
+    # vertex points
+    valence = np.bincount(edges.reshape(-1), minlength=num_vertices)
+    face_valence = np.bincount(faces.reshape(-1), minlength=num_vertices)
+    Q = scatter(faces.reshape(-1), np.repeat(face_points, 3, axis=0), num_vertices) / np.maximum(face_valence, 1)[:, None]
+    R = scatter(edges.reshape(-1), np.repeat(midpoints, 2, axis=0), num_vertices) / np.maximum(valence, 1)[:, None]
+    n = np.maximum(valence, 1)[:, None]
+    smooth_points = (Q + 2 * R + (n - 3) * vertices) / n
+
+    crease_edges = edges[~smooth_edge]
+    crease_valence = np.bincount(crease_edges.reshape(-1), minlength=num_vertices)
+    crease_neighbours = scatter(
+        crease_edges.reshape(-1),
+        vertices[crease_edges[:, ::-1].reshape(-1)],
+        num_vertices,
+    )
+    crease_points = 0.75 * vertices + 0.125 * crease_neighbours
+    vertex_points = np.where(
+        (crease_valence == 0)[:, None], smooth_points,
+        np.where((crease_valence == 2)[:, None], crease_points, vertices),
+    )
+
+    # corner k of a face gets the quad (corner k, edge k, face, edge k - 1)
+    quads = np.stack([
+        faces,
+        num_vertices + face_edge_ids,
+        np.repeat(num_vertices + num_edges + np.arange(num_faces)[:, None], 3, axis=1),
+        num_vertices + np.roll(face_edge_ids, 1, axis=1),
+    ], axis=-1).reshape(-1, 4)
+    subdivided = np.concatenate([vertex_points, edge_points, face_points], axis=0).astype(np.float32)
+
+    quad_uvs = None
+    if corner_uvs is not None:
+        edge_uvs = (corner_uvs + np.roll(corner_uvs, -1, axis=1)) / 2
+        quad_uvs = np.stack([
+            corner_uvs,
+            edge_uvs,
+            np.repeat(corner_uvs.mean(axis=1, keepdims=True), 3, axis=1),
+            np.roll(edge_uvs, 1, axis=1),
+        ], axis=2).reshape(-1, 4, 2)
+    return subdivided, quads, quad_uvs
+
+
+def vertex_normals(vertices: np.ndarray, faces: np.ndarray) -> np.ndarray:
+    """
+    Smooth vertex normals, the area weighted average of the normals of the adjacent faces.
+
+    Args:
+        vertices (np.ndarray): Vertices of the mesh. Shape (V, 3).
+        faces (np.ndarray): Triangles or quads of the mesh. Shape (F, 3) or (F, 4).
+
+    Returns:
+        (np.ndarray): Unit vertex normals. Shape (V, 3).
+    """
+    corners = vertices[faces].astype(np.float64)
+    if faces.shape[1] == 4:
+        face_normals = np.cross(corners[:, 2] - corners[:, 0], corners[:, 3] - corners[:, 1])
+    else:
+        face_normals = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+    normals = np.stack([
+        np.bincount(faces.reshape(-1), weights=np.repeat(face_normals[:, i], faces.shape[1]), minlength=vertices.shape[0])
+        for i in range(3)
+    ], axis=-1)
+    normals /= np.maximum(np.linalg.norm(normals, axis=-1, keepdims=True), 1e-12)
+    return normals.astype(np.float32)
+
+
+def _write_rows(file: BinaryIO, fmt: str, rows: np.ndarray, chunk_size: int):
+    for start in range(0, rows.shape[0], chunk_size):
+        chunk = rows[start:start + chunk_size]
+        file.write(((fmt * chunk.shape[0]) % tuple(chunk.reshape(-1).tolist())).encode())
+
+
+def write_obj(
+    file: BinaryIO,
+    vertices: np.ndarray,
+    faces: np.ndarray,
+    uvs: Optional[np.ndarray] = None,
+    face_uvs: Optional[np.ndarray] = None,
+    normals: Optional[np.ndarray] = None,
+    name: str = 'model',
+    chunk_size: int = 1 << 16,
+):
+    """
+    Write a mesh to a Wavefront OBJ stream, formatting `chunk_size` rows at a time.
+
+    Args:
+        file (BinaryIO): Binary stream to write to.
+        vertices (np.ndarray): Vertices. Shape (V, 3).
+        faces (np.ndarray): Polygons of equal size, indexing the vertices. Shape (F, K).
+        uvs (np.ndarray): UV coordinates. Shape (T, 2).
+        face_uvs (np.ndarray): Polygons indexing the UV coordinates. Shape (F, K).
+        normals (np.ndarray): Vertex normals, indexed like the vertices. Shape (V, 3).
+        name (str): Object name.
+        chunk_size (int): Number of rows formatted at once.
+    """
+    file.write(f'# TRELLIS\no {name}\n'.encode())
+    _write_rows(file, 'v %.6f %.6f %.6f\n', vertices, chunk_size)
+    if uvs is not None:
+        _write_rows(file, 'vt %.6f %.6f\n', uvs, chunk_size)
+    if normals is not None:
+        _write_rows(file, 'vn %.4f %.4f %.4f\n', normals, chunk_size)
+        file.write(b's 1\n')
+
+    if uvs is not None and normals is not None:
+        rows, corner_fmt = np.stack([faces, face_uvs, faces], axis=-1), '%d/%d/%d'
+    elif uvs is not None:
+        rows, corner_fmt = np.stack([faces, face_uvs], axis=-1), '%d/%d'
+    elif normals is not None:
+        rows, corner_fmt = np.stack([faces, faces], axis=-1), '%d//%d'
+    else:
+        rows, corner_fmt = faces[..., None], '%d'
+    fmt = 'f ' + ' '.join([corner_fmt] * faces.shape[1]) + '\n'
+    _write_rows(file, fmt, rows.reshape(faces.shape[0], -1) + 1, chunk_size)
+
+
+def finish_mesh(
+    mesh: trimesh.Trimesh,
+    merge_threshold: float = 1e-4,
+    subdivide: bool = True,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Finish a mesh for export: weld vertices, subdivide once with Catmull-Clark and compute smooth normals.
+
+    The UVs of the mesh, e.g. the xatlas atlas of `to_glb`, are kept as face-varying UVs,
+    so the vertices split along UV seams can be welded without losing them.
+
+    Args:
+        mesh (trimesh.Trimesh): Mesh, with UV coordinates if it is textured.
+        merge_threshold (float): Distance below which vertices are merged.
+        subdivide (bool): Whether to apply one level of Catmull-Clark subdivision.
+
+    Returns:
+        (np.ndarray): Vertices. Shape (V, 3).
+        (np.ndarray): Triangles or quads. Shape (F, 3) or (F, 4).
+        (np.ndarray): Unique UV coordinates, or None. Shape (T, 2).
+        (np.ndarray): Polygons indexing the UV coordinates, or None. Shape (F, 3) or (F, 4).
+        (np.ndarray): Vertex normals. Shape (V, 3).
+    """
+    vertices = np.asarray(mesh.vertices, dtype=np.float32)
+    faces = np.asarray(mesh.faces, dtype=np.int64)
+    uv = getattr(mesh.visual, 'uv', None)
+    corner_uvs = np.asarray(uv, dtype=np.float32)[faces] if uv is not None else None
+
+    vertices, faces, kept = weld_vertices(vertices, faces, merge_threshold)
+    if corner_uvs is not None:
+        corner_uvs = corner_uvs[kept]
+    if subdivide:
+        vertices, faces, corner_uvs = catmull_clark(vertices, faces, corner_uvs)
+    normals = vertex_normals(vertices, faces)
+
+    uvs = face_uvs = None
+    if corner_uvs is not None:
+        # unique over the bits of each UV pair, much faster than over rows
+        uv_keys = np.ascontiguousarray(corner_uvs.reshape(-1, 2), dtype=np.float32).view(np.uint64).reshape(-1)
+        uv_keys, face_uvs = np.unique(uv_keys, return_inverse=True)
+        uvs = uv_keys.view(np.float32).reshape(-1, 2)
+        face_uvs = face_uvs.reshape(faces.shape)
+    return vertices, faces, uvs, face_uvs, normals
+
+
+def finish_to_obj(
+    mesh: trimesh.Trimesh,
+    merge_threshold: float = 1e-4,
+    subdivide: bool = True,
+) -> bytes:
+    """
+    `finish_mesh` followed by `write_obj`, returning the OBJ data.
+
+    Args:
+        mesh (trimesh.Trimesh): Mesh, with UV coordinates if it is textured.
+        merge_threshold (float): Distance below which vertices are merged.
+        subdivide (bool): Whether to apply one level of Catmull-Clark subdivision.
+
+    Returns:
+        (bytes): The OBJ file.
+    """
+    vertices, faces, uvs, face_uvs, normals = finish_mesh(mesh, merge_threshold=merge_threshold, subdivide=subdivide)
+    buffer = io.BytesIO()
+    write_obj(buffer, vertices, faces, uvs=uvs, face_uvs=face_uvs, normals=normals)
+    return buffer.getvalue()
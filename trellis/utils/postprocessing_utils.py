@@ -1,4 +1,6 @@
 from typing import *
+import os
+import time
 import numpy as np
 import torch
 import utils3d
@@ -6,18 +8,89 @@ import nvdiffrast.torch as dr
 from tqdm import tqdm
 import trimesh
 import trimesh.visual
-import xatlas
 import pyvista as pv
 from pymeshfix import _meshfix
 import igraph
-import cv2
 from PIL import Image
-from .random_utils import sphere_hammersley_sequence
+from .camera_utils import hammersley_rig
+from .raster_utils import rasterize_triangles
 from .render_utils import render_multiview
+from .segment_utils import groups_to_segment_ids, segment_mean, segment_median, segment_quantile, segment_sum, segment_unique
+from .texture_utils import inpaint_texture
+from .uv_utils import parametrize_mesh_cached
+from .visibility_utils import compute_face_visibility, compute_face_visibility_adaptive, progressive_view_order, resolve_visibility_backend
 from ..renderers import GaussianRenderer
 from ..representations import Strivec, Gaussian, MeshExtractResult
 
 
+def _solve_mincut(
+    num_faces: int,
+    dual_edges: torch.Tensor,
+    dual_edges_weights: torch.Tensor,
+    inner_face_indices: torch.Tensor,
+    outer_face_indices: torch.Tensor,
+    backend: Literal['igraph', 'bk'] = 'igraph',
+) -> np.ndarray:
+    """
+    Solve the s-t mincut separating invisible faces (source) from outer faces (target) on the dual graph.
+
+    The source and target are vertices `num_faces` and `num_faces + 1`, and the whole graph is
+    built from integer numpy arrays.
+
+    Args:
+        num_faces (int): Number of faces of the mesh.
+        dual_edges (torch.Tensor): Edges of the dual graph. Shape (E, 2).
+        dual_edges_weights (torch.Tensor): Capacities of the dual edges. Shape (E,).
+        inner_face_indices (torch.Tensor): Faces connected to the source.
+        outer_face_indices (torch.Tensor): Faces connected to the target.
+        backend (str): 'igraph' uses igraph's mincut, 'bk' uses the Boykov-Kolmogorov
+            max-flow of PyMaxflow (`pip install PyMaxflow`), which is much faster on the
+            grid-like dual graphs of TRELLIS meshes.
+
+    Returns:
+        (np.ndarray): Indices of the faces on the source side of the cut.
+    """
+    dual_edges = dual_edges.cpu().numpy().astype(np.int64)
+    dual_edges_weights = dual_edges_weights.cpu().numpy().astype(np.float64) * 1000
+    inner_face_indices = inner_face_indices.cpu().numpy().astype(np.int64)
+    outer_face_indices = outer_face_indices.cpu().numpy().astype(np.int64)
+    source, target = num_faces, num_faces + 1
+
+    if backend == 'igraph':
+        edges = np.concatenate([
+            dual_edges,
+            np.stack([inner_face_indices, np.full_like(inner_face_indices, source)], axis=1),
+            np.stack([outer_face_indices, np.full_like(outer_face_indices, target)], axis=1),
+        ], axis=0)
+        g = igraph.Graph(n=num_faces + 2)
+        g.add_edges(edges)
+        g.es['weight'] = np.concatenate([
+            dual_edges_weights,
+            np.full(inner_face_indices.shape[0], 1000.0),
+            np.full(outer_face_indices.shape[0], 1000.0),
+        ])
+        cut = g.mincut(source, target, 'weight')
+        partition = np.asarray(cut.partition[0], dtype=np.int64)
+        return partition[partition < num_faces]
+    elif backend == 'bk':
+        try:
+            import maxflow
+        except ImportError:
+            raise ImportError("The 'bk' mincut backend requires PyMaxflow, install it with `pip install PyMaxflow`")
+        g = maxflow.Graph[float](num_faces, dual_edges.shape[0])
+        nodes = g.add_nodes(num_faces)
+        g.add_edges(dual_edges[:, 0], dual_edges[:, 1], dual_edges_weights, dual_edges_weights)
+        source_caps = np.zeros(num_faces)
+        sink_caps = np.zeros(num_faces)
+        source_caps[inner_face_indices] = 1000.0
+        sink_caps[outer_face_indices] = 1000.0
+        g.add_grid_tedges(nodes, source_caps, sink_caps)
+        g.maxflow()
+        return np.nonzero(~g.get_grid_segments(nodes))[0]
+    else:
+        raise ValueError(f'Unknown mincut backend: {backend}')
+
+
 @torch.no_grad()
 def _fill_holes(
     verts,
@@ -26,6 +99,10 @@ def _fill_holes(
     max_hole_nbe=32,
     resolution=128,
     num_views=500,
+    visibility_backend='auto',
+    adaptive=False,
+    mincut_backend='igraph',
+    metrics=None,
     debug=False,
     verbose=False
 ):
@@ -41,53 +118,46 @@ def _fill_holes(
         max_hole_size (float): Maximum area of a hole to fill.
         resolution (int): Resolution of the rasterization.
         num_views (int): Number of views to rasterize the mesh.
+        visibility_backend (str): Backend computing face visibility, 'cuda', 'cpu' or 'auto'.
+        adaptive (bool): Whether to add views in rounds until the visibility estimate converges,
+            instead of always rasterizing `num_views` views at `resolution`.
+        mincut_backend (str): Max-flow solver for the mincut, 'igraph' or 'bk'.
+        metrics (dict): If given, visibility statistics are recorded into it.
         verbose (bool): Whether to print progress.
     """
+    device = verts.device
+
     # Construct cameras
-    yaws = []
-    pitchs = []
-    for i in range(num_views):
-        y, p = sphere_hammersley_sequence(i, num_views)
-        yaws.append(y)
-        pitchs.append(p)
-    yaws = torch.tensor(yaws).cuda()
-    pitchs = torch.tensor(pitchs).cuda()
-    radius = 2.0
-    fov = torch.deg2rad(torch.tensor(40)).cuda()
+    views = hammersley_rig(num_views, radius=2.0, fov=40, device=device).views
+    fov = torch.deg2rad(torch.tensor(40)).to(device)
     projection = utils3d.torch.perspective_from_fov_xy(fov, fov, 1, 3)
-    views = []
-    for (yaw, pitch) in zip(yaws, pitchs):
-        orig = torch.tensor([
-            torch.sin(yaw) * torch.cos(pitch),
-            torch.cos(yaw) * torch.cos(pitch),
-            torch.sin(pitch),
-        ]).cuda().float() * radius
-        view = utils3d.torch.view_look_at(orig, torch.tensor([0, 0, 0]).float().cuda(), torch.tensor([0, 0, 1]).float().cuda())
-        views.append(view)
-    views = torch.stack(views, dim=0)
 
     # Rasterize
-    visblity = torch.zeros(faces.shape[0], dtype=torch.int32, device=verts.device)
-    rastctx = utils3d.torch.RastContext(backend='cuda')
-    for i in tqdm(range(views.shape[0]), total=views.shape[0], disable=not verbose, desc='Rasterizing'):
-        view = views[i]
-        buffers = utils3d.torch.rasterize_triangle_faces(
-            rastctx, verts[None], faces, resolution, resolution, view=view, projection=projection
+    if adaptive:
+        order = progressive_view_order(num_views).to(device)
+        visblity, visibility_stats = compute_face_visibility_adaptive(
+            verts, faces, views[order], projection, resolution,
+            backend=visibility_backend, verbose=verbose,
+        )
+    else:
+        start = time.time()
+        visblity = compute_face_visibility(
+            verts, faces, views, projection, resolution,
+            backend=visibility_backend, verbose=verbose,
         )
-        face_id = buffers['face_id'][0][buffers['mask'][0] > 0.95] - 1
-        face_id = torch.unique(face_id).long()
-        visblity[face_id] += 1
-    visblity = visblity.float() / num_views
+        visblity = visblity.float() / num_views
+        visibility_stats = {'num_views': num_views, 'max_views': num_views, 'time': time.time() - start, 'time_saved': 0.0}
+    if metrics is not None:
+        metrics.update({f'fill_holes_{k}': v for k, v in visibility_stats.items()})
     
     # Mincut
     ## construct outer faces
     edges, face2edge, edge_degrees = utils3d.torch.compute_edges(faces)
     boundary_edge_indices = torch.nonzero(edge_degrees == 1).reshape(-1)
     connected_components = utils3d.torch.compute_connected_components(faces, edges, face2edge)
-    outer_face_indices = torch.zeros(faces.shape[0], dtype=torch.bool, device=faces.device)
-    for i in range(len(connected_components)):
-        outer_face_indices[connected_components[i]] = visblity[connected_components[i]] > min(max(visblity[connected_components[i]].quantile(0.75).item(), 0.25), 0.5)
-    outer_face_indices = outer_face_indices.nonzero().reshape(-1)
+    face_cc = groups_to_segment_ids(connected_components, faces.shape[0])
+    cc_threshold = segment_quantile(visblity, face_cc, len(connected_components), 0.75).clamp(0.25, 0.5)
+    outer_face_indices = torch.nonzero(visblity > cc_threshold[face_cc]).reshape(-1)
     
     ## construct inner faces
     inner_face_indices = torch.nonzero(visblity == 0).reshape(-1)
@@ -104,61 +174,50 @@ def _fill_holes(
         tqdm.write(f'Dual graph: {dual_edges.shape[0]} edges')
 
     ## solve mincut problem
-    ### construct main graph
-    g = igraph.Graph()
-    g.add_vertices(faces.shape[0])
-    g.add_edges(dual_edges.cpu().numpy())
-    g.es['weight'] = dual_edges_weights.cpu().numpy()
-    
-    ### source and target
-    g.add_vertex('s')
-    g.add_vertex('t')
-    
-    ### connect invisible faces to source
-    g.add_edges([(f, 's') for f in inner_face_indices], attributes={'weight': torch.ones(inner_face_indices.shape[0], dtype=torch.float32).cpu().numpy()})
-    
-    ### connect outer faces to target
-    g.add_edges([(f, 't') for f in outer_face_indices], attributes={'weight': torch.ones(outer_face_indices.shape[0], dtype=torch.float32).cpu().numpy()})
-                
-    ### solve mincut
-    cut = g.mincut('s', 't', (np.array(g.es['weight']) * 1000).tolist())
-    remove_face_indices = torch.tensor([v for v in cut.partition[0] if v < faces.shape[0]], dtype=torch.long, device=faces.device)
+    remove_face_indices = _solve_mincut(
+        faces.shape[0], dual_edges, dual_edges_weights, inner_face_indices, outer_face_indices, backend=mincut_backend
+    )
+    remove_face_indices = torch.from_numpy(remove_face_indices).to(device)
     if verbose:
         tqdm.write(f'Mincut solved, start checking the cut')
     
     ### check if the cut is valid with each connected component
     to_remove_cc = utils3d.torch.compute_connected_components(faces[remove_face_indices])
+    num_remove_cc = len(to_remove_cc)
     if debug:
-        tqdm.write(f'Number of connected components of the cut: {len(to_remove_cc)}')
-    valid_remove_cc = []
-    cutting_edges = []
-    for cc in to_remove_cc:
-        #### check if the connected component has low visibility
-        visblity_median = visblity[remove_face_indices[cc]].median()
+        tqdm.write(f'Number of connected components of the cut: {num_remove_cc}')
+    remove_cc = groups_to_segment_ids(to_remove_cc, remove_face_indices.shape[0]).to(device)
+    
+    #### check if the connected component has low visibility
+    visblity_median = segment_median(visblity[remove_face_indices], remove_cc, num_remove_cc)
+    if debug:
+        tqdm.write(f'visblity_median: {visblity_median}')
+    valid_cc = visblity_median <= 0.25
+    
+    #### check if the cuting loop is small enough
+    cc_of_edge, cc_edge_indices, cc_edges_degree = segment_unique(
+        face2edge[remove_face_indices].reshape(-1), remove_cc.repeat_interleave(3)
+    )
+    cc_new_boundary = (cc_edges_degree == 1) & ~torch.isin(cc_edge_indices, boundary_edge_indices)
+    cc_of_edge, cc_new_boundary_edge_indices = cc_of_edge[cc_new_boundary], cc_edge_indices[cc_new_boundary]
+    cutting_edges = cc_new_boundary_edge_indices[valid_cc[cc_of_edge]]
+    if cc_new_boundary_edge_indices.shape[0] > 0:
+        cc_new_boundary_edges = edges[cc_new_boundary_edge_indices].long()
+        ##### give every component its own copy of the vertices so that loops of different components are never merged
+        _, local_edges = torch.unique(cc_of_edge[:, None] * verts.shape[0] + cc_new_boundary_edges, return_inverse=True)
+        loops = utils3d.torch.compute_edge_connected_components(local_edges)
+        edge_loop = groups_to_segment_ids(loops, local_edges.shape[0]).to(device)
+        loop_cc = torch.zeros(len(loops), dtype=torch.long, device=device)
+        loop_cc[edge_loop] = cc_of_edge
+        edge_v0, edge_v1 = verts[cc_new_boundary_edges[:, 0]], verts[cc_new_boundary_edges[:, 1]]
+        loop_center = segment_mean((edge_v0 + edge_v1) * 0.5, edge_loop, len(loops))
+        _e1 = edge_v0 - loop_center[edge_loop]
+        _e2 = edge_v1 - loop_center[edge_loop]
+        loop_area = segment_sum(torch.norm(torch.cross(_e1, _e2, dim=-1), dim=1), edge_loop, len(loops)) * 0.5
         if debug:
-            tqdm.write(f'visblity_median: {visblity_median}')
-        if visblity_median > 0.25:
-            continue
-        
-        #### check if the cuting loop is small enough
-        cc_edge_indices, cc_edges_degree = torch.unique(face2edge[remove_face_indices[cc]], return_counts=True)
-        cc_boundary_edge_indices = cc_edge_indices[cc_edges_degree == 1]
-        cc_new_boundary_edge_indices = cc_boundary_edge_indices[~torch.isin(cc_boundary_edge_indices, boundary_edge_indices)]
-        if len(cc_new_boundary_edge_indices) > 0:
-            cc_new_boundary_edge_cc = utils3d.torch.compute_edge_connected_components(edges[cc_new_boundary_edge_indices])
-            cc_new_boundary_edges_cc_center = [verts[edges[cc_new_boundary_edge_indices[edge_cc]]].mean(dim=1).mean(dim=0) for edge_cc in cc_new_boundary_edge_cc]
-            cc_new_boundary_edges_cc_area = []
-            for i, edge_cc in enumerate(cc_new_boundary_edge_cc):
-                _e1 = verts[edges[cc_new_boundary_edge_indices[edge_cc]][:, 0]] - cc_new_boundary_edges_cc_center[i]
-                _e2 = verts[edges[cc_new_boundary_edge_indices[edge_cc]][:, 1]] - cc_new_boundary_edges_cc_center[i]
-                cc_new_boundary_edges_cc_area.append(torch.norm(torch.cross(_e1, _e2, dim=-1), dim=1).sum() * 0.5)
-            if debug:
-                cutting_edges.append(cc_new_boundary_edge_indices)
-                tqdm.write(f'Area of the cutting loop: {cc_new_boundary_edges_cc_area}')
-            if any([l > max_hole_size for l in cc_new_boundary_edges_cc_area]):
-                continue
-            
-        valid_remove_cc.append(cc)
+            tqdm.write(f'Area of the cutting loop: {loop_area[valid_cc[loop_cc]]}')
+        valid_cc &= segment_sum((loop_area > max_hole_size).int(), loop_cc, num_remove_cc) == 0
+    valid_remove_face = valid_cc[remove_cc]
         
     if debug:
         face_v = verts[faces].mean(dim=1).cpu().numpy()
@@ -167,17 +226,16 @@ def _fill_holes(
         vis_colors[inner_face_indices.cpu().numpy()] = [0, 0, 255]
         vis_colors[outer_face_indices.cpu().numpy()] = [0, 255, 0]
         vis_colors[remove_face_indices.cpu().numpy()] = [255, 0, 255]
-        if len(valid_remove_cc) > 0:
-            vis_colors[remove_face_indices[torch.cat(valid_remove_cc)].cpu().numpy()] = [255, 0, 0]
+        vis_colors[remove_face_indices[valid_remove_face].cpu().numpy()] = [255, 0, 0]
         utils3d.io.write_ply('dbg_dual.ply', face_v, edges=vis_dual_edges, vertex_colors=vis_colors)
         
         vis_verts = verts.cpu().numpy()
-        vis_edges = edges[torch.cat(cutting_edges)].cpu().numpy()
+        vis_edges = edges[cutting_edges].cpu().numpy()
         utils3d.io.write_ply('dbg_cut.ply', vis_verts, edges=vis_edges)
         
     
-    if len(valid_remove_cc) > 0:
-        remove_face_indices = remove_face_indices[torch.cat(valid_remove_cc)]
+    if valid_remove_face.any():
+        remove_face_indices = remove_face_indices[valid_remove_face]
         mask = torch.ones(faces.shape[0], dtype=torch.bool, device=faces.device)
         mask[remove_face_indices] = 0
         faces = faces[mask]
@@ -192,11 +250,20 @@ def _fill_holes(
     mesh.load_array(verts.cpu().numpy(), faces.cpu().numpy())
     mesh.fill_small_boundaries(nbe=max_hole_nbe, refine=True)
     verts, faces = mesh.return_arrays()
-    verts, faces = torch.tensor(verts, device='cuda', dtype=torch.float32), torch.tensor(faces, device='cuda', dtype=torch.int32)
+    verts, faces = torch.tensor(verts, device=device, dtype=torch.float32), torch.tensor(faces, device=device, dtype=torch.int32)
 
     return verts, faces
 
 
+def _decimate(vertices: np.array, faces: np.array, ratio: float, verbose: bool = False) -> Tuple[np.array, np.array]:
+    """
+    Remove a ratio of the faces of a mesh with quadric edge collapse.
+    """
+    mesh = pv.PolyData(vertices, np.concatenate([np.full((faces.shape[0], 1), 3), faces], axis=1))
+    mesh = mesh.decimate(ratio, progress_bar=verbose)
+    return mesh.points, mesh.faces.reshape(-1, 4)[:, 1:]
+
+
 def postprocess_mesh(
     vertices: np.array,
     faces: np.array,
@@ -207,6 +274,10 @@ def postprocess_mesh(
     fill_holes_max_hole_nbe: int = 32,
     fill_holes_resolution: int = 1024,
     fill_holes_num_views: int = 1000,
+    fill_holes_visibility_backend: Literal['auto', 'cuda', 'cpu'] = 'auto',
+    fill_holes_adaptive: bool = False,
+    fill_holes_mincut_backend: Literal['igraph', 'bk'] = 'igraph',
+    metrics: Optional[dict] = None,
     debug: bool = False,
     verbose: bool = False,
 ):
@@ -223,6 +294,12 @@ def postprocess_mesh(
         fill_holes_max_hole_nbe (int): Maximum number of boundary edges of a hole to fill.
         fill_holes_resolution (int): Resolution of the rasterization.
         fill_holes_num_views (int): Number of views to rasterize the mesh.
+        fill_holes_visibility_backend (str): Backend computing face visibility, 'cuda', 'cpu' or 'auto'.
+            The 'cpu' backend runs the whole hole filling on the CPU.
+        fill_holes_adaptive (bool): Whether to add views in rounds until the visibility estimate converges.
+            `fill_holes_num_views` and `fill_holes_resolution` become upper bounds.
+        fill_holes_mincut_backend (str): Max-flow solver used to cut inner faces, 'igraph' or 'bk' (requires PyMaxflow).
+        metrics (dict): If given, post-processing statistics are recorded into it.
         verbose (bool): Whether to print progress.
     """
 
@@ -231,21 +308,25 @@ def postprocess_mesh(
 
     # Simplify
     if simplify and simplify_ratio > 0:
-        mesh = pv.PolyData(vertices, np.concatenate([np.full((faces.shape[0], 1), 3), faces], axis=1))
-        mesh = mesh.decimate(simplify_ratio, progress_bar=verbose)
-        vertices, faces = mesh.points, mesh.faces.reshape(-1, 4)[:, 1:]
+        vertices, faces = _decimate(vertices, faces, simplify_ratio, verbose=verbose)
         if verbose:
             tqdm.write(f'After decimate: {vertices.shape[0]} vertices, {faces.shape[0]} faces')
 
     # Remove invisible faces
     if fill_holes:
-        vertices, faces = torch.tensor(vertices).cuda(), torch.tensor(faces.astype(np.int32)).cuda()
+        backend = resolve_visibility_backend(fill_holes_visibility_backend)
+        device = 'cuda' if backend == 'cuda' else 'cpu'
+        vertices, faces = torch.tensor(vertices).to(device), torch.tensor(faces.astype(np.int32)).to(device)
         vertices, faces = _fill_holes(
             vertices, faces,
             max_hole_size=fill_holes_max_hole_size,
             max_hole_nbe=fill_holes_max_hole_nbe,
             resolution=fill_holes_resolution,
             num_views=fill_holes_num_views,
+            visibility_backend=backend,
+            adaptive=fill_holes_adaptive,
+            mincut_backend=fill_holes_mincut_backend,
+            metrics=metrics,
             debug=debug,
             verbose=verbose,
         )
@@ -256,16 +337,33 @@ def postprocess_mesh(
     return vertices, faces
 
 
-def parametrize_mesh(vertices: np.array, faces: np.array):
+def parametrize_mesh(
+    vertices: np.array,
+    faces: np.array,
+    num_workers: int = 1,
+    texture_size: int = 1024,
+    cache: bool = True,
+    cache_dir: Optional[str] = None,
+):
     """
     Parametrize a mesh to a texture space, using xatlas.
 
+    With several workers, groups of connected components are parametrized in parallel worker
+    processes and packed into one atlas. Results are cached by mesh hash (see
+    `uv_utils.parametrize_mesh_cached`).
+
     Args:
         vertices (np.array): Vertices of the mesh. Shape (V, 3).
         faces (np.array): Faces of the mesh. Shape (F, 3).
+        num_workers (int): Number of worker processes. 1, the default, runs a single xatlas call.
+        texture_size (int): Size of the texture, sets the gutters between charts of the parallel path.
+        cache (bool): Whether to reuse the result of a previous call on the same mesh.
+        cache_dir (str): Directory of the on-disk UV cache, in addition to the in-memory one.
     """
 
-    vmapping, indices, uvs = xatlas.parametrize(vertices, faces)
+    vmapping, indices, uvs = parametrize_mesh_cached(
+        vertices, faces, num_workers=num_workers, texture_size=texture_size, cache=cache, cache_dir=cache_dir
+    )
 
     vertices = vertices[vmapping]
     faces = indices
@@ -273,19 +371,50 @@ def parametrize_mesh(vertices: np.array, faces: np.array):
     return vertices, faces, uvs
 
 
+def _splat_texture(
+    texture: torch.Tensor,
+    texture_weights: torch.Tensor,
+    uv: torch.Tensor,
+    colors: torch.Tensor,
+    texture_size: int,
+):
+    """
+    Accumulate colors into the texel nearest to their UV coordinates.
+
+    Args:
+        texture (torch.Tensor): Accumulated colors, updated in place. Shape (T * T, 3), row 0 at v = 1.
+        texture_weights (torch.Tensor): Accumulated weights, updated in place. Shape (T * T,).
+        uv (torch.Tensor): UV coordinates of the samples. Shape (N, 2).
+        colors (torch.Tensor): Colors of the samples. Shape (N, 3).
+        texture_size (int): Size of the texture.
+    """
+    uv = (uv * texture_size).floor().long().clamp(0, texture_size - 1)
+    idx = uv[:, 0] + (texture_size - uv[:, 1] - 1) * texture_size
+    texture.index_add_(0, idx, colors)
+    texture_weights.index_add_(0, idx, torch.ones_like(idx, dtype=texture_weights.dtype))
+
+
 def bake_texture(
     vertices: np.array,
     faces: np.array,
     uvs: np.array,
-    observations: List[np.array],
-    masks: List[np.array],
-    extrinsics: List[np.array],
-    intrinsics: List[np.array],
+    observations: Union[List[np.array], torch.Tensor],
+    masks: Union[List[np.array], torch.Tensor],
+    extrinsics: Union[List[np.array], torch.Tensor],
+    intrinsics: Union[List[np.array], torch.Tensor],
     texture_size: int = 2048,
     near: float = 0.1,
     far: float = 10.0,
     mode: Literal['fast', 'opt'] = 'opt',
     lambda_tv: float = 1e-2,
+    warm_start: bool = True,
+    total_steps: int = 2500,
+    views_per_step: int = 4,
+    plateau_tol: float = 1e-3,
+    plateau_patience: int = 3,
+    check_interval: int = 50,
+    inpaint: Literal['pull_push', 'telea'] = 'pull_push',
+    metrics: Optional[dict] = None,
     verbose: bool = False,
 ):
     """
@@ -295,44 +424,56 @@ def bake_texture(
         vertices (np.array): Vertices of the mesh. Shape (V, 3).
         faces (np.array): Faces of the mesh. Shape (F, 3).
         uvs (np.array): UV coordinates of the mesh. Shape (V, 2).
-        observations (List[np.array]): List of observations. Each observation is a 2D image. Shape (H, W, 3).
-        masks (List[np.array]): List of masks. Each mask is a 2D image. Shape (H, W).
-        extrinsics (List[np.array]): List of extrinsics. Shape (4, 4).
-        intrinsics (List[np.array]): List of intrinsics. Shape (3, 3).
+        observations (Union[List[np.array], torch.Tensor]): List of uint8 observations, each a 2D image of shape (H, W, 3),
+            or a float tensor in [0, 1] of shape (N, H, W, 3), which may be fp16 and stays on the device.
+        masks (Union[List[np.array], torch.Tensor]): List of masks. Each mask is a 2D image. Shape (H, W) or (N, H, W).
+        extrinsics (Union[List[np.array], torch.Tensor]): List of extrinsics. Shape (4, 4) or (N, 4, 4).
+        intrinsics (Union[List[np.array], torch.Tensor]): List of intrinsics. Shape (3, 3) or (N, 3, 3).
         texture_size (int): Size of the texture.
         near (float): Near plane of the camera.
         far (float): Far plane of the camera.
         mode (Literal['fast', 'opt']): Mode of texture baking.
         lambda_tv (float): Weight of total variation loss in optimization.
+        warm_start (bool): Whether to initialize the optimization from the 'fast' result.
+        total_steps (int): Maximum number of optimization steps.
+        views_per_step (int): Number of views rendered together in each optimization step.
+        plateau_tol (float): Optimization stops when the smoothed loss improves by less than this
+            relative amount over `plateau_patience` consecutive checks.
+        plateau_patience (int): Number of checks without improvement before stopping.
+        check_interval (int): Number of steps between two loss checks, the only points where the loss is read back.
+        inpaint (Literal['pull_push', 'telea']): Method filling the texels not covered by any observation or UV chart.
+        metrics (dict): If given, statistics of the baking are recorded into it.
         verbose (bool): Whether to print progress.
     """
     vertices = torch.tensor(vertices).cuda()
     faces = torch.tensor(faces.astype(np.int32)).cuda()
     uvs = torch.tensor(uvs).cuda()
-    observations = [torch.tensor(obs / 255.0).float().cuda() for obs in observations]
-    masks = [torch.tensor(m>0).bool().cuda() for m in masks]
-    views = [utils3d.torch.extrinsics_to_view(torch.tensor(extr).cuda()) for extr in extrinsics]
-    projections = [utils3d.torch.intrinsics_to_perspective(torch.tensor(intr).cuda(), near, far) for intr in intrinsics]
+    if isinstance(observations, torch.Tensor):
+        observations = list(observations.cuda().unbind(0))
+    else:
+        observations = [torch.tensor(obs / 255.0).float().cuda() for obs in observations]
+    if isinstance(masks, torch.Tensor):
+        masks = list(masks.cuda().bool().unbind(0))
+    else:
+        masks = [torch.tensor(m>0).bool().cuda() for m in masks]
+    views = [utils3d.torch.extrinsics_to_view(torch.as_tensor(extr).cuda()) for extr in extrinsics]
+    projections = [utils3d.torch.intrinsics_to_perspective(torch.as_tensor(intr).cuda(), near, far) for intr in intrinsics]
+    start_time = time.time()
 
     if mode == 'fast':
         texture = torch.zeros((texture_size * texture_size, 3), dtype=torch.float32).cuda()
         texture_weights = torch.zeros((texture_size * texture_size), dtype=torch.float32).cuda()
         rastctx = utils3d.torch.RastContext(backend='cuda')
-        for observation, view, projection in tqdm(zip(observations, views, projections), total=len(observations), disable=not verbose, desc='Texture baking (fast)'):
+        for observation, obs_mask, view, projection in tqdm(zip(observations, masks, views, projections), total=len(observations), disable=not verbose, desc='Texture baking (fast)'):
             with torch.no_grad():
                 rast = utils3d.torch.rasterize_triangle_faces(
                     rastctx, vertices[None], faces, observation.shape[1], observation.shape[0], uv=uvs[None], view=view, projection=projection
                 )
                 uv_map = rast['uv'][0].detach().flip(0)
-                mask = rast['mask'][0].detach().bool() & masks[0]
+                mask = rast['mask'][0].detach().bool().flip(0) & obs_mask
             
             # nearest neighbor interpolation
-            uv_map = (uv_map * texture_size).floor().long()
-            obs = observation[mask]
-            uv_map = uv_map[mask]
-            idx = uv_map[:, 0] + (texture_size - uv_map[:, 1] - 1) * texture_size
-            texture = texture.scatter_add(0, idx.view(-1, 1).expand(-1, 3), obs)
-            texture_weights = texture_weights.scatter_add(0, idx, torch.ones((obs.shape[0]), dtype=torch.float32, device=texture.device))
+            _splat_texture(texture, texture_weights, uv_map[mask], observation[mask].float(), texture_size)
 
         mask = texture_weights > 0
         texture[mask] /= texture_weights[mask][:, None]
@@ -340,23 +481,38 @@ def bake_texture(
 
         # inpaint
         mask = (texture_weights == 0).cpu().numpy().astype(np.uint8).reshape(texture_size, texture_size)
-        texture = cv2.inpaint(texture, mask, 3, cv2.INPAINT_TELEA)
+        texture = inpaint_texture(texture, mask, method=inpaint, device=vertices.device)
+        num_steps = 0
 
     elif mode == 'opt':
         rastctx = utils3d.torch.RastContext(backend='cuda')
-        observations = [observations.flip(0) for observations in observations]
-        masks = [m.flip(0) for m in masks]
+        observations = torch.stack([observation.flip(0) for observation in observations])
+        masks = torch.stack([m.flip(0) for m in masks])
         _uv = []
         _uv_dr = []
-        for observation, view, projection in tqdm(zip(observations, views, projections), total=len(views), disable=not verbose, desc='Texture baking (opt): UV'):
+        if warm_start:
+            init_texture = torch.zeros((texture_size * texture_size, 3), dtype=torch.float32).cuda()
+            init_weights = torch.zeros((texture_size * texture_size), dtype=torch.float32).cuda()
+        for observation, obs_mask, view, projection in tqdm(zip(observations, masks, views, projections), total=len(views), disable=not verbose, desc='Texture baking (opt): UV'):
             with torch.no_grad():
                 rast = utils3d.torch.rasterize_triangle_faces(
                     rastctx, vertices[None], faces, observation.shape[1], observation.shape[0], uv=uvs[None], view=view, projection=projection
                 )
                 _uv.append(rast['uv'].detach())
                 _uv_dr.append(rast['uv_dr'].detach())
+                if warm_start:
+                    mask = rast['mask'][0].detach().bool() & obs_mask
+                    _splat_texture(init_texture, init_weights, rast['uv'][0][mask], observation[mask].float(), texture_size)
+        _uv = torch.cat(_uv)
+        _uv_dr = torch.cat(_uv_dr)
 
-        texture = torch.nn.Parameter(torch.zeros((1, texture_size, texture_size, 3), dtype=torch.float32).cuda())
+        if warm_start:
+            # average of the observations, flipped to the row order of dr.texture (row 0 at v = 0)
+            init_texture = init_texture / init_weights.clamp_min(1)[:, None]
+            init_texture = init_texture.reshape(1, texture_size, texture_size, 3).flip(1)
+        else:
+            init_texture = torch.zeros((1, texture_size, texture_size, 3), dtype=torch.float32).cuda()
+        texture = torch.nn.Parameter(init_texture.contiguous())
         optimizer = torch.optim.Adam([texture], betas=(0.5, 0.9), lr=1e-2)
 
         def exp_anealing(optimizer, step, total_steps, start_lr, end_lr):
@@ -369,58 +525,321 @@ def bake_texture(
             return torch.nn.functional.l1_loss(texture[:, :-1, :, :], texture[:, 1:, :, :]) + \
                    torch.nn.functional.l1_loss(texture[:, :, :-1, :], texture[:, :, 1:, :])
     
-        total_steps = 2500
+        num_views = len(views)
+        views_per_step = min(views_per_step, num_views)
+        # the smoothed loss stays on the device and is only read back every check_interval steps
+        loss_ema = None
+        best_loss = float('inf')
+        num_stalled = 0
+        num_steps = 0
         with tqdm(total=total_steps, disable=not verbose, desc='Texture baking (opt): optimizing') as pbar:
             for step in range(total_steps):
                 optimizer.zero_grad()
-                selected = np.random.randint(0, len(views))
+                selected = torch.randperm(num_views, device=_uv.device)[:views_per_step]
                 uv, uv_dr, observation, mask = _uv[selected], _uv_dr[selected], observations[selected], masks[selected]
-                render = dr.texture(texture, uv, uv_dr)[0]
-                loss = torch.nn.functional.l1_loss(render[mask], observation[mask])
+                render = dr.texture(texture, uv, uv_dr)
+                loss = torch.nn.functional.l1_loss(render[mask], observation[mask].float())
                 if lambda_tv > 0:
                     loss += lambda_tv * tv_loss(texture)
                 loss.backward()
                 optimizer.step()
                 # annealing
                 optimizer.param_groups[0]['lr'] = cosine_anealing(optimizer, step, total_steps, 1e-2, 1e-5)
-                pbar.set_postfix({'loss': loss.item()})
+                loss_ema = loss.detach() if loss_ema is None else 0.9 * loss_ema + 0.1 * loss.detach()
+                num_steps = step + 1
                 pbar.update()
+                if num_steps % check_interval == 0:
+                    current_loss = loss_ema.item()
+                    pbar.set_postfix({'loss': current_loss})
+                    if current_loss < best_loss * (1 - plateau_tol):
+                        best_loss = current_loss
+                        num_stalled = 0
+                    else:
+                        num_stalled += 1
+                        if num_stalled >= plateau_patience:
+                            break
         texture = np.clip(texture[0].flip(0).detach().cpu().numpy() * 255, 0, 255).astype(np.uint8)
         mask = 1 - utils3d.torch.rasterize_triangle_faces(
             rastctx, (uvs * 2 - 1)[None], faces, texture_size, texture_size
         )['mask'][0].detach().cpu().numpy().astype(np.uint8)
-        texture = cv2.inpaint(texture, mask, 3, cv2.INPAINT_TELEA)
+        texture = inpaint_texture(texture, mask, method=inpaint, device=vertices.device)
     else:
         raise ValueError(f'Unknown mode: {mode}')
 
+    if metrics is not None:
+        metrics.update({
+            'bake_mode': mode,
+            'bake_steps': num_steps,
+            'bake_time': time.time() - start_time,
+        })
     return texture
 
 
+def _closest_surface_points(
+    points: np.ndarray,
+    src_vertices: np.ndarray,
+    src_faces: np.ndarray,
+    k: int = 8,
+    chunk_size: int = 1 << 16,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Find the closest point on the surface of a mesh to each query point.
+
+    The closest point is searched among the `k` triangles with the nearest centroids.
+
+    Returns:
+        (np.ndarray): Face of the closest point. Shape (N,).
+        (np.ndarray): Barycentric coordinates of the closest point in its face. Shape (N, 3).
+    """
+    from scipy.spatial import cKDTree
+    triangles = src_vertices[src_faces]
+    tree = cKDTree(triangles.mean(axis=1))
+    k = min(k, src_faces.shape[0])
+    faces = np.zeros(points.shape[0], dtype=np.int64)
+    barys = np.zeros((points.shape[0], 3), dtype=np.float32)
+    for start in range(0, points.shape[0], chunk_size):
+        p = points[start:start + chunk_size]
+        _, candidates = tree.query(p, k=k)
+        candidates = candidates.reshape(p.shape[0], k)
+        p_rep = np.repeat(p, k, axis=0)
+        closest = trimesh.triangles.closest_point(triangles[candidates.reshape(-1)], p_rep)
+        dist = np.linalg.norm(closest - p_rep, axis=-1).reshape(p.shape[0], k)
+        best = np.argmin(dist, axis=1)
+        face = candidates[np.arange(p.shape[0]), best]
+        closest = closest.reshape(p.shape[0], k, 3)[np.arange(p.shape[0]), best]
+        bary = trimesh.triangles.points_to_barycentric(triangles[face], closest)
+        bary = np.clip(np.nan_to_num(bary, nan=1 / 3), 0, 1)
+        bary /= np.maximum(bary.sum(axis=1, keepdims=True), 1e-12)
+        faces[start:start + chunk_size] = face
+        barys[start:start + chunk_size] = bary
+    return faces, barys
+
+
+def _texel_positions(
+    vertices: np.array,
+    faces: np.array,
+    uvs: np.array,
+    texture_size: int,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Rasterize the UV charts of a mesh on CPU and compute the 3D position of every covered texel.
+
+    Returns:
+        (np.ndarray): Flat index of the covered texels, in a texture with row 0 at v = 0. Shape (N,).
+        (np.ndarray): 3D positions of the covered texels. Shape (N, 3).
+        (np.ndarray): uint8 mask of the uncovered texels, row 0 at v = 1. Shape (texture_size, texture_size).
+    """
+    uvs = torch.tensor(uvs, dtype=torch.float32)
+    pos_clip = torch.cat([uvs * 2 - 1, torch.zeros_like(uvs[:, :1]), torch.ones_like(uvs[:, :1])], dim=-1)
+    rast = rasterize_triangles(pos_clip[None], torch.tensor(faces.astype(np.int64)), texture_size, texture_size, return_barycentrics=True)
+    face_id = rast.face_id[0].reshape(-1)
+    covered = torch.nonzero(face_id >= 0).reshape(-1)
+    texel_faces = faces.astype(np.int64)[face_id[covered].numpy()]
+    bary = rast.bary[0].reshape(-1, 3)[covered].numpy()
+    points = (vertices[texel_faces] * bary[..., None]).sum(axis=1)
+    mask = np.ascontiguousarray((rast.face_id[0] < 0).numpy()[::-1]).astype(np.uint8)
+    return covered.numpy(), points, mask
+
+
+def _fill_texels(covered: np.ndarray, colors: np.ndarray, mask: np.ndarray, texture_size: int, inpaint: str) -> np.ndarray:
+    """
+    Write texel colors in [0, 1] to a uint8 texture with row 0 at v = 1, and inpaint the uncovered texels.
+    """
+    texture = np.zeros((texture_size * texture_size, 3), dtype=np.uint8)
+    texture[covered] = np.clip(colors * 255, 0, 255).round().astype(np.uint8)
+    texture = np.ascontiguousarray(texture.reshape(texture_size, texture_size, 3)[::-1])
+    return inpaint_texture(texture, mask, method=inpaint)
+
+
+def bake_vertex_colors(
+    vertices: np.array,
+    faces: np.array,
+    uvs: np.array,
+    src_vertices: np.array,
+    src_faces: np.array,
+    src_colors: np.array,
+    texture_size: int = 1024,
+    inpaint: Literal['pull_push', 'telea'] = 'pull_push',
+    verbose: bool = False,
+) -> np.array:
+    """
+    Bake the vertex colors of a source mesh to the texture of a parametrized mesh, on CPU.
+
+    Every texel covered by a UV chart is mapped to its 3D position on the parametrized mesh,
+    which takes the color of the closest point on the source surface. Uncovered texels are inpainted.
+
+    Args:
+        vertices (np.array): Vertices of the mesh. Shape (V, 3).
+        faces (np.array): Faces of the mesh. Shape (F, 3).
+        uvs (np.array): UV coordinates of the mesh. Shape (V, 2).
+        src_vertices (np.array): Vertices of the source mesh, in the same space. Shape (V', 3).
+        src_faces (np.array): Faces of the source mesh. Shape (F', 3).
+        src_colors (np.array): Vertex colors of the source mesh in [0, 1]. Shape (V', 3).
+        texture_size (int): Size of the texture.
+        inpaint (Literal['pull_push', 'telea']): Method filling the texels outside UV charts.
+        verbose (bool): Whether to print progress.
+
+    Returns:
+        (np.array): uint8 texture, row 0 at v = 1. Shape (texture_size, texture_size, 3).
+    """
+    covered, points, mask = _texel_positions(vertices, faces, uvs, texture_size)
+    if verbose:
+        tqdm.write(f'Vertex color bake: {points.shape[0]} texels covered by UV charts')
+    src_faces = src_faces.astype(np.int64)
+    face, bary = _closest_surface_points(points, src_vertices, src_faces)
+    colors = (src_colors.astype(np.float32)[src_faces[face]] * bary[..., None]).sum(axis=1)
+    return _fill_texels(covered, colors, mask, texture_size, inpaint)
+
+
+def texture_mip_chain(texture: np.array, min_size: int = 1) -> List[torch.Tensor]:
+    """
+    Box-filtered mip chain of a texture.
+
+    Args:
+        texture (np.array): uint8 texture. Shape (H, W, C).
+        min_size (int): Size of the smallest level.
+
+    Returns:
+        (List[torch.Tensor]): Float levels in [0, 1], from full resolution down. Shape (1, C, H / 2^i, W / 2^i).
+    """
+    level = torch.from_numpy(np.ascontiguousarray(texture)).permute(2, 0, 1)[None].float() / 255
+    mips = [level]
+    while min(level.shape[-2:]) >= 2 * min_size:
+        level = torch.nn.functional.avg_pool2d(level, 2, ceil_mode=True)
+        mips.append(level)
+    return mips
+
+
+def transfer_texture(
+    vertices: np.array,
+    faces: np.array,
+    uvs: np.array,
+    src_vertices: np.array,
+    src_faces: np.array,
+    src_uvs: np.array,
+    src_mips: List[torch.Tensor],
+    texture_size: int,
+    inpaint: Literal['pull_push', 'telea'] = 'pull_push',
+) -> np.array:
+    """
+    Transfer the texture of a source mesh to another parametrization of the same surface, e.g. a lower level of detail.
+
+    Each covered texel samples the source texture bilinearly at the UV of the closest source surface point,
+    from the mip level matching the ratio of the texture sizes.
+
+    Args:
+        vertices (np.array): Vertices of the mesh. Shape (V, 3).
+        faces (np.array): Faces of the mesh. Shape (F, 3).
+        uvs (np.array): UV coordinates of the mesh. Shape (V, 2).
+        src_vertices (np.array): Vertices of the source mesh. Shape (V', 3).
+        src_faces (np.array): Faces of the source mesh. Shape (F', 3).
+        src_uvs (np.array): UV coordinates of the source mesh. Shape (V', 2).
+        src_mips (List[torch.Tensor]): Mip chain of the source texture, see `texture_mip_chain`.
+        texture_size (int): Size of the texture.
+        inpaint (Literal['pull_push', 'telea']): Method filling the texels outside UV charts.
+
+    Returns:
+        (np.array): uint8 texture, row 0 at v = 1. Shape (texture_size, texture_size, 3).
+    """
+    covered, points, mask = _texel_positions(vertices, faces, uvs, texture_size)
+    src_faces = src_faces.astype(np.int64)
+    face, bary = _closest_surface_points(points, src_vertices, src_faces)
+    src_uv = (src_uvs.astype(np.float32)[src_faces[face]] * bary[..., None]).sum(axis=1)
+    level = int(np.clip(np.round(np.log2(src_mips[0].shape[-1] / texture_size)), 0, len(src_mips) - 1))
+    # texture rows run from v = 1 down to v = 0
+    grid = torch.from_numpy(np.stack([src_uv[:, 0] * 2 - 1, 1 - src_uv[:, 1] * 2], axis=-1)).float()
+    colors = torch.nn.functional.grid_sample(src_mips[level], grid[None, None], mode='bilinear', padding_mode='border', align_corners=False)
+    return _fill_texels(covered, colors[0, :, 0].T.numpy(), mask, texture_size, inpaint)
+
+
+def _textured_trimesh(vertices: np.array, faces: np.array, uvs: np.array, texture: np.array) -> trimesh.Trimesh:
+    """
+    Build the z-up textured mesh of a glb, rotated to y-up.
+    """
+    vertices = vertices @ np.array([[1, 0, 0], [0, 0, -1], [0, 1, 0]])
+    material = trimesh.visual.material.PBRMaterial(
+        roughnessFactor=1.0,
+        baseColorTexture=Image.fromarray(texture),
+        baseColorFactor=np.array([255, 255, 255, 255], dtype=np.uint8)
+    )
+    return trimesh.Trimesh(vertices, faces, visual=trimesh.visual.TextureVisuals(uv=uvs, material=material))
+
+
+def export_lods(meshes: List[trimesh.Trimesh], path: str, separate: bool = False) -> List[str]:
+    """
+    Export levels of detail returned by `to_glb(lod_face_counts=...)`.
+
+    Args:
+        meshes (List[trimesh.Trimesh]): Levels of detail, finest first.
+        path (str): Output path. With `separate`, level i is written to `<stem>_lod<i><ext>`.
+        separate (bool): Whether to write one file per level instead of one scene with nodes LOD0, LOD1, ...
+
+    Returns:
+        (List[str]): Written paths.
+    """
+    if separate:
+        stem, ext = os.path.splitext(path)
+        paths = [f'{stem}_lod{i}{ext}' for i in range(len(meshes))]
+        for mesh, lod_path in zip(meshes, paths):
+            mesh.export(lod_path)
+        return paths
+    scene = trimesh.Scene()
+    for i, mesh in enumerate(meshes):
+        scene.add_geometry(mesh, node_name=f'LOD{i}', geom_name=f'LOD{i}')
+    scene.export(path)
+    return [path]
+
+
 def to_glb(
-    app_rep: Union[Strivec, Gaussian],
+    app_rep: Optional[Union[Strivec, Gaussian]],
     mesh: MeshExtractResult,
     simplify: float = 0.95,
     fill_holes: bool = True,
     fill_holes_max_size: float = 0.04,
+    fill_holes_visibility_backend: Literal['auto', 'cuda', 'cpu'] = 'auto',
+    fill_holes_adaptive: bool = False,
+    fill_holes_mincut_backend: Literal['igraph', 'bk'] = 'igraph',
     texture_size: int = 1024,
+    bake_mode: Literal['opt', 'fast', 'vertex'] = 'opt',
+    lod_face_counts: Optional[List[int]] = None,
+    parametrize_workers: int = 1,
+    uv_cache_dir: Optional[str] = None,
+    metrics: Optional[dict] = None,
     debug: bool = False,
     verbose: bool = True,
-) -> trimesh.Trimesh:
+) -> Union[trimesh.Trimesh, List[trimesh.Trimesh]]:
     """
     Convert a generated asset to a glb file.
 
     Args:
-        app_rep (Union[Strivec, Gaussian]): Appearance representation.
+        app_rep (Union[Strivec, Gaussian]): Appearance representation. Not used with bake_mode='vertex'.
         mesh (MeshExtractResult): Extracted mesh.
         simplify (float): Ratio of faces to remove in simplification.
         fill_holes (bool): Whether to fill holes in the mesh.
         fill_holes_max_size (float): Maximum area of a hole to fill.
+        fill_holes_visibility_backend (str): Backend computing face visibility for hole filling, 'cuda', 'cpu' or 'auto'.
+        fill_holes_adaptive (bool): Whether to add hole filling views in rounds until the visibility estimate converges.
+        fill_holes_mincut_backend (str): Max-flow solver used by hole filling, 'igraph' or 'bk' (requires PyMaxflow).
         texture_size (int): Size of the texture.
+        bake_mode (str): 'opt' and 'fast' bake renders of `app_rep` (see `bake_texture`). 'vertex' transfers the
+            vertex colors decoded with the mesh (`mesh.vertex_attrs[:, :3]`) on CPU, without rendering.
+        lod_face_counts (List[int]): If given, decreasing face counts of levels of detail, and a list of meshes is
+            returned, finest first (see `export_lods`). The first level replaces `simplify`; each next level is
+            decimated from the previous one, and its texture is resampled from the mip chain of the first
+            level's bake, at half the size of the previous level's texture.
+        parametrize_workers (int): Number of processes parametrizing groups of connected components in parallel.
+            1, the default, runs a single xatlas call.
+        uv_cache_dir (str): Directory caching UV parametrizations by mesh hash, in addition to the in-memory cache.
+        metrics (dict): If given, statistics of the conversion are recorded into it.
         debug (bool): Whether to print debug information.
         verbose (bool): Whether to print progress.
     """
+    if bake_mode == 'vertex' and mesh.vertex_attrs is None:
+        raise ValueError("bake_mode='vertex' requires a mesh decoded with vertex colors")
     vertices = mesh.vertices.cpu().numpy()
     faces = mesh.faces.cpu().numpy()
+    if lod_face_counts:
+        simplify = max(1 - lod_face_counts[0] / faces.shape[0], 0.0)
     
     # mesh postprocess
     vertices, faces = postprocess_mesh(
@@ -432,36 +851,68 @@ def to_glb(
         fill_holes_max_hole_nbe=int(250 * np.sqrt(1-simplify)),
         fill_holes_resolution=1024,
         fill_holes_num_views=1000,
+        fill_holes_visibility_backend=fill_holes_visibility_backend,
+        fill_holes_adaptive=fill_holes_adaptive,
+        fill_holes_mincut_backend=fill_holes_mincut_backend,
+        metrics=metrics,
         debug=debug,
         verbose=verbose,
     )
 
     # parametrize mesh
-    vertices, faces, uvs = parametrize_mesh(vertices, faces)
+    lod_vertices, lod_faces = vertices, faces
+    start = time.time()
+    vertices, faces, uvs = parametrize_mesh(vertices, faces, num_workers=parametrize_workers, texture_size=texture_size, cache_dir=uv_cache_dir)
+    if metrics is not None:
+        metrics['parametrize_time'] = time.time() - start
 
     # bake texture
-    observations, extrinsics, intrinsics = render_multiview(app_rep, resolution=1024, nviews=100)
-    masks = [np.any(observation > 0, axis=-1) for observation in observations]
-    extrinsics = [extrinsics[i].cpu().numpy() for i in range(len(extrinsics))]
-    intrinsics = [intrinsics[i].cpu().numpy() for i in range(len(intrinsics))]
-    texture = bake_texture(
-        vertices, faces, uvs,
-        observations, masks, extrinsics, intrinsics,
-        texture_size=texture_size, mode='opt',
-        lambda_tv=0.01,
-        verbose=verbose
-    )
-    texture = Image.fromarray(texture)
+    if bake_mode == 'vertex':
+        start = time.time()
+        texture = bake_vertex_colors(
+            vertices, faces, uvs,
+            mesh.vertices.cpu().numpy(), mesh.faces.cpu().numpy(), mesh.vertex_attrs[:, :3].float().cpu().numpy(),
+            texture_size=texture_size,
+            verbose=verbose
+        )
+        if metrics is not None:
+            metrics.update({'bake_mode': bake_mode, 'bake_steps': 0, 'bake_time': time.time() - start})
+    else:
+        multiview = render_multiview(app_rep, resolution=1024, nviews=100, return_tensors=True, fp16=True, verbose=verbose)
+        texture = bake_texture(
+            vertices, faces, uvs,
+            multiview.color, multiview.mask, multiview.extrinsics, multiview.intrinsics,
+            texture_size=texture_size, mode=bake_mode,
+            lambda_tv=0.01,
+            metrics=metrics,
+            verbose=verbose
+        )
 
     # rotate mesh (from z-up to y-up)
-    vertices = vertices @ np.array([[1, 0, 0], [0, 0, -1], [0, 1, 0]])
-    material = trimesh.visual.material.PBRMaterial(
-        roughnessFactor=1.0,
-        baseColorTexture=texture,
-        baseColorFactor=np.array([255, 255, 255, 255], dtype=np.uint8)
-    )
-    mesh = trimesh.Trimesh(vertices, faces, visual=trimesh.visual.TextureVisuals(uv=uvs, material=material))
-    return mesh
+    mesh = _textured_trimesh(vertices, faces, uvs, texture)
+    if not lod_face_counts:
+        return mesh
+
+    # levels of detail, decimated progressively and textured from the mip chain of the first level
+    start = time.time()
+    meshes = [mesh]
+    mips = texture_mip_chain(texture)
+    lod_texture_size = texture_size
+    for face_count in lod_face_counts[1:]:
+        if lod_faces.shape[0] > face_count:
+            lod_vertices, lod_faces = _decimate(lod_vertices, lod_faces, 1 - face_count / lod_faces.shape[0], verbose=verbose)
+        lod_texture_size = max(lod_texture_size // 2, 64)
+        v, f, lod_uvs = parametrize_mesh(
+            lod_vertices, lod_faces, num_workers=parametrize_workers, texture_size=lod_texture_size, cache_dir=uv_cache_dir
+        )
+        lod_texture = transfer_texture(v, f, lod_uvs, vertices, faces, uvs, mips, lod_texture_size)
+        meshes.append(_textured_trimesh(v, f, lod_uvs, lod_texture))
+        if verbose:
+            tqdm.write(f'LOD{len(meshes) - 1}: {f.shape[0]} faces, {lod_texture_size}x{lod_texture_size} texture')
+    if metrics is not None:
+        metrics['lod_face_counts'] = [int(m.faces.shape[0]) for m in meshes]
+        metrics['lod_time'] = time.time() - start
+    return meshes
 
 
 def simplify_gs(
@@ -27,4 +27,38 @@ def sphere_hammersley_sequence(n, num_samples, offset=(0, 0), remap=False):
         u = 2 * u if u < 0.25 else 2 / 3 * u + 1 / 3
     theta = np.arccos(1 - 2 * u) - np.pi / 2
     phi = v * 2 * np.pi
-    return [phi, theta]
\ No newline at end of file
+    return [phi, theta]
+
+def radical_inverse_array(base, n):
+    """
+    Vectorised `radical_inverse` over an integer array `n`, with the same floating point operations.
+    """
+    n = np.array(n, dtype=np.int64)
+    val = np.zeros(n.shape, dtype=np.float64)
+    inv_base = 1.0 / base
+    inv_base_n = inv_base
+    while np.any(n > 0):
+        val += (n % base) * inv_base_n
+        n //= base
+        inv_base_n *= inv_base
+    return val
+
+def hammersley_sequence_array(dim, num_samples):
+    """
+    All `num_samples` points of the Hammersley sequence at once. Shape (num_samples, dim).
+    """
+    n = np.arange(num_samples)
+    return np.stack([n / num_samples] + [radical_inverse_array(PRIMES[d], n) for d in range(dim - 1)], axis=-1)
+
+def sphere_hammersley_sequence_array(num_samples, offset=(0, 0), remap=False):
+    """
+    All `num_samples` points of `sphere_hammersley_sequence` at once. Shape (num_samples, 2), as [phi, theta].
+    """
+    u, v = hammersley_sequence_array(2, num_samples).T
+    u = u + offset[0] / num_samples
+    v = v + offset[1]
+    if remap:
+        u = np.where(u < 0.25, 2 * u, 2 / 3 * u + 1 / 3)
+    theta = np.arccos(1 - 2 * u) - np.pi / 2
+    phi = v * 2 * np.pi
+    return np.stack([phi, theta], axis=-1)
@@ -0,0 +1,162 @@
+from typing import *
+import torch
+from easydict import EasyDict as edict
+
+
+__all__ = [
+    'rasterize_triangles',
+]
+
+
+_EMPTY_KEY = torch.iinfo(torch.int64).max
+_DEPTH_BITS = 31
+
+
+def _triangle_setup(pos_clip: torch.Tensor, faces: torch.Tensor, width: int, height: int):
+    """
+    Project triangles to screen space and compute their pixel bounding boxes.
+    """
+    tri = pos_clip[:, faces]                                    # [B, F, 3, 4]
+    w = tri[..., 3]
+    valid = (w > 1e-8).all(dim=-1)
+    ndc = tri[..., :3] / w.clamp_min(1e-8)[..., None]
+    # Same convention as nvdiffrast: pixel (i, j) has its center at ndc ((i + 0.5) / W * 2 - 1, (j + 0.5) / H * 2 - 1)
+    x = (ndc[..., 0] + 1) * 0.5 * width
+    y = (ndc[..., 1] + 1) * 0.5 * height
+    z = ndc[..., 2]
+
+    area = (x[..., 1] - x[..., 0]) * (y[..., 2] - y[..., 0]) - (x[..., 2] - x[..., 0]) * (y[..., 1] - y[..., 0])
+    valid &= area.abs() > 1e-12
+
+    x_min = torch.ceil(x.min(dim=-1).values - 0.5).long()
+    x_max = torch.floor(x.max(dim=-1).values - 0.5).long()
+    y_min = torch.ceil(y.min(dim=-1).values - 0.5).long()
+    y_max = torch.floor(y.max(dim=-1).values - 0.5).long()
+    valid &= (x_max >= x_min) & (y_max >= y_min) & (x_max >= 0) & (y_max >= 0) & (x_min < width) & (y_min < height)
+    valid &= (z.min(dim=-1).values <= 1) & (z.max(dim=-1).values >= -1)
+    x_min, x_max = x_min.clamp(0, width - 1), x_max.clamp(0, width - 1)
+    y_min, y_max = y_min.clamp(0, height - 1), y_max.clamp(0, height - 1)
+
+    return edict({
+        'x': x, 'y': y, 'z': z, 'w': w, 'area': area, 'valid': valid,
+        'x_min': x_min, 'y_min': y_min,
+        'box_w': x_max - x_min + 1, 'box_h': y_max - y_min + 1,
+    })
+
+
+def _screen_barycentrics(x: torch.Tensor, y: torch.Tensor, area: torch.Tensor, cx: torch.Tensor, cy: torch.Tensor) -> torch.Tensor:
+    """
+    Screen-space barycentric coordinates of points (cx, cy) in triangles (x, y).
+
+    Args:
+        x, y: [N, 3] screen coordinates of the triangle vertices.
+        area: [N] signed doubled area of the triangles.
+        cx, cy: [N] screen coordinates of the points.
+    """
+    l0 = ((x[:, 1] - cx) * (y[:, 2] - cy) - (x[:, 2] - cx) * (y[:, 1] - cy)) / area
+    l1 = ((x[:, 2] - cx) * (y[:, 0] - cy) - (x[:, 0] - cx) * (y[:, 2] - cy)) / area
+    return torch.stack([l0, l1, 1 - l0 - l1], dim=-1)
+
+
+@torch.no_grad()
+def rasterize_triangles(
+    pos_clip: torch.Tensor,
+    faces: torch.Tensor,
+    width: int,
+    height: int,
+    return_barycentrics: bool = False,
+    max_fragments: int = 1 << 22,
+) -> edict:
+    """
+    Rasterize triangles with a z-buffer, written in vectorised torch so it runs on any device.
+
+    Every triangle is expanded to the pixels of its bounding box, covered pixels are
+    depth tested with a single scatter-min per chunk of fragments. Triangles crossing
+    the camera plane (w <= 0 at any vertex) are skipped instead of clipped.
+
+    Args:
+        pos_clip (torch.Tensor): [B, V, 4] clip space vertex positions.
+        faces (torch.Tensor): [F, 3] triangle indices.
+        width (int): width of the image.
+        height (int): height of the image.
+        return_barycentrics (bool): whether to return perspective-correct barycentrics.
+        max_fragments (int): maximum number of candidate fragments processed at once, bounds the memory usage.
+
+    Returns:
+        edict containing:
+            face_id (torch.Tensor): [B, H, W] index of the visible face, -1 for background. Row 0 is at ndc y = -1 as in nvdiffrast.
+            depth (torch.Tensor): [B, H, W] ndc depth of the visible face, inf for background.
+            bary (torch.Tensor): [B, H, W, 3] perspective-correct barycentrics, if requested.
+    """
+    device = pos_clip.device
+    B = pos_clip.shape[0]
+    faces = faces.long()
+    num_faces = faces.shape[0]
+    setup = _triangle_setup(pos_clip.float(), faces, width, height)
+
+    tri_index = torch.nonzero(setup.valid.reshape(-1)).reshape(-1)
+    x = setup.x.reshape(-1, 3)[tri_index]
+    y = setup.y.reshape(-1, 3)[tri_index]
+    z = setup.z.reshape(-1, 3)[tri_index]
+    area = setup.area.reshape(-1)[tri_index]
+    x_min = setup.x_min.reshape(-1)[tri_index]
+    y_min = setup.y_min.reshape(-1)[tri_index]
+    box_w = setup.box_w.reshape(-1)[tri_index]
+    counts = box_w * setup.box_h.reshape(-1)[tri_index]
+    batch_index = tri_index // num_faces
+    face_index = tri_index % num_faces
+
+    zbuffer = torch.full((B * height * width,), _EMPTY_KEY, dtype=torch.int64, device=device)
+    depth_scale = (1 << _DEPTH_BITS) - 1
+
+    # Split the triangles into chunks of at most max_fragments candidate pixels (at least one triangle each)
+    ends = torch.cumsum(counts, dim=0)
+    num_chunks = int(ends[-1].item() // max_fragments) + 1 if ends.shape[0] > 0 else 0
+    bounds = torch.searchsorted(ends, torch.arange(1, num_chunks + 1, device=device) * max_fragments, right=True).tolist()
+    start = 0
+    for end in bounds:
+        end = max(end, start + 1) if start < tri_index.shape[0] else start
+        if end <= start:
+            continue
+        c = counts[start:end]
+        frag_tri = torch.repeat_interleave(torch.arange(start, end, device=device), c)
+        frag_first = torch.cumsum(c, dim=0) - c
+        local = torch.arange(frag_tri.shape[0], device=device) - frag_first[frag_tri - start]
+        px = x_min[frag_tri] + local % box_w[frag_tri]
+        py = y_min[frag_tri] + local // box_w[frag_tri]
+
+        bary = _screen_barycentrics(x[frag_tri], y[frag_tri], area[frag_tri], px.float() + 0.5, py.float() + 0.5)
+        depth = (bary * z[frag_tri]).sum(dim=-1)
+        inside = (bary >= 0).all(dim=-1) & (depth >= -1) & (depth <= 1)
+
+        frag_tri, px, py, depth = frag_tri[inside], px[inside], py[inside], depth[inside]
+        key = (((depth + 1) * 0.5).clamp(0, 1) * depth_scale).long() << 32 | face_index[frag_tri]
+        pixel = (batch_index[frag_tri] * height + py) * width + px
+        zbuffer.scatter_reduce_(0, pixel, key, reduce='amin')
+        start = end
+
+    covered = zbuffer != _EMPTY_KEY
+    face_id = torch.where(covered, zbuffer & 0xFFFFFFFF, torch.full_like(zbuffer, -1))
+    depth = torch.where(covered, (zbuffer >> 32).float() / depth_scale * 2 - 1, torch.full_like(zbuffer, float('inf'), dtype=torch.float32))
+    ret = edict({
+        'face_id': face_id.reshape(B, height, width),
+        'depth': depth.reshape(B, height, width),
+    })
+
+    if return_barycentrics:
+        pixel = torch.nonzero(covered).reshape(-1)
+        b = pixel // (height * width)
+        py = (pixel // width) % height
+        px = pixel % width
+        tri = b * num_faces + face_id[pixel]
+        bary = _screen_barycentrics(
+            setup.x.reshape(-1, 3)[tri], setup.y.reshape(-1, 3)[tri], setup.area.reshape(-1)[tri],
+            px.float() + 0.5, py.float() + 0.5,
+        ).clamp_min(0)
+        bary = bary / setup.w.reshape(-1, 3)[tri]
+        bary = bary / bary.sum(dim=-1, keepdim=True)
+        ret.bary = torch.zeros((B * height * width, 3), dtype=torch.float32, device=device)
+        ret.bary[pixel] = bary
+        ret.bary = ret.bary.reshape(B, height, width, 3)
+
+    return ret
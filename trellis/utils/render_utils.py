@@ -3,11 +3,13 @@ import numpy as np
 from tqdm import tqdm
 import utils3d
 from PIL import Image
+from easydict import EasyDict as edict
 
 from ..renderers import OctreeRenderer, GaussianRenderer, MeshRenderer
 from ..representations import Octree, Gaussian, MeshExtractResult
 from ..modules import sparse as sp
-from .random_utils import sphere_hammersley_sequence
+from .camera_utils import hammersley_rig, yaw_pitch_r_fov_to_cameras
+from .video_utils import VideoWriter
 
 
 def yaw_pitch_r_fov_to_extrinsics_intrinsics(yaws, pitchs, rs, fovs):
@@ -15,32 +17,16 @@ def yaw_pitch_r_fov_to_extrinsics_intrinsics(yaws, pitchs, rs, fovs):
     if not is_list:
         yaws = [yaws]
         pitchs = [pitchs]
-    if not isinstance(rs, list):
-        rs = [rs] * len(yaws)
-    if not isinstance(fovs, list):
-        fovs = [fovs] * len(yaws)
-    extrinsics = []
-    intrinsics = []
-    for yaw, pitch, r, fov in zip(yaws, pitchs, rs, fovs):
-        fov = torch.deg2rad(torch.tensor(float(fov))).cuda()
-        yaw = torch.tensor(float(yaw)).cuda()
-        pitch = torch.tensor(float(pitch)).cuda()
-        orig = torch.tensor([
-            torch.sin(yaw) * torch.cos(pitch),
-            torch.cos(yaw) * torch.cos(pitch),
-            torch.sin(pitch),
-        ]).cuda() * r
-        extr = utils3d.torch.extrinsics_look_at(orig, torch.tensor([0, 0, 0]).float().cuda(), torch.tensor([0, 0, 1]).float().cuda())
-        intr = utils3d.torch.intrinsics_from_fov_xy(fov, fov)
-        extrinsics.append(extr)
-        intrinsics.append(intr)
+    extrinsics, intrinsics = yaw_pitch_r_fov_to_cameras(yaws, pitchs, rs, fovs, device='cuda')
+    extrinsics = list(extrinsics.unbind(0))
+    intrinsics = list(intrinsics.unbind(0))
     if not is_list:
         extrinsics = extrinsics[0]
         intrinsics = intrinsics[0]
     return extrinsics, intrinsics
 
 
-def render_frames(sample, extrinsics, intrinsics, options={}, colors_overwrite=None, verbose=True, **kwargs):
+def _make_renderer(sample, options={}, **kwargs):
     if isinstance(sample, Octree):
         renderer = OctreeRenderer()
         renderer.rendering_options.resolution = options.get('resolution', 512)
@@ -66,45 +52,107 @@ def render_frames(sample, extrinsics, intrinsics, options={}, colors_overwrite=N
         renderer.rendering_options.ssaa = options.get('ssaa', 4)
     else:
         raise ValueError(f'Unsupported sample type: {type(sample)}')
-    
+    return renderer
+
+
+def render_frames(sample, extrinsics, intrinsics, options={}, colors_overwrite=None, verbose=True, return_tensors=False, dtype=torch.float32, **kwargs):
+    """
+    Render a sample from the given cameras.
+
+    By default frames are returned as lists of uint8 numpy images. With `return_tensors`,
+    they stay on the device as stacked float tensors in [0, 1] of type `dtype`, e.g. (N, H, W, 3) for colors.
+    """
+    renderer = _make_renderer(sample, options, **kwargs)
+
     rets = {}
     for j, (extr, intr) in tqdm(enumerate(zip(extrinsics, intrinsics)), desc='Rendering', disable=not verbose):
         if not isinstance(sample, MeshExtractResult):
             res = renderer.render(sample, extr, intr, colors_overwrite=colors_overwrite)
             if 'color' not in rets: rets['color'] = []
             if 'depth' not in rets: rets['depth'] = []
-            rets['color'].append(np.clip(res['color'].detach().cpu().numpy().transpose(1, 2, 0) * 255, 0, 255).astype(np.uint8))
-            if 'percent_depth' in res:
-                rets['depth'].append(res['percent_depth'].detach().cpu().numpy())
-            elif 'depth' in res:
-                rets['depth'].append(res['depth'].detach().cpu().numpy())
+            if return_tensors:
+                rets['color'].append(res['color'].detach().permute(1, 2, 0).clamp(0, 1).to(dtype))
             else:
+                rets['color'].append(np.clip(res['color'].detach().cpu().numpy().transpose(1, 2, 0) * 255, 0, 255).astype(np.uint8))
+            depth = res.get('percent_depth', res.get('depth'))
+            if depth is None:
                 rets['depth'].append(None)
+            elif return_tensors:
+                rets['depth'].append(depth.detach())
+            else:
+                rets['depth'].append(depth.detach().cpu().numpy())
         else:
             res = renderer.render(sample, extr, intr)
             if 'normal' not in rets: rets['normal'] = []
-            rets['normal'].append(np.clip(res['normal'].detach().cpu().numpy().transpose(1, 2, 0) * 255, 0, 255).astype(np.uint8))
+            if return_tensors:
+                rets['normal'].append(res['normal'].detach().permute(1, 2, 0).clamp(0, 1).to(dtype))
+            else:
+                rets['normal'].append(np.clip(res['normal'].detach().cpu().numpy().transpose(1, 2, 0) * 255, 0, 255).astype(np.uint8))
+    if return_tensors:
+        rets = {k: torch.stack(v) if all(x is not None for x in v) else v for k, v in rets.items()}
     return rets
 
 
-def render_video(sample, resolution=512, bg_color=(0, 0, 0), num_frames=300, r=2, fov=40, **kwargs):
+def _video_cameras(num_frames, r, fov):
     yaws = torch.linspace(0, 2 * 3.1415, num_frames)
     pitch = 0.25 + 0.5 * torch.sin(torch.linspace(0, 2 * 3.1415, num_frames))
     yaws = yaws.tolist()
     pitch = pitch.tolist()
-    extrinsics, intrinsics = yaw_pitch_r_fov_to_extrinsics_intrinsics(yaws, pitch, r, fov)
+    return yaw_pitch_r_fov_to_extrinsics_intrinsics(yaws, pitch, r, fov)
+
+
+def render_video(sample, resolution=512, bg_color=(0, 0, 0), num_frames=300, r=2, fov=40, **kwargs):
+    extrinsics, intrinsics = _video_cameras(num_frames, r, fov)
     return render_frames(sample, extrinsics, intrinsics, {'resolution': resolution, 'bg_color': bg_color}, **kwargs)
 
 
-def render_multiview(sample, resolution=512, nviews=30):
-    r = 2
-    fov = 40
-    cams = [sphere_hammersley_sequence(i, nviews) for i in range(nviews)]
-    yaws = [cam[0] for cam in cams]
-    pitchs = [cam[1] for cam in cams]
-    extrinsics, intrinsics = yaw_pitch_r_fov_to_extrinsics_intrinsics(yaws, pitchs, r, fov)
-    res = render_frames(sample, extrinsics, intrinsics, {'resolution': resolution, 'bg_color': (0, 0, 0)})
-    return res['color'], extrinsics, intrinsics
+@torch.no_grad()
+def render_video_to_file(sample, path, resolution=512, bg_color=(0, 0, 0), num_frames=300, r=2, fov=40, fps=30,
+                         quality=None, queue_size=8, colors_overwrite=None, verbose=True, **kwargs):
+    """
+    Render the orbit of `render_video` straight to an MP4 or animated WebP file.
+
+    Frames are encoded on a background thread while the next ones render, through a
+    bounded queue, so memory does not grow with `num_frames`. Gaussians and octrees
+    are rendered in color, meshes as normal maps.
+
+    Returns the number of frames written.
+    """
+    extrinsics, intrinsics = _video_cameras(num_frames, r, fov)
+    renderer = _make_renderer(sample, {'resolution': resolution, 'bg_color': bg_color}, **kwargs)
+    key = 'normal' if isinstance(sample, MeshExtractResult) else 'color'
+    with VideoWriter(path, fps=fps, quality=quality, queue_size=queue_size) as writer:
+        for extr, intr in tqdm(zip(extrinsics, intrinsics), total=num_frames, desc='Rendering', disable=not verbose):
+            if isinstance(sample, MeshExtractResult):
+                res = renderer.render(sample, extr, intr)
+            else:
+                res = renderer.render(sample, extr, intr, colors_overwrite=colors_overwrite)
+            writer.write(res[key].permute(1, 2, 0))
+    return writer.num_frames
+
+
+def render_multiview(sample, resolution=512, nviews=30, return_tensors=False, fp16=False, verbose=True):
+    """
+    Render a sample from `nviews` cameras spread over the sphere.
+
+    Returns `(colors, extrinsics, intrinsics)` as lists of uint8 images and camera matrices.
+    With `return_tensors`, returns an edict of device tensors instead, ready for `bake_texture`:
+    color (N, H, W, 3) in [0, 1] (fp16 if `fp16`), mask (N, H, W), extrinsics (N, 4, 4) and intrinsics (N, 3, 3).
+    """
+    rig = hammersley_rig(nviews, radius=2, fov=40, device='cuda')
+    res = render_frames(
+        sample, rig.extrinsics, rig.intrinsics, {'resolution': resolution, 'bg_color': (0, 0, 0)},
+        verbose=verbose, return_tensors=return_tensors, dtype=torch.float16 if fp16 else torch.float32,
+    )
+    if not return_tensors:
+        return res['color'], list(rig.extrinsics.unbind(0)), list(rig.intrinsics.unbind(0))
+    return edict({
+        'color': res['color'],
+        # same as any channel being non-zero once quantized to uint8
+        'mask': res['color'].amax(dim=-1) >= 1 / 255,
+        'extrinsics': rig.extrinsics,
+        'intrinsics': rig.intrinsics,
+    })
 
 
 def render_snapshot(samples, resolution=512, bg_color=(0, 0, 0), offset=(-16 / 180 * np.pi, 20 / 180 * np.pi), r=10, fov=8, **kwargs):
@@ -0,0 +1,136 @@
+from typing import *
+import torch
+
+
+__all__ = [
+    'groups_to_segment_ids',
+    'segment_count',
+    'segment_sum',
+    'segment_mean',
+    'segment_quantile',
+    'segment_median',
+    'segment_unique',
+]
+
+
+def groups_to_segment_ids(groups: List[torch.Tensor], num_elements: int) -> torch.Tensor:
+    """
+    Convert a list of index groups (e.g. connected components) to a per-element segment id.
+
+    Args:
+        groups (List[torch.Tensor]): Indices of the elements of each group. Groups must not overlap.
+        num_elements (int): Total number of elements.
+
+    Returns:
+        (torch.Tensor): Segment id of each element, -1 for elements in no group. Shape (num_elements,).
+    """
+    if len(groups) == 0:
+        return torch.full((num_elements,), -1, dtype=torch.long)
+    device = groups[0].device
+    sizes = torch.tensor([g.shape[0] for g in groups], device=device)
+    segment_ids = torch.full((num_elements,), -1, dtype=torch.long, device=device)
+    segment_ids[torch.cat(groups).long()] = torch.repeat_interleave(torch.arange(len(groups), device=device), sizes)
+    return segment_ids
+
+
+def segment_count(segment_ids: torch.Tensor, num_segments: int) -> torch.Tensor:
+    """
+    Number of elements in each segment.
+    """
+    return torch.bincount(segment_ids, minlength=num_segments)
+
+
+def segment_sum(values: torch.Tensor, segment_ids: torch.Tensor, num_segments: int) -> torch.Tensor:
+    """
+    Sum of the values in each segment.
+
+    Args:
+        values (torch.Tensor): Values. Shape (N, *).
+        segment_ids (torch.Tensor): Segment id of each value. Shape (N,).
+        num_segments (int): Number of segments.
+
+    Returns:
+        (torch.Tensor): Shape (num_segments, *).
+    """
+    out = torch.zeros((num_segments, *values.shape[1:]), dtype=values.dtype, device=values.device)
+    return out.index_add_(0, segment_ids, values)
+
+
+def segment_mean(values: torch.Tensor, segment_ids: torch.Tensor, num_segments: int) -> torch.Tensor:
+    """
+    Mean of the values in each segment, 0 for empty segments.
+    """
+    counts = segment_count(segment_ids, num_segments).clamp_min(1)
+    return segment_sum(values, segment_ids, num_segments) / counts.reshape(-1, *[1] * (values.dim() - 1)).to(values.dtype)
+
+
+def _segment_sorted(values: torch.Tensor, segment_ids: torch.Tensor, num_segments: int):
+    """
+    Sort values by (segment, value), returning the sorted values, segment starts and counts.
+    """
+    order = torch.argsort(values, stable=True)
+    order = order[torch.argsort(segment_ids[order], stable=True)]
+    counts = segment_count(segment_ids, num_segments)
+    starts = torch.cumsum(counts, dim=0) - counts
+    return values[order], starts, counts
+
+
+def segment_quantile(values: torch.Tensor, segment_ids: torch.Tensor, num_segments: int, q: float) -> torch.Tensor:
+    """
+    Quantile of the values in each segment, with linear interpolation as `torch.quantile`.
+
+    Args:
+        values (torch.Tensor): Values. Shape (N,).
+        segment_ids (torch.Tensor): Segment id of each value. Shape (N,).
+        num_segments (int): Number of segments.
+        q (float): Quantile in [0, 1].
+
+    Returns:
+        (torch.Tensor): Quantile of each segment, nan for empty segments. Shape (num_segments,).
+    """
+    sorted_values, starts, counts = _segment_sorted(values, segment_ids, num_segments)
+    pos = q * (counts - 1).clamp_min(0).to(values.dtype)
+    lo = torch.floor(pos).long()
+    hi = torch.ceil(pos).long()
+    frac = pos - lo.to(values.dtype)
+    last = max(sorted_values.shape[0] - 1, 0)
+    lo_value = sorted_values[(starts + lo).clamp(0, last)]
+    hi_value = sorted_values[(starts + hi).clamp(0, last)]
+    ret = lo_value + (hi_value - lo_value) * frac
+    return torch.where(counts > 0, ret, torch.full_like(ret, float('nan')))
+
+
+def segment_median(values: torch.Tensor, segment_ids: torch.Tensor, num_segments: int) -> torch.Tensor:
+    """
+    Median of the values in each segment. As `torch.median`, the lower of the two middle values is
+    returned for segments with an even number of values.
+
+    Returns:
+        (torch.Tensor): Median of each segment, nan for empty segments. Shape (num_segments,).
+    """
+    sorted_values, starts, counts = _segment_sorted(values, segment_ids, num_segments)
+    last = max(sorted_values.shape[0] - 1, 0)
+    ret = sorted_values[(starts + (counts - 1).clamp_min(0) // 2).clamp(0, last)]
+    return torch.where(counts > 0, ret, torch.full_like(ret, float('nan')))
+
+
+def segment_unique(keys: torch.Tensor, segment_ids: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+    """
+    Unique keys within each segment, through a single sort of combined (segment, key) values.
+
+    Args:
+        keys (torch.Tensor): Non-negative integer keys. Shape (N,).
+        segment_ids (torch.Tensor): Segment id of each key. Shape (N,).
+
+    Returns:
+        (torch.Tensor): Segment id of each unique pair. Shape (U,).
+        (torch.Tensor): Key of each unique pair. Shape (U,).
+        (torch.Tensor): Number of occurrences of each unique pair. Shape (U,).
+    """
+    keys = keys.long()
+    segment_ids = segment_ids.long()
+    if keys.shape[0] == 0:
+        return segment_ids, keys, torch.zeros_like(keys)
+    stride = keys.max() + 1
+    combined, counts = torch.unique(segment_ids * stride + keys, return_counts=True)
+    return combined // stride, combined % stride, counts
@@ -0,0 +1,144 @@
+from typing import *
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+
+__all__ = [
+    'dilate_texture',
+    'pull_push_fill',
+    'inpaint_texture',
+]
+
+
+_NEIGHBOURS = [(dy, dx) for dy in (-1, 0, 1) for dx in (-1, 0, 1) if (dy, dx) != (0, 0)]
+
+
+def dilate_texture(texture: torch.Tensor, valid: torch.Tensor, iterations: int) -> Tuple[torch.Tensor, torch.Tensor]:
+    """
+    Grow the valid region by `iterations` texels, filling each new texel with the mean of its valid 8-neighbours.
+
+    Only the front of the growing region is touched, so the cost scales with the length of
+    the chart borders rather than with the texture size.
+
+    Args:
+        texture (torch.Tensor): Texture. Shape (C, H, W).
+        valid (torch.Tensor): Valid texels. Shape (H, W).
+        iterations (int): Number of texels to grow.
+
+    Returns:
+        (torch.Tensor): Dilated texture. Shape (C, H, W).
+        (torch.Tensor): Dilated valid mask. Shape (H, W).
+    """
+    C, H, W = texture.shape
+    # one texel of padding, which is never valid, so that neighbours need no bounds checks
+    Wp = W + 2
+    color = F.pad(texture, (1, 1, 1, 1)).reshape(C, -1)
+    weight = F.pad(valid, (1, 1, 1, 1)).reshape(-1)
+    inside = F.pad(torch.ones_like(valid), (1, 1, 1, 1)).reshape(-1)
+    offsets = torch.tensor([dy * Wp + dx for dy, dx in _NEIGHBOURS], device=texture.device)
+
+    # invalid texels next to a valid one
+    near = torch.zeros((H + 2, Wp), dtype=torch.bool, device=texture.device)
+    valid_2d = weight.reshape(H + 2, Wp)
+    for dy, dx in _NEIGHBOURS:
+        near[1:-1, 1:-1] |= valid_2d[1 + dy:H + 1 + dy, 1 + dx:W + 1 + dx]
+    front = torch.nonzero((near.reshape(-1) & ~weight & inside)).reshape(-1)
+
+    for _ in range(iterations):
+        if front.shape[0] == 0:
+            break
+        neighbours = front[:, None] + offsets                               # [N, 8]
+        neighbour_weight = weight[neighbours].to(color.dtype)              # [N, 8]
+        color_sum = (color[:, neighbours] * neighbour_weight).sum(dim=-1)  # [C, N]
+        color[:, front] = color_sum / neighbour_weight.sum(dim=-1).clamp_min(1)
+        weight[front] = True
+        next_front = torch.zeros_like(weight)
+        next_front[neighbours.reshape(-1)] = True
+        front = torch.nonzero(next_front & ~weight & inside).reshape(-1)
+
+    color = color.reshape(C, H + 2, Wp)[:, 1:-1, 1:-1]
+    weight = weight.reshape(H + 2, Wp)[1:-1, 1:-1]
+    return color, weight
+
+
+def pull_push_fill(texture: torch.Tensor, valid: torch.Tensor) -> torch.Tensor:
+    """
+    Fill invalid texels with the pull-push algorithm.
+
+    The pull pass builds a mip pyramid averaging only valid texels, the push pass fills the
+    holes of each level with the bilinearly upsampled level above. Valid texels are unchanged.
+
+    Args:
+        texture (torch.Tensor): Texture. Shape (C, H, W).
+        valid (torch.Tensor): Valid texels. Shape (H, W).
+
+    Returns:
+        (torch.Tensor): Filled texture. Shape (C, H, W).
+    """
+    valid = valid[None]
+    weight = valid.to(texture.dtype)
+    levels = [(texture * weight, weight)]
+    # pull
+    while max(levels[-1][1].shape[-2:]) > 1:
+        color, weight = levels[-1]
+        pad = (0, weight.shape[-1] % 2, 0, weight.shape[-2] % 2)
+        color = F.avg_pool2d(F.pad(color, pad)[None], 2)[0]
+        weight = F.avg_pool2d(F.pad(weight, pad)[None], 2)[0]
+        levels.append((color, weight))
+        if len(levels) == 2:
+            # the full resolution level is not needed by the push pass, free it early
+            levels[0] = None
+    if len(levels) == 1:
+        return texture
+    # push
+    filled = None
+    for color, weight in reversed(levels[1:]):
+        color = color / weight.clamp_min(1e-12)
+        if filled is not None:
+            up = F.interpolate(filled[None], size=color.shape[-2:], mode='bilinear', align_corners=False)[0]
+            color = torch.where(weight > 0, color, up)
+        filled = color
+    filled = F.interpolate(filled[None], size=texture.shape[-2:], mode='bilinear', align_corners=False)[0]
+    return torch.where(valid, texture, filled, out=filled)
+
+
+def inpaint_texture(
+    texture: np.ndarray,
+    mask: np.ndarray,
+    method: Literal['pull_push', 'telea'] = 'pull_push',
+    dilation: int = 4,
+    device: Union[str, torch.device] = 'cpu',
+) -> np.ndarray:
+    """
+    Fill the masked texels of a texture, e.g. the gutters around UV charts.
+
+    'pull_push' first dilates the charts by `dilation` texels, so that the texels sampled
+    across chart borders by bilinear filtering and mipmapping copy the border colors, then
+    fills the rest with `pull_push_fill`. 'telea' is `cv2.inpaint` with a radius of 3.
+
+    Args:
+        texture (np.ndarray): uint8 texture. Shape (H, W, C).
+        mask (np.ndarray): Texels to fill are non-zero. Shape (H, W).
+        method (str): Inpainting method.
+        dilation (int): Number of texels to dilate the charts by before the pull-push fill.
+        device: Device running the 'pull_push' fill.
+
+    Returns:
+        (np.ndarray): Inpainted uint8 texture. Shape (H, W, C).
+    """
+    if method == 'telea':
+        import cv2
+        return cv2.inpaint(texture, mask.astype(np.uint8), 3, cv2.INPAINT_TELEA)
+    if method != 'pull_push':
+        raise ValueError(f'Unknown inpainting method: {method}')
+
+    valid = torch.from_numpy(mask == 0).to(device)
+    if valid.all() or not valid.any():
+        return texture
+    tex = torch.from_numpy(texture).to(device).permute(2, 0, 1).float()
+    tex, valid_dilated = dilate_texture(tex, valid, dilation)
+    tex = pull_push_fill(tex, valid_dilated)
+    tex = tex.round_().clamp_(0, 255).to(torch.uint8).permute(1, 2, 0).cpu().numpy()
+    # keep the valid texels bit-exact
+    return np.where(mask[..., None] == 0, texture, tex)
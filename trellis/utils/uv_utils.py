@@ -0,0 +1,290 @@
+from typing import *
+import os
+import math
+import hashlib
+import threading
+import collections
+import concurrent.futures
+import multiprocessing
+import numpy as np
+import xatlas
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+
+__all__ = [
+    'mesh_hash',
+    'UVCache',
+    'parametrize_components',
+    'parametrize_mesh_cached',
+    'shutdown_parametrize_pool',
+]
+
+
+def mesh_hash(vertices: np.ndarray, faces: np.ndarray) -> str:
+    """
+    Content hash of a mesh, used as UV cache key.
+    """
+    vertices = np.ascontiguousarray(vertices, dtype=np.float32)
+    faces = np.ascontiguousarray(faces, dtype=np.int64)
+    h = hashlib.blake2b(digest_size=16)
+    h.update(np.array(vertices.shape + faces.shape, dtype=np.int64).tobytes())
+    h.update(vertices.tobytes())
+    h.update(faces.tobytes())
+    return h.hexdigest()
+
+
+class UVCache:
+    """
+    LRU cache of parametrization results in memory, optionally backed by a directory of .npz files.
+
+    Args:
+        max_entries (int): Maximum number of results kept in memory.
+        cache_dir (str): If given, results are also stored to and loaded from this directory.
+    """
+    def __init__(self, max_entries: int = 8, cache_dir: Optional[str] = None):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def _path(self, key: str, cache_dir: Optional[str]) -> Optional[str]:
+        cache_dir = cache_dir or self.cache_dir
+        return os.path.join(cache_dir, f'{key}.npz') if cache_dir else None
+
+    def get(self, key: str, cache_dir: Optional[str] = None) -> Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+        path = self._path(key, cache_dir)
+        if path is not None and os.path.exists(path):
+            with np.load(path) as data:
+                value = (data['vmapping'], data['faces'], data['uvs'])
+            self._put_memory(key, value)
+            with self._lock:
+                self.hits += 1
+            return value
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, value: Tuple[np.ndarray, np.ndarray, np.ndarray], cache_dir: Optional[str] = None):
+        self._put_memory(key, value)
+        path = self._path(key, cache_dir)
+        if path is not None:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f'{path[:-4]}.{os.getpid()}.tmp.npz'
+            np.savez(tmp_path, vmapping=value[0], faces=value[1], uvs=value[2])
+            os.replace(tmp_path, path)
+
+    def _put_memory(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_uv_cache = UVCache()
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def _get_pool(num_workers: int) -> concurrent.futures.ProcessPoolExecutor:
+    """
+    Persistent process pool running xatlas, so that worker startup is paid once per process.
+
+    Workers are spawned rather than forked, so they never inherit the CUDA context or the
+    locks held by other threads of the calling process.
+    """
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != num_workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = concurrent.futures.ProcessPoolExecutor(max_workers=num_workers, mp_context=multiprocessing.get_context('spawn'))
+            _pool_workers = num_workers
+        return _pool
+
+
+def shutdown_parametrize_pool():
+    """
+    Stop the worker processes of `parametrize_components`.
+    """
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+        _pool, _pool_workers = None, 0
+
+
+def _face_areas(points: np.ndarray, faces: np.ndarray) -> np.ndarray:
+    """
+    Area of triangles with 2D or 3D corners.
+    """
+    e1 = points[faces[:, 1]] - points[faces[:, 0]]
+    e2 = points[faces[:, 2]] - points[faces[:, 0]]
+    if points.shape[1] == 2:
+        return 0.5 * np.abs(e1[:, 0] * e2[:, 1] - e1[:, 1] * e2[:, 0])
+    return 0.5 * np.linalg.norm(np.cross(e1, e2), axis=1)
+
+
+def _face_components(faces: np.ndarray, num_vertices: int) -> Tuple[int, np.ndarray]:
+    """
+    Label the faces by the connected component of their vertices.
+    """
+    edges = np.concatenate([faces[:, [0, 1]], faces[:, [1, 2]]], axis=0)
+    adjacency = coo_matrix((np.ones(edges.shape[0], dtype=np.int8), (edges[:, 0], edges[:, 1])), shape=(num_vertices, num_vertices))
+    num_components, labels = connected_components(adjacency, directed=False)
+    return num_components, labels[faces[:, 0]]
+
+
+def _bucket_components(face_labels: np.ndarray, face_areas: np.ndarray, num_buckets: int) -> np.ndarray:
+    """
+    Assign the components to buckets of similar surface area (longest processing time first), returning the bucket of each face.
+    """
+    component_areas = np.bincount(face_labels, weights=face_areas)
+    bucket_areas = np.zeros(num_buckets)
+    component_bucket = np.zeros(component_areas.shape[0], dtype=np.int64)
+    for c in np.argsort(-component_areas, kind='stable'):
+        b = int(np.argmin(bucket_areas))
+        component_bucket[c] = b
+        bucket_areas[b] += component_areas[c]
+    return component_bucket[face_labels]
+
+
+def _pack_charts(charts: List[Tuple[np.ndarray, np.ndarray]], texture_size: int, padding: int, fill: float = 0.7) -> xatlas.Atlas:
+    """
+    Pack charts with UVs in mesh units into a single atlas, all at the same texel density.
+
+    The density starts where the charts would cover `fill` of the texture, and is lowered
+    until the packed atlas fits in `texture_size`.
+    """
+    uv_area = sum(_face_areas(uv, ind.astype(np.int64)).sum() for ind, uv in charts)
+    texels_per_unit = math.sqrt(fill * texture_size ** 2 / max(uv_area, 1e-12))
+    for _ in range(8):
+        atlas = xatlas.Atlas()
+        for ind, uv in charts:
+            atlas.add_uv_mesh(np.ascontiguousarray(uv, dtype=np.float32), np.ascontiguousarray(ind, dtype=np.uint32))
+        pack_options = xatlas.PackOptions()
+        pack_options.padding = padding
+        pack_options.texels_per_unit = texels_per_unit
+        atlas.generate(pack_options=pack_options)
+        size = max(atlas.width, atlas.height)
+        if size <= texture_size:
+            break
+        texels_per_unit *= 0.98 * texture_size / size
+    return atlas
+
+
+def parametrize_components(
+    vertices: np.ndarray,
+    faces: np.ndarray,
+    num_workers: int = 1,
+    num_buckets: int = 4,
+    texture_size: int = 1024,
+    padding: int = 2,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Parametrize a mesh with xatlas, optionally one process per group of connected components.
+
+    With a single worker, or a mesh with a single component, this is one in-process
+    xatlas call. Otherwise the components are grouped into `num_buckets` buckets of
+    similar surface area, and xatlas cuts each bucket into charts in a worker process.
+    The charts of all buckets are then packed together by their real extents, at one
+    texel density for the whole mesh, into an atlas that fits `texture_size` with at
+    least `padding` texels between charts. The layout depends on the bucket count, not
+    on the number of workers.
+
+    Args:
+        vertices (np.ndarray): Vertices of the mesh. Shape (V, 3).
+        faces (np.ndarray): Faces of the mesh. Shape (F, 3).
+        num_workers (int): Number of worker processes. 1 runs a single xatlas call.
+        num_buckets (int): Number of groups of components parametrized separately.
+        texture_size (int): Size of the texture the atlas is baked into.
+        padding (int): Gutter between charts, in texels of the texture.
+
+    Returns:
+        (np.ndarray): Index of the input vertex of each output vertex. Shape (V',).
+        (np.ndarray): Faces of the parametrized mesh. Shape (F, 3).
+        (np.ndarray): UV coordinates in [0, 1]. Shape (V', 2).
+    """
+    faces = np.asarray(faces, dtype=np.int64)
+    if num_workers > 1:
+        num_components, face_labels = _face_components(faces, vertices.shape[0])
+        num_buckets = min(num_buckets, num_components)
+    if num_workers <= 1 or num_buckets <= 1:
+        vmapping, indices, uvs = xatlas.parametrize(vertices, faces.astype(np.uint32))
+        return vmapping, indices, uvs
+
+    # the worker module does not import trellis, see uv_charts
+    from uv_charts import compute_charts
+    face_bucket = _bucket_components(face_labels, _face_areas(vertices, faces), num_buckets)
+    bucket_vertices, bucket_faces = [], []
+    for b in range(num_buckets):
+        v_index, f_local = np.unique(faces[face_bucket == b], return_inverse=True)
+        bucket_vertices.append(v_index)
+        bucket_faces.append(f_local.reshape(-1, 3))
+    charts = list(_get_pool(num_workers).map(compute_charts, [vertices[v] for v in bucket_vertices], bucket_faces))
+    atlas = _pack_charts([(ind, uv) for _, ind, uv in charts], texture_size, padding)
+
+    # scale the atlas to the texture, the gutters only grow
+    size = max(atlas.width, atlas.height)
+    vmapping, indices, uvs = [], [], []
+    num_out_vertices = 0
+    for b, (vm_chart, _, _) in enumerate(charts):
+        vm, ind, uv = atlas[b]
+        vmapping.append(bucket_vertices[b][vm_chart[vm]])
+        indices.append(ind.astype(np.int64) + num_out_vertices)
+        uvs.append(uv * np.array([atlas.width, atlas.height], dtype=np.float32) / size)
+        num_out_vertices += vm.shape[0]
+    return np.concatenate(vmapping), np.concatenate(indices).astype(np.uint32), np.concatenate(uvs).astype(np.float32)
+
+
+def parametrize_mesh_cached(
+    vertices: np.ndarray,
+    faces: np.ndarray,
+    num_workers: int = 1,
+    num_buckets: int = 4,
+    texture_size: int = 1024,
+    padding: int = 2,
+    cache: bool = True,
+    cache_dir: Optional[str] = None,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    `parametrize_components` with results cached by mesh hash, so a mesh is only parametrized once.
+
+    Args:
+        vertices (np.ndarray): Vertices of the mesh. Shape (V, 3).
+        faces (np.ndarray): Faces of the mesh. Shape (F, 3).
+        num_workers (int): Number of worker processes. 1 runs a single xatlas call.
+        num_buckets (int): Number of groups of components parametrized separately.
+        texture_size (int): Size of the texture the atlas is baked into.
+        padding (int): Gutter between charts, in texels of the texture.
+        cache (bool): Whether to use the cache.
+        cache_dir (str): Directory of the on-disk cache, in addition to the in-memory one.
+
+    Returns:
+        Same as `parametrize_components`.
+    """
+    options = dict(num_workers=num_workers, num_buckets=num_buckets, texture_size=texture_size, padding=padding)
+    if not cache:
+        return parametrize_components(vertices, faces, **options)
+    key = mesh_hash(vertices, faces)
+    if num_workers > 1:
+        # the bucketed layout depends on the texture size and the gutters, the single call on nothing else
+        key = f'{key}_b{num_buckets}_t{texture_size}_p{padding}'
+    value = _uv_cache.get(key, cache_dir)
+    if value is None:
+        value = parametrize_components(vertices, faces, **options)
+        _uv_cache.put(key, value, cache_dir)
+    return tuple(v.copy() for v in value)
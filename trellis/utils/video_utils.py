@@ -0,0 +1,137 @@
+from typing import *
+import os
+import queue
+import threading
+import numpy as np
+import torch
+
+
+__all__ = [
+    'VideoWriter',
+]
+
+
+class VideoWriter:
+    """
+    Encode frames to an MP4 or animated WebP on a background thread, as they are rendered.
+
+    Frames are converted to uint8 on their device and copied to a small ring of pinned host
+    buffers without blocking the render thread; the encoder thread waits for each copy and
+    pipes the frame to ffmpeg. The queue between the two is bounded, so memory stays the
+    same whatever the number of frames, and rendering only waits when encoding falls behind.
+
+    Args:
+        path (str): Output file, '.mp4' or '.webp'.
+        fps (int): Frames per second.
+        quality (int): Encoding quality, 0 to 10 for MP4 (imageio's scale) and 0 to 100 for WebP.
+        queue_size (int): Frames waiting to be encoded at most.
+    """
+
+    def __init__(self, path: str, fps: int = 30, quality: Optional[int] = None, queue_size: int = 8):
+        ext = os.path.splitext(path)[1].lower()
+        if ext not in ('.mp4', '.webp'):
+            raise ValueError(f"Unsupported video format '{ext}', expected '.mp4' or '.webp'")
+        self.path = path
+        self.fps = fps
+        self.quality = quality
+        self.num_frames = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        # one buffer per queued frame, plus the one being encoded and the one being copied
+        self._free = queue.Queue()
+        self._num_buffers = queue_size + 2
+        self._buffers = []
+        self._error = None
+        self._thread = threading.Thread(target=self._encode, daemon=True)
+        self._thread.start()
+
+    def _open(self, width: int, height: int):
+        import imageio_ffmpeg
+        if self.path.lower().endswith('.webp'):
+            quality = 80 if self.quality is None else self.quality
+            writer = imageio_ffmpeg.write_frames(
+                self.path, (width, height), fps=self.fps, codec='libwebp', pix_fmt_out='yuv420p',
+                quality=None, macro_block_size=1, output_params=['-loop', '0', '-quality', str(quality)],
+            )
+        else:
+            writer = imageio_ffmpeg.write_frames(
+                self.path, (width, height), fps=self.fps, codec='libx264', pix_fmt_out='yuv420p',
+                quality=5 if self.quality is None else self.quality,
+            )
+        writer.send(None)
+        return writer
+
+    def _encode(self):
+        writer = None
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            buffer, event = item
+            try:
+                if self._error is None:
+                    if event is not None:
+                        event.synchronize()
+                    frame = buffer.numpy()
+                    if writer is None:
+                        writer = self._open(frame.shape[1], frame.shape[0])
+                    writer.send(np.ascontiguousarray(frame))
+            except Exception as e:
+                self._error = e
+            finally:
+                self._free.put(buffer)
+        if writer is not None:
+            try:
+                writer.close()
+            except Exception as e:
+                self._error = self._error or e
+
+    def _buffer(self, shape: Tuple[int, ...], pin: bool) -> torch.Tensor:
+        if len(self._buffers) < self._num_buffers:
+            buffer = torch.empty(shape, dtype=torch.uint8, pin_memory=pin)
+            self._buffers.append(buffer)
+            return buffer
+        return self._free.get()
+
+    def write(self, frame: Union[torch.Tensor, np.ndarray]):
+        """
+        Queue a frame for encoding.
+
+        Args:
+            frame (torch.Tensor | np.ndarray): RGB frame (H, W, 3), floats in [0, 1] or uint8,
+                on any device. All frames must have the same size.
+        """
+        if self._error is not None:
+            raise self._error
+        if isinstance(frame, np.ndarray):
+            frame = torch.from_numpy(frame)
+        frame = frame.detach()
+        if frame.dtype != torch.uint8:
+            frame = (frame.clamp(0, 1) * 255).round().to(torch.uint8)
+        on_cuda = frame.is_cuda
+        buffer = self._buffer(tuple(frame.shape), pin=on_cuda)
+        buffer.copy_(frame, non_blocking=on_cuda)
+        event = None
+        if on_cuda:
+            event = torch.cuda.Event()
+            event.record()
+        self._queue.put((buffer, event))
+        self.num_frames += 1
+
+    def close(self):
+        """
+        Wait for the queued frames to be encoded and finish the file.
+        """
+        self._queue.put(None)
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._queue.put(None)
+            self._thread.join()
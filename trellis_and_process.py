@@ -6,10 +6,13 @@ import click
 
 @click.command()
 @click.option('--image_folder', type=str, help='Path to the folder containing images.')
+@click.option('--finishing', type=click.Choice(['numpy', 'blender']), default='numpy', help='Mesh finishing: numpy, or the Blender fallback.')
+@click.option('--preview', type=click.Choice(['mp4', 'webp']), default=None, help='Also write a turntable preview video of the generated model.')
+@click.option('--splat', is_flag=True, help='Also write the generated Gaussians as model.splat for web viewers.')
 # @click.option('--output_folder', type=str, default=os.path.join(image_folder, "trellis_out", "model_processed.obj"), help='Path to the output folder.')
 
 
-def process_images(image_folder):
+def process_images(image_folder, finishing, preview, splat):
     imgs = []
     valid_images = [".jpeg", ".jpg",".png"]
     for f in os.listdir(image_folder):
@@ -19,11 +22,13 @@ def process_images(image_folder):
         imgs.append(Image.open(os.path.join(image_folder,f)))
 
     print(f"Found {len(imgs)} images in {image_folder}.")
-    data = trellis_multiple_images(imgs)
-
     output_file = os.path.join(image_folder, "trellis_out", "model_processed.obj")
-    
     os.makedirs(os.path.dirname(output_file), exist_ok=True)
+    preview_path = os.path.join(os.path.dirname(output_file), f"preview.{preview}") if preview else None
+    splat_path = os.path.join(os.path.dirname(output_file), "model.splat") if splat else None
+
+    data = trellis_multiple_images(imgs, finishing=finishing, preview_path=preview_path, splat_path=splat_path)
+
     with open(output_file, "wb") as f:
         f.write(data)
     
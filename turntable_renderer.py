@@ -0,0 +1,158 @@
+"""
+Fast turntable renders of a GLB, without Blender.
+
+All views are rasterized in batches with the torch z-buffer rasterizer, from the merged
+triangles of the GLB, and shaded with the base color of their material (texture times
+factor) under a soft headlight. The camera reproduces model_to_views: it looks down 5
+degrees, is moved back until the model at angle 0 fits the view of a 90 mm lens, like
+camera_to_view_selected, and then renders with a 45 mm lens; the model turns about the
+Z axis (Blender frame) between views.
+"""
+import os
+import math
+import numpy as np
+import torch
+from trellis.utils.raster_utils import rasterize_triangles
+from texture_compositor import load_glb_geometry, glb_material_albedo, linear_to_srgb, _ImageCache
+from image_encoder import encode_image
+
+
+SENSOR_WIDTH = 36.0     # Blender's default sensor, in mm
+
+
+def camera_basis(tilt=math.radians(85)):
+    """
+    Right, up and forward axes of model_to_views' camera, rotated by `tilt` about X.
+    """
+    right = np.array([1.0, 0.0, 0.0])
+    up = np.array([0.0, math.cos(tilt), math.sin(tilt)])
+    forward = np.array([0.0, math.sin(tilt), -math.cos(tilt)])
+    return right, up, forward
+
+
+def fit_camera(points, right, up, forward, lens=90.0):
+    """
+    Camera position framing the points like Blender's camera_to_view_selected.
+
+    The camera keeps its orientation and is placed where the frustum of the tighter axis
+    touches the points on both sides, centered on both axes.
+    """
+    t = SENSOR_WIDTH / 2 / lens
+    depth = points @ forward
+    co = {}
+    for name, axis in (("x", right), ("y", up)):
+        side = points @ axis
+        high = (side - t * depth).max()
+        low = (-side - t * depth).max()
+        co[name] = ((high - low) / 2, -(high + low) / (2 * t))
+    return right * co["x"][0] + up * co["y"][0] + forward * min(co["x"][1], co["y"][1])
+
+
+def turntable_angles(num_views):
+    """
+    Angles of `num_views` views evenly spread over a full turn, in degrees.
+    """
+    return [i * 360 / num_views for i in range(num_views)]
+
+
+def _rotation_z(angle):
+    c, s = math.cos(angle), math.sin(angle)
+    return np.array([[c, -s, 0.0], [s, c, 0.0], [0.0, 0.0, 1.0]], dtype=np.float32)
+
+
+def render_turntable(model_path, output_path, num_views=4, resolution=1080, lens=45.0, supersample=2,
+                     batch_size=2, ambient=0.55, background=(1.0, 1.0, 1.0), device=None, angles=None):
+    """
+    Render a GLB from `num_views` angles evenly spread over a full turn.
+
+    Parameters:
+        model_path (str): GLB to render.
+        output_path (str): Folder the views are written to, as {angle:.2f}.png like model_to_views.
+        num_views (int): Number of views.
+        resolution (int): Width and height of the views.
+        lens (float): Focal length of the renders, in mm.
+        supersample (int): Samples per pixel along each axis, for anti-aliasing.
+        batch_size (int): Views rasterized at once, bounds the memory usage.
+        ambient (float): Share of the light that does not depend on the normal.
+        background (tuple): Linear RGB of the background.
+        device (str): Torch device, CUDA if available by default.
+        angles (list): Angles to render, in degrees, instead of the `num_views` angles.
+
+    Returns:
+        list: Paths of the views, in order.
+    """
+    device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+    geometry = load_glb_geometry(model_path)
+    # glTF is Y up, Blender imports it Z up
+    to_blender = np.array([[1, 0, 0], [0, 0, -1], [0, 1, 0]], dtype=np.float32)
+    vertices = geometry["vertices"] @ to_blender.T
+    normals = geometry["normals"] @ to_blender.T
+
+    right, up, forward = camera_basis()
+    eye = fit_camera(vertices.astype(np.float64), right, up, forward)
+    t = SENSOR_WIDTH / 2 / lens
+    near, far = 0.1, 1000.0
+    view = np.stack([right, up, forward]).astype(np.float32)
+    # the light comes from behind the camera, slightly above and to the left
+    light = torch.nn.functional.normalize(torch.tensor(-forward + 0.4 * up - 0.3 * right, dtype=torch.float32), dim=0).to(device)
+
+    faces = torch.from_numpy(geometry["faces"]).to(device)
+    uvs = torch.from_numpy(geometry["uvs"]).to(device)
+    face_slots = torch.from_numpy(geometry["face_slots"]).to(device)
+    images = _ImageCache(device)
+    background = torch.tensor(background, dtype=torch.float32, device=device)
+    size = resolution * supersample
+
+    os.makedirs(output_path, exist_ok=True)
+    angles = list(angles) if angles is not None else turntable_angles(num_views)
+    paths = []
+    for start in range(0, len(angles), batch_size):
+        batch = angles[start:start + batch_size]
+        positions, batch_normals = [], []
+        for angle in batch:
+            rotation = _rotation_z(math.radians(angle))
+            positions.append(((vertices @ rotation.T) - eye) @ view.T)
+            batch_normals.append(normals @ rotation.T @ view.T)
+        camera_pos = torch.from_numpy(np.stack(positions).astype(np.float32)).to(device)
+        camera_normals = torch.from_numpy(np.stack(batch_normals).astype(np.float32)).to(device)
+        z = camera_pos[..., 2]
+        pos_clip = torch.stack([
+            camera_pos[..., 0] / t,
+            camera_pos[..., 1] / t,
+            (z * (far + near) - 2 * far * near) / (far - near),
+            z,
+        ], dim=-1)
+        rast = rasterize_triangles(pos_clip, faces, size, size, return_barycentrics=True)
+
+        face_id = rast.face_id.reshape(-1)
+        covered = torch.nonzero(face_id >= 0).reshape(-1)
+        view_index = covered // (size * size)
+        corners = faces[face_id[covered]]
+        bary = rast.bary.reshape(-1, 3)[covered][..., None]
+        uv = (uvs[corners] * bary).sum(dim=1)
+        normal = (camera_normals[view_index[:, None], corners] * bary).sum(dim=1)
+        normal = torch.nn.functional.normalize(normal, dim=-1)
+        # back faces are lit as seen from the camera
+        normal = torch.where((normal[:, 2:] > 0), -normal, normal)
+        camera_light = light @ torch.from_numpy(view.T).to(device)
+        shade = ambient + (1 - ambient) * (normal @ camera_light).clamp_min(0)
+
+        slot = face_slots[face_id[covered]]
+        albedo = torch.full((covered.shape[0], 3), 0.8, device=device)
+        for s, material in enumerate(geometry["slot_materials"]):
+            mask = slot == s
+            if material is not None and mask.any():
+                albedo[mask] = glb_material_albedo(material, uv[mask], images)
+
+        color = background.repeat(len(batch) * size * size, 1)
+        color[covered] = albedo * shade[:, None]
+        color = color.reshape(len(batch), size, size, 3)
+        if supersample > 1:
+            color = color.reshape(len(batch), resolution, supersample, resolution, supersample, 3).mean(dim=(2, 4))
+        # rows start at the bottom of the view
+        color = (linear_to_srgb(color.flip(1)) * 255).round().to(torch.uint8).cpu().numpy()
+        for angle, image in zip(batch, color):
+            path = os.path.join(output_path, f"{angle:.2f}.png")
+            encode_image(np.ascontiguousarray(image), path)
+            paths.append(path)
+    return paths
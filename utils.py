@@ -1,7 +1,56 @@
-import bpy, bmesh
+import contextlib
+import os
+import shutil
+import tempfile
+import threading
+
+
+# Memory-backed when available, so per-job intermediate files never touch the disk
+TEMP_ROOT = "/dev/shm" if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK) else None
+
+
+def make_job_dir(prefix="job_"):
+    """
+    Creates a private temporary directory for one job and returns its path.
+    The caller is responsible for removing it.
+    """
+    return tempfile.mkdtemp(prefix=prefix, dir=TEMP_ROOT)
+
+
+@contextlib.contextmanager
+def job_temp_dir(prefix="job_"):
+    """
+    Private temporary directory for one job, removed with everything in it on exit.
+    """
+    path = make_job_dir(prefix)
+    try:
+        yield path
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def hidden_temp_path(path):
+    """
+    Hidden path next to `path`, with the same extension, to write a file to before renaming it
+    into place, so that the file never appears half-written under its final name.
+    """
+    folder, name = os.path.split(path)
+    stem, ext = os.path.splitext(name)
+    return os.path.join(folder, f".{stem}.{os.getpid()}-{threading.get_ident()}{ext}")
+
+
+def copy_file_atomic(src, dst):
+    """
+    Copies a file, making it appear at dst only once it is complete.
+    """
+    tmp_path = hidden_temp_path(dst)
+    shutil.copyfile(src, tmp_path)
+    os.replace(tmp_path, dst)
 
 
 def import_glb_merge_vertices(model_path, *, merge_threshold=1e-4):
+    import bpy, bmesh
+
     # Clear the current scene
     bpy.ops.object.select_all(action='SELECT')
     bpy.ops.object.delete()
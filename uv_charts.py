@@ -0,0 +1,33 @@
+"""
+xatlas chart computation for the worker processes of trellis.utils.uv_utils.
+
+The workers are spawned, so they import the module of the function they run. This one
+lives outside the trellis package and only imports numpy and xatlas: importing it never
+runs trellis/__init__.py and the models, pipelines and renderers behind it. The workers
+still re-import the calling script, as every spawned process does.
+"""
+import numpy as np
+import xatlas
+
+
+def compute_charts(vertices, faces):
+    """
+    Cut a mesh into charts and flatten them with xatlas.
+
+    The UVs are returned in mesh units (texels divided by texels per unit), so the charts
+    of separately processed meshes share one scale and can be packed together.
+
+    Parameters:
+        vertices (np.ndarray): Vertices of the mesh. Shape (V, 3).
+        faces (np.ndarray): Faces of the mesh. Shape (F, 3).
+
+    Returns:
+        (np.ndarray): Index of the input vertex of each output vertex. Shape (V',).
+        (np.ndarray): Faces of the charts. Shape (F, 3).
+        (np.ndarray): UV coordinates in mesh units. Shape (V', 2).
+    """
+    atlas = xatlas.Atlas()
+    atlas.add_mesh(np.ascontiguousarray(vertices, dtype=np.float32), np.ascontiguousarray(faces, dtype=np.uint32))
+    atlas.generate()
+    vmapping, indices, uvs = atlas[0]
+    return vmapping, indices, uvs * np.array([atlas.width, atlas.height], dtype=np.float32) / atlas.texels_per_unit
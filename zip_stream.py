@@ -0,0 +1,122 @@
+"""
+ZIP archives streamed while they are written.
+
+The archive is produced as an iterator of byte chunks for a StreamingResponse: zipfile
+writes each entry with a data descriptor to a write-only buffer, which is drained after
+every chunk of input, so memory stays at one chunk whatever the number and size of the
+files. Formats that are already compressed are stored, the rest deflated.
+
+Files can also be streamed while a job is still producing them: iter_job_outputs yields
+the files of a folder as they appear, relying on writers to create them under a hidden
+name and rename them into place (see utils.hidden_temp_path).
+"""
+import os
+import time
+import zipfile
+
+
+# Stored as they are, deflate would only cost time
+STORED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".mp4", ".zip", ".gz"}
+
+CHUNK_SIZE = 1 << 20
+
+
+class _ChunkBuffer:
+    """
+    Write-only, unseekable file object collecting what zipfile writes until it is drained.
+    """
+    def __init__(self):
+        self._chunks = []
+        self._offset = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._offset
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def iter_zip(entries, chunk_size=CHUNK_SIZE):
+    """
+    Stream a ZIP archive of files.
+
+    Parameters:
+        entries (iterable): (path, arcname) of each file, consumed lazily, so entries
+            can be produced while the archive is being sent.
+        chunk_size (int): Bytes read from a file at a time.
+
+    Yields:
+        bytes: The next part of the archive.
+    """
+    buffer = _ChunkBuffer()
+    with zipfile.ZipFile(buffer, "w") as zf:
+        for path, arcname in entries:
+            zinfo = zipfile.ZipInfo.from_file(path, arcname)
+            ext = os.path.splitext(path)[1].lower()
+            zinfo.compress_type = zipfile.ZIP_STORED if ext in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+            with open(path, "rb") as src, zf.open(zinfo, "w") as dest:
+                for chunk in iter(lambda: src.read(chunk_size), b""):
+                    dest.write(chunk)
+                    data = buffer.drain()
+                    if data:
+                        yield data
+            yield buffer.drain()
+    yield buffer.drain()
+
+
+def iter_folder(folder):
+    """
+    (path, arcname) of every file in a folder, arcnames relative to it.
+    """
+    for root, _, files in os.walk(folder):
+        for file in sorted(files):
+            path = os.path.join(root, file)
+            yield path, os.path.relpath(path, folder)
+
+
+def _new_files(folder, seen):
+    found = []
+    if os.path.isdir(folder):
+        for root, dirs, files in os.walk(folder):
+            dirs.sort()
+            for file in sorted(files):
+                path = os.path.join(root, file)
+                if not file.startswith(".") and path not in seen:
+                    seen.add(path)
+                    found.append((path, os.path.relpath(path, folder)))
+    return found
+
+
+def wait_for_output(folder, future, poll_interval=0.2):
+    """
+    Block until the folder holds a finished file or the job is done.
+    """
+    while not future.done() and not _new_files(folder, set()):
+        time.sleep(poll_interval)
+
+
+def iter_job_outputs(folder, future, poll_interval=0.2):
+    """
+    (path, arcname) of the files of a folder as a job writes them, until the job is done.
+
+    Parameters:
+        folder (str): Folder the job writes to. Hidden files are skipped as unfinished.
+        future (concurrent.futures.Future): The job. If it fails, its exception is raised
+            after the files it finished, which aborts a streamed response.
+    """
+    seen = set()
+    while not future.done():
+        yield from _new_files(folder, seen)
+        time.sleep(poll_interval)
+    yield from _new_files(folder, seen)
+    future.result()